@@ -0,0 +1,161 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Iterator
+
+import numpy as np
+
+# Each topic has its own vocabulary, so memories and queries about the same topic
+# share words and therefore land close together under the stub encoder.
+TOPICS = [
+    "travel",
+    "food",
+    "work",
+    "family",
+    "health",
+    "music",
+    "sport",
+    "finance",
+    "books",
+    "movies",
+    "pets",
+    "garden",
+]
+_WORDS_PER_TOPIC = 60
+_COMMON_WORDS = [f"common{i}" for i in range(200)]
+
+
+def _topic_words(topic: str) -> list[str]:
+    return [f"{topic}{i}" for i in range(_WORDS_PER_TOPIC)]
+
+
+@dataclass
+class SyntheticMemory:
+    index: int
+    text: str
+    category: str
+    user: int
+
+
+class SyntheticDataset:
+    """
+    Deterministic synthetic users, categories and memories.
+
+    Every value is derived from the seed and the row index, so the same scale and
+    seed produce the same corpus on every run and machine, and the corpus can be
+    streamed in chunks at any scale without holding it in memory.
+    """
+
+    def __init__(
+        self,
+        memories: int,
+        users: int = 100,
+        categories: int = len(TOPICS),
+        seed: int = 0,
+    ) -> None:
+        if not 1 <= categories <= len(TOPICS):
+            raise ValueError(f"categories must be between 1 and {len(TOPICS)}.")
+        self.memories = memories
+        self.users = users
+        self.categories = TOPICS[:categories]
+        self.seed = seed
+
+    def _rng(self, *key: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed, *key])
+
+    def memory(self, index: int) -> SyntheticMemory:
+        rng = self._rng(0, index)
+        topic = self.categories[int(rng.integers(len(self.categories)))]
+        words = rng.choice(_topic_words(topic), size=int(rng.integers(4, 9)))
+        filler = rng.choice(_COMMON_WORDS, size=int(rng.integers(2, 6)))
+        text = " ".join(rng.permutation(np.concatenate([words, filler])).tolist())
+        return SyntheticMemory(index, text, topic, int(rng.integers(self.users)))
+
+    def iter_chunks(
+        self, chunk_size: int, start: int = 0
+    ) -> Iterator[list[SyntheticMemory]]:
+        for chunk_start in range(start, self.memories, chunk_size):
+            stop = min(chunk_start + chunk_size, self.memories)
+            yield [self.memory(i) for i in range(chunk_start, stop)]
+
+    def queries(self, count: int) -> list[tuple[str, str, int]]:
+        """
+        Generate (query, category, user) triples drawn from the corpus topics.
+        """
+        queries = []
+        for i in range(count):
+            rng = self._rng(1, i)
+            topic = self.categories[int(rng.integers(len(self.categories)))]
+            words = rng.choice(_topic_words(topic), size=3, replace=False)
+            queries.append(
+                (" ".join(words.tolist()), topic, int(rng.integers(self.users)))
+            )
+        return queries
+
+
+class StubEncoder:
+    """
+    In-process stand-in for the SentenceTransformer model.
+
+    A text is embedded as the normalized sum of fixed random vectors, one per word,
+    so it is deterministic, needs no model download and costs microseconds, while
+    texts sharing words still come out similar. It implements the encode() subset
+    that src.embedding uses.
+    """
+
+    def __init__(self, dims: int) -> None:
+        self.dims = dims
+        self._words: dict[str, np.ndarray] = {}
+
+    def _word(self, word: str) -> np.ndarray:
+        vector = self._words.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode()).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dims)
+            vector = vector.astype(np.float32)
+            self._words[word] = vector
+        return vector
+
+    def encode(self, texts: list[str], prompt_name=None, **kwargs) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.split():
+                embeddings[i] += self._word(word)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.where(norms == 0, 1.0, norms)
+
+
+def exact_top_k(
+    dataset: SyntheticDataset,
+    encoder: StubEncoder,
+    queries: list[tuple[str, str, int]],
+    top_k: int,
+    filtered: bool,
+    chunk_size: int = 10000,
+) -> list[list[int]]:
+    """
+    Brute-force the true top k memory indexes of each query, for recall@k.
+
+    The corpus is streamed, and only the memories of the queried users are embedded
+    and kept, so this scales with the per-user corpus rather than the total one.
+    """
+    users = {user for _, _, user in queries}
+    rows: dict[int, list[SyntheticMemory]] = {user: [] for user in users}
+    for chunk in dataset.iter_chunks(chunk_size):
+        for memory in chunk:
+            if memory.user in users:
+                rows[memory.user].append(memory)
+    embeddings = {
+        user: encoder.encode([m.text for m in memories])
+        for user, memories in rows.items()
+    }
+    query_embeddings = encoder.encode([query for query, _, _ in queries])
+    truth = []
+    for (_, category, user), query_embedding in zip(queries, query_embeddings):
+        memories = rows[user]
+        scores = embeddings[user] @ query_embedding
+        if filtered:
+            mask = np.array([m.category == category for m in memories], dtype=bool)
+            scores = np.where(mask, scores, -np.inf)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        truth.append([memories[i].index for i in order if np.isfinite(scores[i])])
+    return truth
@@ -0,0 +1,234 @@
+"""
+Ingest and search benchmarks on deterministic synthetic data.
+
+    python -m benchmarks.run --backend numpy --scale 100000
+    python -m benchmarks.run --backend pgvector --scale 1000000 --index both
+
+The pgvector backend uses the database configured in .env, which must have been
+set up with setup.py. Each run creates its own users, so runs never see each
+other's memories. By default texts are embedded with an in-process stub encoder,
+pass --encoder model to include the real embedding model in the numbers.
+"""
+
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+import src.embedding.model
+import src.embedding.utils
+from benchmarks.data import StubEncoder, SyntheticDataset, exact_top_k
+from src import MemoryInterface
+from src.queries import NumpyMemoryStore
+from src.settings import settings
+
+
+def summarize(
+    name: str, latencies: list[float], items: Optional[int] = None, **extra: Any
+) -> dict[str, Any]:
+    """
+    Summarize per-call latencies in seconds as p50/p95/p99 in ms and items/s.
+    """
+    samples = np.asarray(latencies) * 1000
+    total = float(np.sum(latencies))
+    return {
+        "name": name,
+        "calls": len(latencies),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "throughput_per_s": (items or len(latencies)) / total if total else 0.0,
+        **extra,
+    }
+
+
+def _timed(fn: Callable[[], Any]) -> tuple[float, Any]:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def _recall(hits: list[list[int]], truth: list[list[int]]) -> float:
+    found = sum(len(set(h) & set(t)) for h, t in zip(hits, truth))
+    expected = sum(len(t) for t in truth)
+    return found / expected if expected else 1.0
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.dataset = SyntheticDataset(
+            args.scale, users=args.users, categories=args.categories, seed=args.seed
+        )
+        self.queries = self.dataset.queries(args.queries)
+        self.encoder = StubEncoder(settings.embedding_model_dims)
+        if args.encoder == "stub":
+            src.embedding.model._embedding_model = self.encoder  # type: ignore
+        if not args.query_cache:
+            src.embedding.utils.query_embedding_cache = None
+        if args.backend == "numpy":
+            path = Path(args.path) if args.path else None
+            store = NumpyMemoryStore(path, dtype=args.numpy_dtype)
+            self.memory = MemoryInterface(store)
+        else:
+            self.memory = MemoryInterface()
+        self.run_id = uuid.uuid4().hex[:8]
+        self.user_ids: list[uuid.UUID] = []
+        # Only the memories of queried users are needed to score recall
+        self.query_users = {user for _, _, user in self.queries}
+        self.indexes: dict[uuid.UUID, int] = {}
+        self.results: list[dict[str, Any]] = []
+
+    def _track(self, ids: list[uuid.UUID], memories: list[Any]) -> None:
+        for id, memory in zip(ids, memories):
+            if memory.user in self.query_users:
+                self.indexes[id] = memory.index
+
+    def ingest(self) -> None:
+        self.user_ids = [
+            self.memory.create_user(f"bench-{self.run_id}-{user}")
+            for user in range(self.dataset.users)
+        ]
+        single, batches = [], []
+        rows = 0
+        for i in range(min(self.args.single, self.dataset.memories)):
+            memory = self.dataset.memory(i)
+            elapsed, saved = _timed(
+                lambda: self.memory.add_memory(
+                    memory.text, memory.category, self.user_ids[memory.user]
+                )
+            )
+            single.append(elapsed)
+            self._track([saved.id], [memory])
+        for chunk in self.dataset.iter_chunks(self.args.batch_size, start=len(single)):
+            elapsed, ids = _timed(
+                lambda: self.memory.add_memories(
+                    [(m.text, m.category, self.user_ids[m.user]) for m in chunk]
+                )
+            )
+            batches.append(elapsed)
+            rows += len(chunk)
+            self._track(ids, chunk)
+        if single:
+            self.results.append(summarize("ingest_single", single))
+        if batches:
+            self.results.append(
+                summarize(
+                    "ingest_batch",
+                    batches,
+                    items=rows,
+                    batch_size=self.args.batch_size,
+                )
+            )
+
+    def search(self, index: str) -> None:
+        top_k = self.args.top_k
+        date_from = datetime.now() - timedelta(days=1)
+        for filtered in (False, True):
+            truth = exact_top_k(
+                self.dataset, self.encoder, self.queries, top_k, filtered
+            )
+            latencies, hits = [], []
+            for query, category, user in self.queries:
+                elapsed, results = _timed(
+                    lambda: self.memory.search(
+                        query,
+                        self.user_ids[user],
+                        category=category if filtered else None,
+                        date_from=date_from if filtered else None,
+                        top_k=top_k,
+                        threshold=2.0,
+                        recall=self.args.recall,
+                    )
+                )
+                latencies.append(elapsed)
+                hits.append([self.indexes[m.id] for m in results.memories])
+            name = "search_filtered" if filtered else "search"
+            self.results.append(
+                summarize(
+                    name,
+                    latencies,
+                    index=index,
+                    top_k=top_k,
+                    **{f"recall@{top_k}": _recall(hits, truth)},
+                )
+            )
+
+    def run(self) -> list[dict[str, Any]]:
+        self.ingest()
+        if self.args.backend == "numpy":
+            self.search("exact")
+            return self.results
+        states = ["on", "off"] if self.args.index == "both" else [self.args.index]
+        for state in states:
+            if state == "on":
+                self.memory.create_vector_index()
+            else:
+                self.memory.drop_vector_index()
+            self.search(state)
+        # Leave the database with its index, as setup.py creates it
+        self.memory.create_vector_index()
+        return self.results
+
+
+def _print(results: list[dict[str, Any]]) -> None:
+    for result in results:
+        extra = {
+            k: v
+            for k, v in result.items()
+            if k
+            not in ("name", "calls", "p50_ms", "p95_ms", "p99_ms", "throughput_per_s")
+        }
+        print(
+            f"{result['name']:<16} calls={result['calls']:<6} "
+            f"p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms "
+            f"p99={result['p99_ms']:8.2f}ms {result['throughput_per_s']:10.1f}/s "
+            + " ".join(
+                f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                for k, v in extra.items()
+            )
+        )
+
+
+def main(argv: Optional[list[str]] = None) -> list[dict[str, Any]]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--backend", choices=["numpy", "pgvector"], default="numpy")
+    parser.add_argument("--scale", type=int, default=10000, help="memories to ingest")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--single", type=int, default=200, help="memories ingested one at a time"
+    )
+    parser.add_argument("--recall", type=float, default=None)
+    parser.add_argument("--index", choices=["on", "off", "both"], default="on")
+    parser.add_argument("--encoder", choices=["stub", "model"], default="stub")
+    parser.add_argument("--query-cache", action="store_true")
+    parser.add_argument("--path", default=None, help="directory of the numpy store")
+    parser.add_argument(
+        "--numpy-dtype", choices=["float32", "float16"], default="float32"
+    )
+    parser.add_argument("--json", default=None, help="also write the results here")
+    args = parser.parse_args(argv)
+    if args.encoder == "model":
+        # Recall is scored against the stub encoder's exact neighbours
+        print("recall@k is only meaningful with --encoder stub")
+
+    results = Benchmark(args).run()
+    _print(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
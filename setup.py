@@ -3,7 +3,19 @@ import logging
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import text
 
-from src.db import Base, engine
+from src.db import Base, engine, get_session
+from src.embedding import check_embedding_parity, export_onnx_model
+from src.queries import (
+    create_text_search_index,
+    create_time_partitions,
+    create_user_date_index,
+    create_vector_index,
+    is_memories_partitioned,
+    merge_duplicate_categories,
+    partition_memories,
+    record_embedding_model,
+)
+from src.settings import settings
 
 logger = logging.getLogger(__name__)
 
@@ -33,5 +45,56 @@ finally:
 Base.metadata.create_all(bind=engine)
 logger.info("Tables created successfully.")
 
+# create_all leaves the indexes and constraints of existing tables alone
+with get_session() as session:
+    # Category upserts rely on the unique constraint on the name
+    merged = merge_duplicate_categories(session)
+    if merged:
+        logger.info(f"Merged {merged} duplicate categories.")
+    create_user_date_index(session)
+    # Hybrid search and the partition migration need the generated text_search column
+    create_text_search_index(session)
+    # Searches and writes check the model named here, which a re-embedding cutover updates
+    model_name, dims = record_embedding_model(session)
+    if (model_name, dims) != (
+        settings.embedding_model_name,
+        settings.embedding_model_dims,
+    ):
+        raise ValueError(
+            f"Memories are embedded with {model_name} at {dims} dims, set "
+            "EMBEDDING_MODEL_NAME and EMBEDDING_MODEL_DIMS to match."
+        )
+
+# Migrating a table that holds memories blocks writes for the whole copy, so only
+# an empty one is partitioned here and the rest is left to a maintenance window
+if settings.memory_partitions:
+    with get_session() as session:
+        if not is_memories_partitioned(session):
+            if session.execute(text("SELECT EXISTS (SELECT FROM memories)")).scalar():
+                logger.warning(
+                    "MEMORY_PARTITIONS is set but memories are not partitioned yet, "
+                    "run partition_memories(session) in a maintenance window."
+                )
+            else:
+                partition_memories(session, drop_unpartitioned=True)
+                logger.info("Memories partitioned by user.")
+        elif settings.memory_time_partition != "none":
+            create_time_partitions(session)
+
+# IVFFlat needs data to train its lists, so only build the index up front for HNSW
+if settings.vector_index_method == "hnsw":
+    with get_session() as session:
+        create_vector_index(session)
+    logger.info("Vector index created successfully.")
+
+# The ONNX backends load a one-time export, checked against the PyTorch embeddings
+if settings.embedding_backend != "torch":
+    path = export_onnx_model()
+    distance = check_embedding_parity()
+    logger.info(
+        f"{settings.embedding_backend} model exported to {path}, "
+        f"{distance:.4f} cosine distance from PyTorch."
+    )
+
 # Close the session
 session.close()
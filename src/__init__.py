@@ -1,5 +1,28 @@
-from src.memory import MemoryInterface
+import time
+
+_import_start = time.perf_counter()
+
+from src.memory import AsyncMemoryInterface, MemoryInterface  # noqa: E402
+from src.metrics import MetricEvent, PrometheusExporter, metrics  # noqa: E402
+from src.reembed import ReembedJob, ReembedProgress  # noqa: E402
+from src.retention import RetentionJob, RetentionPolicy  # noqa: E402
+from src.startup import startup_timings, warmup  # noqa: E402
+from src.transfer import export_memories, import_memories  # noqa: E402
+
+startup_timings["import"] = time.perf_counter() - _import_start
 
 __all__ = [
     "MemoryInterface",
+    "AsyncMemoryInterface",
+    "MetricEvent",
+    "PrometheusExporter",
+    "metrics",
+    "ReembedJob",
+    "ReembedProgress",
+    "RetentionJob",
+    "RetentionPolicy",
+    "export_memories",
+    "import_memories",
+    "startup_timings",
+    "warmup",
 ]
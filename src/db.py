@@ -1,21 +1,133 @@
-from contextlib import contextmanager
-from typing import Generator
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Generator, Optional
 
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
+from src.metrics import metrics
 from src.settings import settings
+from src.startup import startup_timings
 
-engine = create_engine(settings.pg_url, echo=False)
-SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
-SyncSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+# Kept for backwards compatibility, both names refer to the same factory
+SessionLocal = SyncSessionLocal
+
+AsyncSessionLocal = async_sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False
+)
+
+_engine: Optional[Engine] = None
+_async_engine: Optional[AsyncEngine] = None
+_lock = threading.Lock()
+
+# The session of the unit of work active in the current thread or task, if any
+_current_session: ContextVar[Optional[Session]] = ContextVar(
+    "current_session", default=None
+)
+_current_async_session: ContextVar[Optional[AsyncSession]] = ContextVar(
+    "current_async_session", default=None
+)
+
+
+def _pool_kwargs() -> dict[str, Any]:
+    return {
+        "pool_size": settings.pg_pool_size,
+        "max_overflow": settings.pg_max_overflow,
+        "pool_timeout": settings.pg_pool_timeout,
+        "pool_recycle": settings.pg_pool_recycle,
+        "pool_pre_ping": settings.pg_pool_pre_ping,
+    }
+
+
+def get_engine() -> Engine:
+    """
+    Get the shared engine, creating it and binding the session factories on first use.
+    """
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                start = time.perf_counter()
+                connect_args = {}
+                if settings.pg_statement_timeout_ms:
+                    connect_args["options"] = (
+                        f"-c statement_timeout={settings.pg_statement_timeout_ms}"
+                    )
+                _engine = create_engine(
+                    settings.pg_url,
+                    echo=False,
+                    connect_args=connect_args,
+                    **_pool_kwargs(),
+                )
+                SyncSessionLocal.configure(bind=_engine)
+                startup_timings["database_engine"] = time.perf_counter() - start
+    return _engine
+
+
+def _register_vector(dbapi_connection: Any, connection_record: Any) -> None:
+    # Binary codecs, so embeddings are sent and read as packed float32 arrays
+    from pgvector.asyncpg import register_vector
+
+    dbapi_connection.run_async(register_vector)
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    Get the shared async engine, creating it and binding the session factory on first use.
+    """
+    global _async_engine
+    if _async_engine is None:
+        with _lock:
+            if _async_engine is None:
+                start = time.perf_counter()
+                connect_args = {}
+                if settings.pg_statement_timeout_ms:
+                    connect_args["server_settings"] = {
+                        "statement_timeout": str(settings.pg_statement_timeout_ms)
+                    }
+                _async_engine = create_async_engine(
+                    settings.async_pg_url,
+                    echo=False,
+                    connect_args=connect_args,
+                    **_pool_kwargs(),
+                )
+                event.listen(_async_engine.sync_engine, "connect", _register_vector)
+                AsyncSessionLocal.configure(bind=_async_engine)
+                startup_timings["database_async_engine"] = time.perf_counter() - start
+    return _async_engine
+
+
+def __getattr__(name: str) -> Any:
+    # Keeps `from src.db import engine` working, lazily
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @contextmanager
-def get_session() -> Generator[None, None, Session]:
+def _new_session(
+    execution_options: Optional[dict[str, Any]] = None,
+) -> Generator[Session, None, None]:
+    get_engine()
     session = SyncSessionLocal()
+    if metrics.enabled or execution_options:
+        # Check the connection out up front so the time spent waiting for the pool
+        # is measured on its own, and so the options apply before any query
+        with metrics.stage("pool_wait"):
+            session.connection(execution_options=execution_options)
     try:
         yield session
         session.commit()
@@ -24,3 +136,90 @@ def get_session() -> Generator[None, None, Session]:
         raise
     finally:
         session.close()
+
+
+@contextmanager
+def get_session(
+    execution_options: Optional[dict[str, Any]] = None,
+) -> Generator[Session, None, None]:
+    """
+    Get a session that commits on exit and rolls back on errors.
+
+    Args:
+        execution_options (Optional[dict[str, Any]]): Connection options, e.g.
+            isolation_level, applied before the session runs its first query. They
+            can't be used inside a unit of work, whose transaction has already begun.
+    """
+    session = _current_session.get()
+    if session is not None:
+        if execution_options:
+            raise ValueError("Connection options can't be set inside a unit of work.")
+        # Inside a unit of work, which commits or rolls back once at the end
+        yield session
+        return
+    with _new_session(execution_options) as session:
+        yield session
+
+
+@contextmanager
+def unit_of_work() -> Generator[Session, None, None]:
+    """
+    Run every get_session() block inside this one on a single session and transaction.
+
+    The transaction is committed once when the outermost unit of work exits, or rolled
+    back if it raises. Nested units of work join the outer one.
+    """
+    if _current_session.get() is not None:
+        with get_session() as session:
+            yield session
+        return
+    with _new_session() as session:
+        token = _current_session.set(session)
+        try:
+            yield session
+        finally:
+            _current_session.reset(token)
+
+
+@asynccontextmanager
+async def _new_async_session() -> AsyncGenerator[AsyncSession, None]:
+    get_async_engine()
+    session = AsyncSessionLocal()
+    if metrics.enabled:
+        with metrics.stage("pool_wait"):
+            await session.connection()
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+@asynccontextmanager
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    session = _current_async_session.get()
+    if session is not None:
+        yield session
+        return
+    async with _new_async_session() as session:
+        yield session
+
+
+@asynccontextmanager
+async def async_unit_of_work() -> AsyncGenerator[AsyncSession, None]:
+    """
+    asyncio counterpart of unit_of_work, for get_async_session() blocks.
+    """
+    if _current_async_session.get() is not None:
+        async with get_async_session() as session:
+            yield session
+        return
+    async with _new_async_session() as session:
+        token = _current_async_session.set(session)
+        try:
+            yield session
+        finally:
+            _current_async_session.reset(token)
@@ -1,17 +1,56 @@
-from src.embedding.model import embedding_model
+from typing import Any
+
+from src.embedding.batcher import EmbeddingBatcher
+from src.embedding.cache import CacheStats, QueryEmbeddingCache, query_embedding_cache
+from src.embedding.model import (
+    EMBEDDING_BACKENDS,
+    check_embedding_parity,
+    export_onnx_model,
+    get_embedding_model,
+    get_onnx_model_dir,
+    load_embedding_model,
+)
+from src.embedding.pool import EmbeddingPool, get_embedding_pool
 from src.embedding.utils import (
     aget_query_embedding,
+    aget_query_embeddings,
     aget_text_embedding,
+    embedding_batcher,
+    get_duplicate_indexes,
     get_query_embedding,
+    get_query_embeddings,
     get_similarity_scores,
     get_text_embedding,
 )
 
 __all__ = [
     "embedding_model",
+    "get_embedding_model",
+    "load_embedding_model",
+    "EMBEDDING_BACKENDS",
+    "check_embedding_parity",
+    "export_onnx_model",
+    "get_onnx_model_dir",
     "get_query_embedding",
+    "get_query_embeddings",
     "get_text_embedding",
     "aget_query_embedding",
+    "aget_query_embeddings",
     "aget_text_embedding",
     "get_similarity_scores",
+    "get_duplicate_indexes",
+    "CacheStats",
+    "QueryEmbeddingCache",
+    "query_embedding_cache",
+    "EmbeddingPool",
+    "get_embedding_pool",
+    "EmbeddingBatcher",
+    "embedding_batcher",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    # The model is loaded lazily, see src.embedding.model.get_embedding_model
+    if name == "embedding_model":
+        return get_embedding_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
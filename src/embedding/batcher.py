@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from src.embedding.types import Embedding
+
+EncodeFn = Callable[[list[str], Optional[str]], Embedding]
+
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent embedding requests into batched encode calls.
+
+    Requests are grouped by prompt name so query and document embeddings never share
+    a batch. A group is encoded once it holds max_batch_size texts, or max_wait_ms
+    after its first request arrived, whichever comes first. Results are handed back
+    to each caller through a Future.
+    """
+
+    def __init__(
+        self,
+        encode: EncodeFn,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ) -> None:
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be positive.")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._encode = encode
+        self._queue: queue.SimpleQueue[tuple[str, Optional[str], Future[Embedding]]] = (
+            queue.SimpleQueue()
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _flush(
+        self, prompt_name: Optional[str], batch: list[tuple[str, Future[Embedding]]]
+    ) -> None:
+        try:
+            embeddings = self._encode([text for text, _ in batch], prompt_name)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+
+    def _run(self) -> None:
+        pending: dict[Optional[str], list[tuple[str, Future[Embedding]]]] = {}
+        deadlines: dict[Optional[str], float] = {}
+        while True:
+            timeout = (
+                max(0.0, min(deadlines.values()) - time.monotonic())
+                if deadlines
+                else None
+            )
+            try:
+                text, prompt_name, future = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                if future.set_running_or_notify_cancel():
+                    batch = pending.setdefault(prompt_name, [])
+                    deadlines.setdefault(prompt_name, time.monotonic() + self.max_wait)
+                    batch.append((text, future))
+                    if len(batch) >= self.max_batch_size:
+                        del deadlines[prompt_name]
+                        self._flush(prompt_name, pending.pop(prompt_name))
+            now = time.monotonic()
+            for prompt_name in [p for p, d in deadlines.items() if d <= now]:
+                del deadlines[prompt_name]
+                self._flush(prompt_name, pending.pop(prompt_name))
+
+    def submit(self, text: str, prompt_name: Optional[str] = None) -> Future[Embedding]:
+        """
+        Queue a text for embedding.
+
+        Args:
+            text (str): The text to embed.
+            prompt_name (Optional[str]): The model prompt to encode the text with.
+
+        Returns:
+            Future[Embedding]: A future resolving to the float32 embedding of the
+                text.
+        """
+        self._start()
+        future: Future[Embedding] = Future()
+        self._queue.put((text, prompt_name, future))
+        return future
+
+    def encode(
+        self, texts: list[str], prompt_name: Optional[str] = None
+    ) -> list[Embedding]:
+        """
+        Embed texts through the batcher, blocking until every embedding is ready.
+
+        Args:
+            texts (list[str]): The texts to embed.
+            prompt_name (Optional[str]): The model prompt to encode the texts with.
+
+        Returns:
+            list[Embedding]: The float32 embeddings of the texts, in input order.
+        """
+        futures = [self.submit(text, prompt_name) for text in texts]
+        return [future.result() for future in futures]
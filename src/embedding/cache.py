@@ -0,0 +1,215 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from src.embedding.types import Embedding, EmbeddingLike
+from src.settings import settings
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU cache of query embeddings with an optional TTL.
+
+    When a path is given, entries are also written to a SQLite file so that worker
+    processes on the same host can share each other's embeddings. The file keeps
+    the max_size most recently written entries, whether or not a TTL is set. The
+    file is opened on first use in each process, so a cache created before a fork
+    never shares its SQLite connection with the child. Embeddings are kept as
+    read-only float32 arrays and handed out without copying.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+        path: Optional[Path] = None,
+    ) -> None:
+        if max_size <= 0:
+            raise ValueError("max_size must be positive.")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[float, Embedding]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # Called with the lock held. A connection inherited through fork belongs to
+        # the parent, so the child opens its own and leaves that one untouched.
+        if self.path is None:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(
+                self.path, timeout=5.0, isolation_level=None, check_same_thread=False
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(key TEXT PRIMARY KEY, created_at REAL NOT NULL, embedding BLOB NOT NULL)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS query_embeddings_created_at "
+                "ON query_embeddings (created_at)"
+            )
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    @staticmethod
+    def make_key(
+        query: str,
+        model_name: str,
+        truncate_dim: Optional[int],
+        prompt_name: Optional[str],
+    ) -> str:
+        """
+        Build a cache key from the normalized query and everything that affects its
+        embedding. Queries differing only in case or whitespace share a key.
+        """
+        normalized = " ".join(query.split()).casefold()
+        raw = "\x1f".join([normalized, model_name, str(truncate_dim), str(prompt_name)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _put(self, key: str, created_at: float, embedding: Embedding) -> None:
+        self._entries[key] = (created_at, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _get_from_disk(self, key: str, now: float) -> Optional[Embedding]:
+        db = self._connection()
+        if db is None:
+            return None
+        row = db.execute(
+            "SELECT created_at, embedding FROM query_embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        created_at, blob = row
+        if self._expired(created_at, now):
+            # Conditional, so a copy rewritten since the SELECT is kept
+            db.execute(
+                "DELETE FROM query_embeddings WHERE key = ? AND created_at = ?",
+                (key, created_at),
+            )
+            self.stats.expirations += 1
+            return None
+        # frombuffer over bytes is already read-only
+        embedding = np.frombuffer(blob, dtype=np.float32)
+        self._put(key, created_at, embedding)
+        return embedding
+
+    def get(self, key: str) -> Optional[Embedding]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0], now):
+                del self._entries[key]
+                self.stats.expirations += 1
+                # Another process may have written a newer copy to disk since
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                embedding: Optional[Embedding] = entry[1]
+            else:
+                embedding = self._get_from_disk(key, now)
+            if embedding is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            return embedding
+
+    def set(self, key: str, embedding: EmbeddingLike) -> None:
+        # Copied, so the caller's array can't change the cached one
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+        now = time.time()
+        with self._lock:
+            self._put(key, now, embedding)
+            db = self._connection()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?)",
+                    (key, now, embedding.tobytes()),
+                )
+                # Every worker writes to the file, so it is trimmed on each insert
+                self.stats.evictions += db.execute(
+                    "DELETE FROM query_embeddings WHERE key IN (SELECT key FROM "
+                    "query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,),
+                ).rowcount
+
+    def prune(self) -> int:
+        """
+        Remove expired entries from memory and disk.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        if self.ttl is None:
+            return 0
+        now = time.time()
+        with self._lock:
+            expired = [
+                k for k, (t, _) in self._entries.items() if self._expired(t, now)
+            ]
+            for key in expired:
+                del self._entries[key]
+            removed = len(expired)
+            db = self._connection()
+            if db is not None:
+                # Every cached entry is also on disk, so the disk count covers both
+                removed = db.execute(
+                    "DELETE FROM query_embeddings WHERE created_at < ?",
+                    (now - self.ttl,),
+                ).rowcount
+            self.stats.expirations += removed
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM query_embeddings")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+query_embedding_cache: Optional[QueryEmbeddingCache] = (
+    QueryEmbeddingCache(
+        max_size=settings.query_cache_size,
+        ttl=settings.query_cache_ttl or None,
+        path=settings.query_cache_path,
+    )
+    if settings.query_cache_size > 0
+    else None
+)
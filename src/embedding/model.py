@@ -1,9 +1,240 @@
-from sentence_transformers import SentenceTransformer
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Sequence
+
+import numpy as np
 
 from src.settings import settings
+from src.startup import startup_timings
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+QUANTIZATION_CONFIGS = ("avx512_vnni", "avx512", "avx2", "arm64")
+
+# Sentences of the kind stored as memories, for the parity check
+_PARITY_TEXTS = [
+    "The user prefers window seats on long flights.",
+    "Their daughter starts primary school in September.",
+    "Allergic to peanuts and shellfish.",
+    "Works remotely from Lisbon, usually online 9 to 5 CET.",
+    "Asked for weekly summaries instead of daily ones.",
+    "Favourite programming language is Rust, but uses Python at work.",
+    "Is training for a half marathon in the spring.",
+    "Wants reminders to water the plants every Sunday.",
+]
+
+_embedding_model: Optional["SentenceTransformer"] = None
+_lock = threading.Lock()
+
+
+def _check_backend(backend: str) -> None:
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend {backend!r}, expected one of "
+            f"{EMBEDDING_BACKENDS}."
+        )
+
+
+def _onnx_file_name(backend: str, quantization: str) -> str:
+    if backend == "onnx-int8":
+        if quantization not in QUANTIZATION_CONFIGS:
+            raise ValueError(
+                f"Unknown quantization {quantization!r}, expected one of "
+                f"{QUANTIZATION_CONFIGS}."
+            )
+        return f"onnx/model_qint8_{quantization}.onnx"
+    return "onnx/model.onnx"
+
+
+def get_onnx_model_dir(name: Optional[str] = None) -> Path:
+    """
+    Get the directory the ONNX export of a model is saved to.
+
+    Args:
+        name (Optional[str]): The sentence-transformers model name.
+
+    Returns:
+        Path: The directory, inside settings.embedding_model_dir.
+    """
+    name = name or settings.embedding_model_name
+    return settings.embedding_model_dir / "onnx" / name.replace("/", "--")
+
+
+def load_embedding_model(
+    name: Optional[str] = None,
+    dims: Optional[int] = None,
+    backend: Optional[str] = None,
+    threads: Optional[int] = None,
+) -> "SentenceTransformer":
+    """
+    Load a new embedding model instance, by default the one configured in settings.
+
+    The ONNX backends load the export made by export_onnx_model and run on ONNX
+    Runtime, which is faster and much smaller in memory than PyTorch on CPUs.
+
+    Args:
+        name (Optional[str]): The sentence-transformers model name.
+        dims (Optional[int]): The dimension embeddings are truncated to.
+        backend (Optional[str]): "torch", "onnx" or "onnx-int8", defaults to
+            settings.embedding_backend.
+        threads (Optional[int]): The intra-op threads encode runs on, the library
+            default if None. For PyTorch this applies to the whole process.
+
+    Returns:
+        SentenceTransformer: The loaded model.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    name = name or settings.embedding_model_name
+    backend = backend or settings.embedding_backend
+    _check_backend(backend)
+    if backend == "torch":
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+        return SentenceTransformer(
+            name,
+            truncate_dim=dims or settings.embedding_model_dims,
+            cache_folder=settings.embedding_model_dir,
+        )
+
+    path = get_onnx_model_dir(name)
+    file_name = _onnx_file_name(backend, settings.embedding_quantization)
+    if not (path / file_name).exists():
+        raise ValueError(
+            f"No {backend} export of {name} at {path / file_name}, run "
+            "export_onnx_model first."
+        )
+    model_kwargs: dict[str, Any] = {
+        "file_name": file_name,
+        "provider": "CPUExecutionProvider",
+    }
+    if threads:
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        model_kwargs["session_options"] = session_options
+    return SentenceTransformer(
+        str(path),
+        truncate_dim=dims or settings.embedding_model_dims,
+        backend="onnx",
+        model_kwargs=model_kwargs,
+    )
+
+
+def export_onnx_model(
+    name: Optional[str] = None, quantization: Optional[str] = None
+) -> Path:
+    """
+    Export a model to ONNX and quantize it to int8, once, for the ONNX backends.
+
+    The quantization is dynamic: weights are stored as int8 and activations are
+    quantized on the fly, so no calibration data is needed. Exports that already
+    exist are kept.
+
+    Args:
+        name (Optional[str]): The sentence-transformers model name.
+        quantization (Optional[str]): The instruction set to quantize for, defaults
+            to settings.embedding_quantization.
+
+    Returns:
+        Path: The directory the model was exported to.
+    """
+    from sentence_transformers import (
+        SentenceTransformer,
+        export_dynamic_quantized_onnx_model,
+    )
+
+    name = name or settings.embedding_model_name
+    quantization = quantization or settings.embedding_quantization
+    path = get_onnx_model_dir(name)
+    file_name = _onnx_file_name("onnx-int8", quantization)
+    if (path / file_name).exists():
+        return path
+
+    if (path / _onnx_file_name("onnx", quantization)).exists():
+        model = SentenceTransformer(str(path), backend="onnx")
+    else:
+        # Uses the ONNX file of the model repository if there is one, or exports it
+        model = SentenceTransformer(
+            name, backend="onnx", cache_folder=settings.embedding_model_dir
+        )
+        model.save_pretrained(str(path))
+    export_dynamic_quantized_onnx_model(model, quantization, str(path))
+    return path
+
+
+def check_embedding_parity(
+    backend: Optional[str] = None,
+    texts: Optional[Sequence[str]] = None,
+    tolerance: float = 0.02,
+    name: Optional[str] = None,
+    dims: Optional[int] = None,
+) -> float:
+    """
+    Check that a backend embeds like PyTorch, at the truncated dimension.
+
+    Stored embeddings and query embeddings must come from equivalent models, so run
+    this before switching the backend of an existing store.
+
+    Args:
+        backend (Optional[str]): The backend to check, defaults to
+            settings.embedding_backend.
+        texts (Optional[Sequence[str]]): The texts to compare on, defaults to a few
+            memory-like sentences.
+        tolerance (float): The largest cosine distance allowed from the PyTorch
+            embedding of any text.
+        name (Optional[str]): The sentence-transformers model name.
+        dims (Optional[int]): The dimension embeddings are truncated to.
+
+    Returns:
+        float: The largest cosine distance found.
+    """
+    texts = list(texts or _PARITY_TEXTS)
+    baseline = load_embedding_model(name, dims, "torch").encode(
+        texts, normalize_embeddings=True
+    )
+    candidate = load_embedding_model(name, dims, backend).encode(
+        texts, normalize_embeddings=True
+    )
+    distance = float(np.max(1 - np.sum(np.asarray(baseline) * candidate, axis=1)))
+    if distance > tolerance:
+        raise ValueError(
+            f"Embeddings differ from PyTorch by a cosine distance of {distance:.4f}, "
+            f"more than {tolerance}."
+        )
+    return distance
+
+
+def get_embedding_model() -> "SentenceTransformer":
+    """
+    Get the shared embedding model, loading it on first use.
+
+    sentence_transformers (and torch) are only imported here, so processes that never
+    embed anything don't pay for the import or the model load.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _lock:
+            if _embedding_model is None:
+                start = time.perf_counter()
+                import sentence_transformers  # noqa: F401
+
+                startup_timings["embedding_import"] = time.perf_counter() - start
+                _embedding_model = load_embedding_model()
+                startup_timings["embedding_model_load"] = (
+                    time.perf_counter() - start - startup_timings["embedding_import"]
+                )
+    return _embedding_model
+
 
-embedding_model = SentenceTransformer(
-    settings.embedding_model_name,
-    truncate_dim=settings.embedding_model_dims,
-    cache_folder=settings.embedding_model_dir,
-)
+def __getattr__(name: str) -> Any:
+    # Keeps `from src.embedding.model import embedding_model` working, lazily
+    if name == "embedding_model":
+        return get_embedding_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
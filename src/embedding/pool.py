@@ -0,0 +1,207 @@
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from multiprocessing.queues import Queue
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from src.embedding.model import load_embedding_model
+from src.settings import settings
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# The model of a pool worker process, loaded once by its initializer
+_worker_model: Optional["SentenceTransformer"] = None
+
+
+def _init_worker(
+    name: str, dims: int, backend: str, threads: int, ready: "Queue[Optional[str]]"
+) -> None:
+    # Reports back to EmbeddingPool.start with None once the model is loaded, or
+    # the traceback if it fails. The workers share the cores, so each gets its
+    # share of intra-op threads, as more would only contend.
+    global _worker_model
+    try:
+        _worker_model = load_embedding_model(name, dims, backend, threads)
+    except BaseException:
+        ready.put(traceback.format_exc())
+        raise
+    ready.put(None)
+
+
+def _encode_into(
+    shm_name: str,
+    offset: int,
+    dims: int,
+    texts: list[str],
+    prompt_name: Optional[str],
+) -> None:
+    # Runs in a worker: tokenizes and encodes texts, writing the float32 embeddings
+    # into rows offset..offset + len(texts) of the caller's shared block
+    assert _worker_model is not None
+    embeddings = _worker_model.encode(
+        texts, prompt_name=prompt_name, convert_to_numpy=True
+    )
+    # Spawned workers share the caller's resource tracker, so attaching doesn't
+    # register the block a second time and the caller's unlink is the only one
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        rows = np.ndarray(
+            (len(texts), dims),
+            dtype=np.float32,
+            buffer=shm.buf,
+            offset=offset * dims * 4,
+        )
+        rows[:] = embeddings
+        del rows
+    finally:
+        shm.close()
+
+
+class EmbeddingPool:
+    """
+    Encodes texts on a pool of worker processes, each with its own model.
+
+    Tokenization and the pre and post-processing of encode hold the GIL, so threads
+    can't spread encode work over cores, while processes can. A call is split into
+    one chunk per worker, at most max_batch_size texts each, and the workers write
+    their float32 embeddings straight into a shared memory block, so results are
+    never pickled. Workers are started with spawn and load the model in their
+    initializer, so the first calls pay for the model loads unless start is called.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        max_batch_size: int = 64,
+        name: Optional[str] = None,
+        dims: Optional[int] = None,
+        backend: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            processes (int): The number of worker processes.
+            max_batch_size (int): The most texts sent to a worker at a time.
+            name (Optional[str]): The model name, defaults to settings.
+            dims (Optional[int]): The embedding dimension, defaults to settings.
+            backend (Optional[str]): The embedding backend, defaults to settings.
+        """
+        if processes <= 0:
+            raise ValueError("processes must be positive.")
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be positive.")
+        self.processes = processes
+        self.max_batch_size = max_batch_size
+        self.dims = dims or settings.embedding_model_dims
+        context = multiprocessing.get_context("spawn")
+        # Each worker's initializer reports here once, whenever the worker starts
+        self._ready: "Queue[Optional[str]]" = context.Queue()
+        self._ready_workers = 0
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(
+                name or settings.embedding_model_name,
+                self.dims,
+                backend or settings.embedding_backend,
+                max(1, (os.cpu_count() or 1) // processes),
+                self._ready,
+            ),
+        )
+
+    def start(self, timeout: Optional[float] = None) -> None:
+        """
+        Start every worker and wait until their models are loaded.
+
+        Args:
+            timeout (Optional[float]): The most seconds to wait, defaults to
+                settings.embedding_process_start_timeout.
+        """
+        timeout = timeout or settings.embedding_process_start_timeout
+        deadline = time.monotonic() + timeout
+        # The executor spawns a worker per task submitted while none is idle
+        for _ in range(self.processes - self._ready_workers):
+            self._executor.submit(os.getpid)
+        while self._ready_workers < self.processes:
+            try:
+                error = self._ready.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise TimeoutError(
+                    f"Only {self._ready_workers} of {self.processes} embedding "
+                    f"workers loaded their model within {timeout} seconds."
+                ) from None
+            if error is not None:
+                raise RuntimeError(
+                    f"An embedding worker failed to load its model:\n{error}"
+                )
+            self._ready_workers += 1
+
+    def encode(self, texts: list[str], prompt_name: Optional[str] = None) -> np.ndarray:
+        """
+        Embed texts on the worker processes.
+
+        Args:
+            texts (list[str]): The texts to embed.
+            prompt_name (Optional[str]): The model prompt to encode the texts with.
+
+        Returns:
+            np.ndarray: The float32 embeddings of the texts, one row per text.
+        """
+        if not texts:
+            return np.zeros((0, self.dims), dtype=np.float32)
+        chunk = min(self.max_batch_size, math.ceil(len(texts) / self.processes))
+        shm = shared_memory.SharedMemory(create=True, size=len(texts) * self.dims * 4)
+        try:
+            futures = [
+                self._executor.submit(
+                    _encode_into,
+                    shm.name,
+                    start,
+                    self.dims,
+                    texts[start : start + chunk],
+                    prompt_name,
+                )
+                for start in range(0, len(texts), chunk)
+            ]
+            # Every chunk is done with the block before it is unlinked, even on errors
+            wait(futures)
+            for future in futures:
+                future.result()
+            return np.ndarray(
+                (len(texts), self.dims), dtype=np.float32, buffer=shm.buf
+            ).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+
+_embedding_pool: Optional[EmbeddingPool] = None
+_lock = threading.Lock()
+
+
+def get_embedding_pool() -> Optional[EmbeddingPool]:
+    """
+    Get the shared embedding pool, creating it on first use, or None if
+    settings.embedding_processes is 0.
+    """
+    global _embedding_pool
+    if _embedding_pool is None and settings.embedding_processes:
+        with _lock:
+            if _embedding_pool is None:
+                _embedding_pool = EmbeddingPool(
+                    settings.embedding_processes,
+                    settings.embedding_process_batch_size,
+                )
+    return _embedding_pool
@@ -0,0 +1,11 @@
+from typing import Sequence, Union
+
+import numpy as np
+import numpy.typing as npt
+
+# A float32 embedding, or a batch of them with one row per text
+Embedding = npt.NDArray[np.float32]
+
+# What the query and store functions accept, anything np.asarray turns into one
+EmbeddingLike = Union[Embedding, Sequence[float]]
+EmbeddingsLike = Union[Embedding, Sequence[EmbeddingLike]]
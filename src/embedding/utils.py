@@ -1,9 +1,54 @@
-from sentence_transformers.util import cos_sim
-
-from src.embedding.model import embedding_model
-
-
-def get_text_embedding(text: list[str]) -> list[list[float]]:
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Hashable, Optional, Sequence, Union
+
+import numpy as np
+
+from src.embedding.batcher import EmbeddingBatcher
+from src.embedding.cache import query_embedding_cache
+from src.embedding.model import get_embedding_model
+from src.embedding.pool import get_embedding_pool
+from src.embedding.types import Embedding, EmbeddingLike, EmbeddingsLike
+from src.settings import settings
+
+# Bounded pool that runs encode calls off the event loop for the async helpers.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.embedding_max_workers, thread_name_prefix="embedding"
+)
+
+
+def _encode_unbatched(texts: list[str], prompt_name: Optional[str] = None) -> Embedding:
+    pool = get_embedding_pool()
+    if pool is not None:
+        return pool.encode(texts, prompt_name)
+    return np.asarray(
+        get_embedding_model().encode(texts, prompt_name=prompt_name), np.float32
+    )
+
+
+embedding_batcher: Optional[EmbeddingBatcher] = (
+    EmbeddingBatcher(
+        _encode_unbatched,
+        max_batch_size=settings.embedding_batch_size,
+        max_wait_ms=settings.embedding_batch_wait_ms,
+    )
+    if settings.embedding_batching
+    else None
+)
+
+
+def _encode(texts: list[str], prompt_name: Optional[str] = None) -> Embedding:
+    # Small requests are coalesced with concurrent callers when batching is enabled
+    if embedding_batcher is not None and len(texts) < embedding_batcher.max_batch_size:
+        embeddings = embedding_batcher.encode(texts, prompt_name)
+        if not embeddings:
+            return np.zeros((0, settings.embedding_model_dims), dtype=np.float32)
+        return np.stack(embeddings)
+    return _encode_unbatched(texts, prompt_name)
+
+
+def get_text_embedding(text: list[str]) -> Embedding:
     """
     Get the embedding of a text using the embedding model.
 
@@ -11,12 +56,12 @@ def get_text_embedding(text: list[str]) -> list[list[float]]:
         text (list[str]): The text to get the embedding for.
 
     Returns:
-        list[list[float]]: The embedding of the text.
+        Embedding: The float32 embedding of each text, one row per text.
     """
-    return embedding_model.encode(text).tolist()  # type: ignore
+    return _encode(text)
 
 
-def get_query_embedding(query: str) -> list[float]:
+def get_query_embedding(query: str) -> Embedding:
     """
     Get the embedding of a query using the embedding model.
 
@@ -24,12 +69,57 @@ def get_query_embedding(query: str) -> list[float]:
         query (str): The query to get the embedding for.
 
     Returns:
-        list[float]: The embedding of the query.
+        Embedding: The float32 embedding of the query, read-only when cached.
+    """
+    if query_embedding_cache is None:
+        return _encode([query], "query")[0]
+    key = query_embedding_cache.make_key(
+        query, settings.embedding_model_name, settings.embedding_model_dims, "query"
+    )
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = _encode([query], "query")[0]
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+def get_query_embeddings(queries: list[str]) -> Embedding:
     """
-    return embedding_model.encode(query, prompt_name="query").tolist()  # type: ignore
+    Get the embeddings of several queries, encoding every uncached one in one batch.
 
+    Args:
+        queries (list[str]): The queries to get the embeddings for.
 
-async def aget_text_embedding(text: list[str]) -> list[list[float]]:
+    Returns:
+        Embedding: The float32 embedding of each query, one row per query, in
+            input order.
+    """
+    if query_embedding_cache is None or not queries:
+        return _encode(queries, "query")
+    keys = [
+        query_embedding_cache.make_key(
+            query, settings.embedding_model_name, settings.embedding_model_dims, "query"
+        )
+        for query in queries
+    ]
+    cached = [query_embedding_cache.get(key) for key in keys]
+    missing = [i for i, embedding in enumerate(cached) if embedding is None]
+    if not missing:
+        return np.stack(cached)  # type: ignore
+    encoded = _encode([queries[i] for i in missing], "query")
+    for i, embedding in zip(missing, encoded):
+        query_embedding_cache.set(keys[i], embedding)
+    if len(missing) == len(queries):
+        return encoded
+    embeddings = np.empty((len(queries), encoded.shape[1]), dtype=np.float32)
+    for i, embedding in enumerate(cached):
+        if embedding is not None:
+            embeddings[i] = embedding
+    embeddings[missing] = encoded
+    return embeddings
+
+
+async def aget_text_embedding(text: list[str]) -> Embedding:
     """
     Get the embedding of a text using the embedding model asynchronously.
 
@@ -37,12 +127,13 @@ async def aget_text_embedding(text: list[str]) -> list[list[float]]:
         text (list[str]): The text to get the embedding for.
 
     Returns:
-        list[list[float]]: The embedding of the text.
+        Embedding: The float32 embedding of each text, one row per text.
     """
-    return await embedding_model.encode(text).tolist()  # type: ignore
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, get_text_embedding, text)
 
 
-async def aget_query_embedding(query: str) -> list[float]:
+async def aget_query_embedding(query: str) -> Embedding:
     """
     Get the embedding of a query using the embedding model asynchronously.
 
@@ -50,23 +141,90 @@ async def aget_query_embedding(query: str) -> list[float]:
         query (str): The query to get the embedding for.
 
     Returns:
-        list[float]: The embedding of the query.
+        Embedding: The float32 embedding of the query, read-only when cached.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, get_query_embedding, query)
+
+
+async def aget_query_embeddings(queries: list[str]) -> Embedding:
+    """
+    Get the embeddings of several queries using the embedding model asynchronously.
+
+    Args:
+        queries (list[str]): The queries to get the embeddings for.
+
+    Returns:
+        Embedding: The float32 embedding of each query, in input order.
     """
-    return await embedding_model.encode(query, prompt_name="query").tolist()  # type: ignore
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, get_query_embeddings, queries)
+
+
+def _cosine_similarity(a: EmbeddingsLike, b: EmbeddingsLike) -> np.ndarray:
+    # Zero vectors score 0 against everything, as in sentence_transformers' cos_sim
+    a = np.atleast_2d(np.asarray(a, dtype=np.float32))
+    b = np.atleast_2d(np.asarray(b, dtype=np.float32))
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
 
 
 def get_similarity_scores(
-    query_embedding: list[float], doc_embeddings: list[list[float]]
-) -> list[float]:
+    query_embedding: Union[EmbeddingLike, EmbeddingsLike],
+    doc_embeddings: EmbeddingsLike,
+) -> Union[list[float], list[list[float]]]:
     """
     Get the similarity scores between a query embedding and document embeddings.
 
     Args:
-        query_embedding (list[float]): The embedding of the query.
-        doc_embeddings (list[float]): The embeddings of the documents.
+        query_embedding (Union[EmbeddingLike, EmbeddingsLike]): The embedding of the
+            query, or several embeddings to score as a matrix in one call.
+        doc_embeddings (EmbeddingsLike): The embeddings of the documents.
+
+    Returns:
+        Union[list[float], list[list[float]]]: The similarity scores between the query
+            embedding and document embeddings, one row per query embedding.
+    """
+    return _cosine_similarity(query_embedding, doc_embeddings).tolist()
+
+
+def get_duplicate_indexes(
+    embeddings: EmbeddingsLike,
+    groups: Sequence[Hashable],
+    similarity: float,
+) -> list[int]:
+    """
+    Find the near-duplicates within a batch of embeddings.
+
+    Embeddings are only compared within their group, e.g. (user_id, category), with
+    one similarity matrix per group.
+
+    Args:
+        embeddings (EmbeddingsLike): The embeddings of the batch.
+        groups (Sequence[Hashable]): The group of each embedding.
+        similarity (float): The cosine similarity from which embeddings are duplicates.
 
     Returns:
-        list[float]: The similarity scores between the query embedding and document embeddings.
+        list[int]: For each embedding, the index of the first embedding of its group
+            that it duplicates, which is its own index if there is none.
     """
-    similarities = cos_sim(query_embedding, doc_embeddings)
-    return similarities.tolist()  # type: ignore
+    members: dict[Hashable, list[int]] = defaultdict(list)
+    for i, group in enumerate(groups):
+        members[group].append(i)
+    first = list(range(len(embeddings)))
+    if len(members) == len(first):
+        return first
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    for indexes in members.values():
+        if len(indexes) < 2:
+            continue
+        scores = _cosine_similarity(matrix[indexes], matrix[indexes])
+        kept = np.zeros(len(indexes), dtype=bool)
+        for a in range(len(indexes)):
+            matches = np.flatnonzero(kept[:a] & (scores[a, :a] >= similarity))
+            if matches.size:
+                first[indexes[a]] = indexes[int(matches[0])]
+            else:
+                kept[a] = True
+    return first
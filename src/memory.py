@@ -1,14 +1,126 @@
+import asyncio
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Any, AsyncContextManager, ContextManager, Optional
 
-from src.db import get_session
-from src.embedding import get_query_embedding
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.db import async_unit_of_work, get_async_session, get_session, unit_of_work
+from src.embedding import (
+    aget_query_embedding,
+    aget_query_embeddings,
+    aget_text_embedding,
+    get_query_embedding,
+    get_query_embeddings,
+    get_text_embedding,
+)
+from src.metrics import metrics
 from src.pydantics import MemorySearchResults, SemanticMemory
-from src.queries import create_user, get_user_by_name, search_memories_by_vector
+from src.queries import (
+    MemoryStore,
+    PgVectorStore,
+    PurgeStats,
+    SearchMemoryHit,
+    consolidate_memories,
+    create_user,
+    create_vector_index,
+    delete_memories_batch,
+    delete_memory,
+    drop_vector_index,
+    get_all_user_ids,
+    get_user_by_name,
+    insert_memories,
+    purge_batches,
+    rebuild_vector_index,
+    search_many_memory_hits,
+    search_memory_hits,
+)
+from src.queries.memory import _resolve_ranking
+from src.settings import settings
+
+
+def _hit_bytes(hit: SearchMemoryHit) -> int:
+    # IDs, timestamp and score are fixed size, the embedding is only there on request
+    size = 48 + len(hit.text.encode()) + len(hit.category.encode())
+    return size + getattr(hit.embedding, "nbytes", 0)
+
+
+def _to_results(hits: list[SearchMemoryHit], ranking: str) -> MemorySearchResults:
+    if metrics.enabled:
+        metrics.count(len(hits), sum(map(_hit_bytes, hits)))
+    with metrics.stage("convert"):
+        memories = [SemanticMemory.from_hit(h) for h in hits]
+    with metrics.stage("sort"):
+        return MemorySearchResults(memories=memories, ranking=ranking)
+
+
+def _dedupe_hits(
+    hits: list[list[SearchMemoryHit]], mode: str, ranking: str
+) -> list[list[SearchMemoryHit]]:
+    # Keep each memory only under the query it scored best for. Vector scores are
+    # distances, hybrid and decayed scores are relevance where higher is better.
+    sign = -1.0 if mode == "hybrid" or ranking == "decay" else 1.0
+    best: dict[uuid.UUID, tuple[float, int]] = {}
+    for i, query_hits in enumerate(hits):
+        for hit in query_hits:
+            key = (sign * hit.score, i)
+            if hit.id not in best or key < best[hit.id]:
+                best[hit.id] = key
+    return [
+        [hit for hit in query_hits if best[hit.id][1] == i]
+        for i, query_hits in enumerate(hits)
+    ]
+
+
+def _dedup_options(dedup_similarity: Optional[float]) -> tuple[float, str]:
+    if dedup_similarity is None:
+        dedup_similarity = settings.dedup_similarity
+    return dedup_similarity, settings.dedup_mode
+
+
+def _validate_queries(queries: list[str], user_id: uuid.UUID) -> None:
+    if not queries or not all(queries) or not user_id:
+        raise ValueError("Queries and user_id must be provided.")
+
+
+def _validate_memories(memories: list[tuple[str, str, uuid.UUID]]) -> None:
+    if not all(all([text, category, user_id]) for text, category, user_id in memories):
+        raise ValueError("Text, category, and user_id must be provided.")
+
+
+def _index_options(concurrently: bool) -> Optional[dict[str, Any]]:
+    # Concurrent index builds and drops can't run inside a transaction block
+    return {"isolation_level": "AUTOCOMMIT"} if concurrently else None
+
+
+def _find_user(session: Session, name: str) -> Optional[uuid.UUID]:
+    user = get_user_by_name(session, name)
+    if not user:
+        return None
+    return user.id
 
 
 class MemoryInterface:
+    def __init__(self, store: Optional[MemoryStore] = None) -> None:
+        """
+        Args:
+            store (Optional[MemoryStore]): The storage backend, defaults to PgVectorStore.
+        """
+        self.store = store or PgVectorStore()
+
+    def unit_of_work(self) -> ContextManager[Session]:
+        """
+        Group several calls into one transaction with a single commit, e.g.
+
+            with memory.unit_of_work():
+                user_id = memory.create_user("Paul")
+                memory.add_memory("Likes Python", "preferences", user_id)
+
+        Only applies to the PgVectorStore backend.
+        """
+        return unit_of_work()
+
     def search(
         self,
         query: str,
@@ -18,67 +130,436 @@ class MemoryInterface:
         date_to: Optional[datetime] = None,
         top_k: int = 30,
         threshold: float = 0.6,
+        recall: Optional[float] = None,
+        mode: str = "vector",
+        include_embeddings: bool = False,
+        ranking: Optional[str] = None,
+        half_life_days: Optional[float] = None,
     ) -> MemorySearchResults:
         if not any([query, user_id]):
             raise ValueError("Query and user_id must be provided.")
-        query_embedding = get_query_embedding(query)
-        with get_session() as session:
-            results = search_memories_by_vector(
-                session,
-                query_embedding,
-                user_id,
-                category,
-                date_from,
-                date_to,
-                top_k,
-                threshold,
-            )
-            if results:
-                memories = MemorySearchResults(
-                    memories=[
-                        SemanticMemory.from_dbo(m.memory, m.score) for m in results
-                    ],
+        ranking = _resolve_ranking(ranking)
+        with metrics.operation("search"):
+            with metrics.stage("embed"):
+                query_embedding = get_query_embedding(query)
+            with metrics.stage("query"):
+                hits = self.store.search(
+                    query,
+                    query_embedding,
+                    user_id,
+                    category,
+                    date_from,
+                    date_to,
+                    top_k,
+                    threshold,
+                    include_embeddings,
+                    recall,
+                    mode,
+                    ranking,
+                    half_life_days,
+                )
+            return _to_results(hits, ranking)
+
+    def search_many(
+        self,
+        queries: list[str],
+        user_id: uuid.UUID,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        recall: Optional[float] = None,
+        mode: str = "vector",
+        include_embeddings: bool = False,
+        ranking: Optional[str] = None,
+        half_life_days: Optional[float] = None,
+        dedupe: bool = False,
+    ) -> list[MemorySearchResults]:
+        """
+        Run several searches for the same user at once, e.g. one per sub-question.
+
+        The queries are embedded in one batch and, for the "vector" mode of the
+        PgVectorStore, searched in one round-trip. With dedupe, a memory matched
+        by several queries is only returned for the query it scored best for.
+        """
+        _validate_queries(queries, user_id)
+        ranking = _resolve_ranking(ranking)
+        with metrics.operation("search_many"):
+            with metrics.stage("embed"):
+                query_embeddings = get_query_embeddings(queries)
+            with metrics.stage("query"):
+                hits = self.store.search_many(
+                    queries,
+                    query_embeddings,
+                    user_id,
+                    category,
+                    date_from,
+                    date_to,
+                    top_k,
+                    threshold,
+                    include_embeddings,
+                    recall,
+                    mode,
+                    ranking,
+                    half_life_days,
                 )
-                return memories
-            else:
-                return MemorySearchResults(memories=[])
+            if dedupe:
+                hits = _dedupe_hits(hits, mode, ranking)
+            return [_to_results(query_hits, ranking) for query_hits in hits]
 
     def add_memory(
-        self, text: str, category: str, user_id: uuid.UUID
+        self,
+        text: str,
+        category: str,
+        user_id: uuid.UUID,
+        dedup_similarity: Optional[float] = None,
     ) -> SemanticMemory:
         if not any([text, category, user_id]):
             raise ValueError("Text, category, and user_id must be provided.")
-        with get_session() as session:
+        with metrics.operation("add"):
             memory = SemanticMemory(text=text, category=category, user_id=user_id)
-            memory.save(session)
-        return memory
+            with metrics.stage("embed"):
+                memory.text_embedding = get_text_embedding([text])[0]
+            with metrics.stage("query"):
+                memory.id = self.store.add_memories(
+                    [text],
+                    [memory.text_embedding],
+                    [category],
+                    [user_id],
+                    *_dedup_options(dedup_similarity),
+                )[0]
+            return memory
+
+    def add_memories(
+        self,
+        memories: list[tuple[str, str, uuid.UUID]],
+        dedup_similarity: Optional[float] = None,
+    ) -> list[uuid.UUID]:
+        _validate_memories(memories)
+        if not memories:
+            return []
+        texts = [text for text, _, _ in memories]
+        with metrics.operation("add_many"):
+            with metrics.stage("embed"):
+                embeddings = get_text_embedding(texts)
+            with metrics.stage("query"):
+                return self.store.add_memories(
+                    texts,
+                    embeddings,
+                    [category for _, category, _ in memories],
+                    [user_id for _, _, user_id in memories],
+                    *_dedup_options(dedup_similarity),
+                )
 
     def remove_memory_by_uuid(self, memory_id: uuid.UUID) -> bool:
         if not memory_id:
             raise ValueError("Memory ID must be provided.")
-        with get_session() as session:
-            memory = SemanticMemory.from_memory_uuid(session, memory_id)
-            if memory:
-                memory.delete(session)
-                return True
-            else:
-                raise ValueError(f"Memory with ID {memory_id} not found.")
-        return False
+        with metrics.operation("remove"), metrics.stage("query"):
+            deleted = self.store.delete_memory(memory_id)
+        if not deleted:
+            raise ValueError(f"Memory with ID {memory_id} not found.")
+        return True
+
+    def remove_memories(
+        self,
+        memory_ids: Optional[list[uuid.UUID]] = None,
+        user_id: Optional[uuid.UUID] = None,
+        category: Optional[str] = None,
+        older_than: Optional[datetime] = None,
+    ) -> PurgeStats:
+        """
+        Delete every memory matching all the given filters, e.g. all memories of a
+        user for an erasure request, or those of a category older than a cutoff.
+
+        Memories are deleted in batches of settings.purge_batch_size, each in its
+        own transaction unless called within unit_of_work.
+        """
+        with metrics.operation("purge"):
+            with metrics.stage("query"):
+                stats = self.store.delete_memories(
+                    memory_ids, user_id, category, older_than, settings.purge_batch_size
+                )
+            metrics.count(stats.memories, stats.bytes)
+        return stats
 
     def create_user(self, name: str) -> uuid.UUID:
         if not name:
             raise ValueError("Name must be provided.")
-        with get_session() as session:
-            user = create_user(session, name)
-            user_id = user.id
-        return user_id
+        return self.store.create_user(name)
 
     def find_user(self, name: str) -> Optional[uuid.UUID]:
         if not name:
             raise ValueError("Name must be provided.")
-        with get_session() as session:
-            user = get_user_by_name(session, name)
-            if not user:
-                return None
+        return self.store.find_user(name)
+
+    def consolidate_memories(
+        self, user_id: Optional[uuid.UUID] = None, similarity: Optional[float] = None
+    ) -> int:
+        """
+        Delete existing near-duplicate memories, keeping the newest of each.
+
+        Users are consolidated one transaction at a time, all of them unless a
+        user_id is given. Only applies to the PgVectorStore backend.
+
+        Returns:
+            int: The number of memories deleted.
+        """
+        similarity = similarity or settings.dedup_similarity
+        if not 0 < similarity <= 1:
+            raise ValueError("Similarity must be between 0 and 1.")
+        if user_id is None:
+            with get_session() as session:
+                user_ids = get_all_user_ids(session)
+        else:
+            user_ids = [user_id]
+        deleted = 0
+        with metrics.operation("consolidate"):
+            for id in user_ids:
+                with get_session() as session:
+                    deleted += consolidate_memories(session, id, similarity)
+        return deleted
+
+    def create_vector_index(
+        self,
+        method: Optional[str] = None,
+        m: Optional[int] = None,
+        ef_construction: Optional[int] = None,
+        lists: Optional[int] = None,
+        concurrently: bool = False,
+    ) -> None:
+        with get_session(_index_options(concurrently)) as session:
+            create_vector_index(
+                session, method, m, ef_construction, lists, concurrently
+            )
+
+    def rebuild_vector_index(
+        self,
+        method: Optional[str] = None,
+        m: Optional[int] = None,
+        ef_construction: Optional[int] = None,
+        lists: Optional[int] = None,
+        concurrently: bool = False,
+    ) -> None:
+        with get_session(_index_options(concurrently)) as session:
+            rebuild_vector_index(
+                session, method, m, ef_construction, lists, concurrently
+            )
+
+    def drop_vector_index(self, concurrently: bool = False) -> None:
+        with get_session(_index_options(concurrently)) as session:
+            drop_vector_index(session, concurrently)
+
+
+class AsyncMemoryInterface:
+    """
+    asyncio counterpart of MemoryInterface.
+
+    Database work runs on an asyncpg-backed AsyncSession and embedding work runs
+    in the bounded embedding executor, so no call blocks the event loop.
+    """
+
+    def unit_of_work(self) -> AsyncContextManager[AsyncSession]:
+        """
+        Group several awaited calls into one transaction with a single commit.
+        """
+        return async_unit_of_work()
+
+    async def search(
+        self,
+        query: str,
+        user_id: uuid.UUID,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        recall: Optional[float] = None,
+        mode: str = "vector",
+        include_embeddings: bool = False,
+        ranking: Optional[str] = None,
+        half_life_days: Optional[float] = None,
+    ) -> MemorySearchResults:
+        if not any([query, user_id]):
+            raise ValueError("Query and user_id must be provided.")
+        ranking = _resolve_ranking(ranking)
+        with metrics.operation("search"):
+            with metrics.stage("embed"):
+                query_embedding = await aget_query_embedding(query)
+            with metrics.stage("query"):
+                async with get_async_session() as session:
+                    hits = await session.run_sync(
+                        search_memory_hits,
+                        query,
+                        query_embedding,
+                        user_id,
+                        category,
+                        date_from,
+                        date_to,
+                        top_k,
+                        threshold,
+                        include_embeddings,
+                        recall,
+                        mode,
+                        ranking,
+                        half_life_days,
+                    )
+            return _to_results(hits, ranking)
+
+    async def search_many(
+        self,
+        queries: list[str],
+        user_id: uuid.UUID,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        recall: Optional[float] = None,
+        mode: str = "vector",
+        include_embeddings: bool = False,
+        ranking: Optional[str] = None,
+        half_life_days: Optional[float] = None,
+        dedupe: bool = False,
+    ) -> list[MemorySearchResults]:
+        """
+        asyncio counterpart of MemoryInterface.search_many.
+        """
+        _validate_queries(queries, user_id)
+        ranking = _resolve_ranking(ranking)
+        with metrics.operation("search_many"):
+            with metrics.stage("embed"):
+                query_embeddings = await aget_query_embeddings(queries)
+            with metrics.stage("query"):
+                async with get_async_session() as session:
+                    hits = await session.run_sync(
+                        search_many_memory_hits,
+                        queries,
+                        query_embeddings,
+                        user_id,
+                        category,
+                        date_from,
+                        date_to,
+                        top_k,
+                        threshold,
+                        include_embeddings,
+                        recall,
+                        mode,
+                        ranking,
+                        half_life_days,
+                    )
+            if dedupe:
+                hits = _dedupe_hits(hits, mode, ranking)
+            return [_to_results(query_hits, ranking) for query_hits in hits]
+
+    async def add_memory(
+        self,
+        text: str,
+        category: str,
+        user_id: uuid.UUID,
+        dedup_similarity: Optional[float] = None,
+    ) -> SemanticMemory:
+        if not any([text, category, user_id]):
+            raise ValueError("Text, category, and user_id must be provided.")
+        with metrics.operation("add"):
+            memory = SemanticMemory(text=text, category=category, user_id=user_id)
+            with metrics.stage("embed"):
+                memory.text_embedding = (await aget_text_embedding([text]))[0]
+            with metrics.stage("query"):
+                async with get_async_session() as session:
+                    ids = await session.run_sync(
+                        insert_memories,
+                        [text],
+                        [memory.text_embedding],
+                        [category],
+                        [user_id],
+                        *_dedup_options(dedup_similarity),
+                    )
+            memory.id = ids[0]
+            return memory
+
+    async def add_memories(
+        self,
+        memories: list[tuple[str, str, uuid.UUID]],
+        dedup_similarity: Optional[float] = None,
+    ) -> list[uuid.UUID]:
+        _validate_memories(memories)
+        if not memories:
+            return []
+        texts = [text for text, _, _ in memories]
+        with metrics.operation("add_many"):
+            with metrics.stage("embed"):
+                embeddings = await aget_text_embedding(texts)
+            with metrics.stage("query"):
+                async with get_async_session() as session:
+                    ids = await session.run_sync(
+                        insert_memories,
+                        texts,
+                        embeddings,
+                        [category for _, category, _ in memories],
+                        [user_id for _, _, user_id in memories],
+                        *_dedup_options(dedup_similarity),
+                    )
+            return ids
+
+    async def remove_memory_by_uuid(self, memory_id: uuid.UUID) -> bool:
+        if not memory_id:
+            raise ValueError("Memory ID must be provided.")
+        with metrics.operation("remove"), metrics.stage("query"):
+            async with get_async_session() as session:
+                deleted = await session.run_sync(delete_memory, memory_id)
+        if not deleted:
+            raise ValueError(f"Memory with ID {memory_id} not found.")
+        return True
+
+    async def remove_memories(
+        self,
+        memory_ids: Optional[list[uuid.UUID]] = None,
+        user_id: Optional[uuid.UUID] = None,
+        category: Optional[str] = None,
+        older_than: Optional[datetime] = None,
+    ) -> PurgeStats:
+        """
+        asyncio counterpart of MemoryInterface.remove_memories.
+        """
+        batch_size = settings.purge_batch_size
+        memories = size = 0
+        batches = purge_batches(memory_ids, batch_size)
+        with metrics.operation("purge"):
+            with metrics.stage("query"):
+                try:
+                    id_batch, pause = next(batches)
+                    while True:
+                        if pause and settings.purge_pause_ms:
+                            await asyncio.sleep(settings.purge_pause_ms / 1000)
+                        async with get_async_session() as session:
+                            stats = await session.run_sync(
+                                delete_memories_batch,
+                                id_batch,
+                                user_id,
+                                category,
+                                older_than,
+                                batch_size,
+                            )
+                        memories += stats.memories
+                        size += stats.bytes
+                        id_batch, pause = batches.send(stats.memories)
+                except StopIteration:
+                    pass
+            metrics.count(memories, size)
+        return PurgeStats(memories, size)
+
+    async def create_user(self, name: str) -> uuid.UUID:
+        if not name:
+            raise ValueError("Name must be provided.")
+        async with get_async_session() as session:
+            user = await session.run_sync(create_user, name)
             user_id = user.id
         return user_id
+
+    async def find_user(self, name: str) -> Optional[uuid.UUID]:
+        if not name:
+            raise ValueError("Name must be provided.")
+        async with get_async_session() as session:
+            user_id = await session.run_sync(_find_user, name)
+        return user_id
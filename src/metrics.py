@@ -0,0 +1,239 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Optional
+
+_NULL_CONTEXT = nullcontext()
+
+# The operation being timed in the current thread or task, for its stages
+_current_operation: ContextVar[Optional[str]] = ContextVar(
+    "current_operation", default=None
+)
+
+
+@dataclass(frozen=True)
+class MetricEvent:
+    """
+    A timed stage of an operation, or the rows and bytes an operation returned.
+
+    The whole operation is reported as the "total" stage, result sizes as the
+    "result" stage with seconds left at 0.
+    """
+
+    operation: str
+    stage: str
+    seconds: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+
+
+MetricSink = Callable[[MetricEvent], None]
+
+
+class _Timer:
+    __slots__ = ("metrics", "operation", "stage", "token", "span", "start")
+
+    def __init__(self, metrics: "Metrics", operation: str, stage: str) -> None:
+        self.metrics = metrics
+        self.operation = operation
+        self.stage = stage
+        self.token: Any = None
+        self.span: Optional[ContextManager[Any]] = None
+
+    def __enter__(self) -> "_Timer":
+        if self.stage == "total":
+            self.token = _current_operation.set(self.operation)
+        tracer = self.metrics._tracer
+        if tracer is not None:
+            name = f"memory.{self.operation}"
+            if self.stage != "total":
+                name = f"{name}.{self.stage}"
+            self.span = tracer.start_as_current_span(name)
+            self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        seconds = time.perf_counter() - self.start
+        if self.span is not None:
+            self.span.__exit__(*exc_info)
+        if self.token is not None:
+            _current_operation.reset(self.token)
+        self.metrics.emit(MetricEvent(self.operation, self.stage, seconds))
+
+
+class Metrics:
+    """
+    Timing and result-size hooks around the stages of MemoryInterface calls.
+
+    Nothing is measured until a sink is added or OpenTelemetry is enabled: the
+    context managers are then a shared no-op and the hot paths only pay for an
+    attribute check. Sinks are called synchronously with every MetricEvent, so
+    they should be cheap, e.g. PrometheusExporter.record.
+    """
+
+    def __init__(self) -> None:
+        self._sinks: list[MetricSink] = []
+        self._tracer: Any = None
+        self.enabled = False
+
+    def add_sink(self, sink: MetricSink) -> None:
+        self._sinks.append(sink)
+        self.enabled = True
+
+    def remove_sink(self, sink: MetricSink) -> None:
+        self._sinks.remove(sink)
+        self.enabled = bool(self._sinks) or self._tracer is not None
+
+    def enable_opentelemetry(self, tracer_provider: Any = None) -> None:
+        """
+        Wrap every operation and stage in an OpenTelemetry span.
+
+        Args:
+            tracer_provider (Any): The TracerProvider to use, defaults to the global one.
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError(
+                "OpenTelemetry spans require the opentelemetry-api package."
+            ) from e
+        self._tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider)
+        self.enabled = True
+
+    def disable_opentelemetry(self) -> None:
+        self._tracer = None
+        self.enabled = bool(self._sinks)
+
+    def operation(self, name: str) -> ContextManager[Any]:
+        """
+        Time a whole operation, e.g. "search", which its stages are attributed to.
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, name, "total")
+
+    def stage(self, name: str) -> ContextManager[Any]:
+        """
+        Time a stage of the current operation, e.g. "embed" or "query".
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, _current_operation.get() or "other", name)
+
+    def count(self, rows: int, bytes: int = 0) -> None:
+        """
+        Record the rows and bytes returned by the current operation.
+        """
+        if self.enabled:
+            operation = _current_operation.get() or "other"
+            self.emit(MetricEvent(operation, "result", rows=rows, bytes=bytes))
+
+    def emit(self, event: MetricEvent) -> None:
+        for sink in self._sinks:
+            sink(event)
+
+
+metrics = Metrics()
+
+
+class PrometheusExporter:
+    """
+    Metrics sink that aggregates events and renders them in the Prometheus text format.
+
+        exporter = PrometheusExporter()
+        metrics.add_sink(exporter.record)
+        ...
+        body = exporter.render()  # serve on /metrics
+    """
+
+    DEFAULT_BUCKETS = (
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    )
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # (operation, stage) -> per-bucket counts, with a final +Inf bucket
+        self._histograms: dict[tuple[str, str], list[int]] = {}
+        self._sums: dict[tuple[str, str], float] = {}
+        self._rows: dict[str, int] = {}
+        self._bytes: dict[str, int] = {}
+
+    def record(self, event: MetricEvent) -> None:
+        with self._lock:
+            if event.stage == "result":
+                self._rows[event.operation] = (
+                    self._rows.get(event.operation, 0) + event.rows
+                )
+                self._bytes[event.operation] = (
+                    self._bytes.get(event.operation, 0) + event.bytes
+                )
+                return
+            key = (event.operation, event.stage)
+            counts = self._histograms.get(key)
+            if counts is None:
+                counts = self._histograms[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[bisect_left(self.buckets, event.seconds)] += 1
+            self._sums[key] += event.seconds
+
+    def render(self) -> str:
+        lines = [
+            "# HELP memory_stage_duration_seconds Time spent in each stage of memory operations.",
+            "# TYPE memory_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (operation, stage), counts in sorted(self._histograms.items()):
+                labels = f'operation="{operation}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(
+                        f'memory_stage_duration_seconds_bucket{{{labels},le="{bound}"}} '
+                        f"{cumulative}"
+                    )
+                cumulative += counts[-1]
+                lines.append(
+                    f'memory_stage_duration_seconds_bucket{{{labels},le="+Inf"}} '
+                    f"{cumulative}"
+                )
+                lines.append(
+                    f"memory_stage_duration_seconds_sum{{{labels}}} "
+                    f"{self._sums[(operation, stage)]}"
+                )
+                lines.append(
+                    f"memory_stage_duration_seconds_count{{{labels}}} {cumulative}"
+                )
+            for name, help, values in (
+                ("memory_result_rows_total", "Rows returned.", self._rows),
+                ("memory_result_bytes_total", "Bytes returned.", self._bytes),
+            ):
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} counter")
+                for operation, value in sorted(values.items()):
+                    lines.append(f'{name}{{operation="{operation}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._sums.clear()
+            self._rows.clear()
+            self._bytes.clear()
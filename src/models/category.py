@@ -12,5 +12,5 @@ if TYPE_CHECKING:
 class MemoryCategory(BaseSchema):
     __tablename__ = "memory_categories"
 
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True)
     memories = relationship("Memory", back_populates="category")
@@ -1,7 +1,10 @@
-from typing import TYPE_CHECKING
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Optional, Union
 
-from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, ForeignKey, String
+import numpy as np
+from pgvector.sqlalchemy import HALFVEC, Vector
+from sqlalchemy import Column, Computed, Dialect, ForeignKey, Index, String
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import mapped_column, relationship
 
 from src.models.base import BaseSchema
@@ -12,11 +15,110 @@ if TYPE_CHECKING:
     from src.models.user import User  # noqa: F401
 
 
+@lru_cache(maxsize=8)
+def _vector_format(dims: int) -> str:
+    # 9 significant digits round-trip any float32
+    return "[" + ",".join(["%.9g"] * dims) + "]"
+
+
+def vector_literal(embedding: Any) -> str:
+    """
+    Format an embedding as a pgvector text literal, e.g. "[0.1,0.2]".
+
+    Args:
+        embedding (Any): The embedding, as an array or a sequence of floats.
+
+    Returns:
+        str: The literal, with each value at float32 precision.
+    """
+    values = np.asarray(embedding, dtype=np.float32).tolist()
+    return _vector_format(len(values)) % tuple(values)
+
+
+def _to_array(value: Any) -> Optional[np.ndarray]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return np.fromstring(value[1:-1], sep=",", dtype=np.float32)
+    if hasattr(value, "to_numpy"):
+        # HalfVector, from halfvec columns
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+class _EmbeddingType:
+    """
+    Binds and returns embeddings as float32 NumPy arrays.
+
+    On asyncpg, src.db registers pgvector's binary codecs on every connection, so
+    arrays go over the wire as packed floats in both directions. psycopg2 has no
+    binary parameters, so arrays are sent as text literals, formatted in one pass
+    rather than float by float.
+    """
+
+    dim: Optional[int]
+
+    def bind_processor(self, dialect: Dialect) -> Callable[[Any], Any]:
+        dim = self.dim
+        binary = dialect.driver == "asyncpg"
+
+        def process(value: Any) -> Any:
+            if value is None or isinstance(value, str):
+                return value
+            array = np.asarray(value, dtype=np.float32)
+            if array.ndim != 1:
+                raise ValueError("expected ndim to be 1")
+            if dim is not None and len(array) != dim:
+                raise ValueError(f"expected {dim} dimensions, not {len(array)}")
+            return array if binary else vector_literal(array)
+
+        return process
+
+    def result_processor(
+        self, dialect: Dialect, coltype: Any
+    ) -> Callable[[Any], Optional[np.ndarray]]:
+        return _to_array
+
+
+class EmbeddingVector(_EmbeddingType, Vector):
+    cache_ok = True
+
+
+class EmbeddingHalfVector(_EmbeddingType, HALFVEC):
+    cache_ok = True
+
+
+EMBEDDING_STORAGE_TYPES = {"vector": EmbeddingVector, "halfvec": EmbeddingHalfVector}
+
+
+def _embedding_type(
+    storage: str, dims: int
+) -> Union[EmbeddingVector, EmbeddingHalfVector]:
+    if storage not in EMBEDDING_STORAGE_TYPES:
+        raise ValueError(
+            f"Unknown embedding storage {storage!r}, expected one of "
+            f"{tuple(EMBEDDING_STORAGE_TYPES)}."
+        )
+    return EMBEDDING_STORAGE_TYPES[storage](dims)
+
+
 class Memory(BaseSchema):
     __tablename__ = "memories"
+    __table_args__ = (
+        Index("ix_memories_text_search", "text_search", postgresql_using="gin"),
+        Index("ix_memories_user_id_created_at", "user_id", "created_at"),
+    )
 
     text = Column(String, nullable=False)
-    embedding = Column(Vector(settings.embedding_model_dims), nullable=False)
+    embedding = Column(
+        _embedding_type(settings.embedding_storage, settings.embedding_model_dims),
+        nullable=False,
+    )
+    text_search = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{settings.text_search_config}', text)", persisted=True),
+        deferred=True,
+    )
 
     category_id = mapped_column(ForeignKey("memory_categories.id"))
     category = relationship("MemoryCategory", back_populates="memories")
@@ -1,26 +1,61 @@
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, Any, Optional
 
-from pydantic import BaseModel, model_validator
+import numpy as np
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    ConfigDict,
+    PlainSerializer,
+    model_validator,
+)
 from sqlalchemy.orm import Session
 
 from src.embedding import get_text_embedding
+from src.embedding.types import Embedding
 from src.models import Memory
 from src.queries import (
+    SearchMemoryHit,
     create_memory,
+    delete_memory,
     get_memory_from_uuid,
-    get_or_create_category_by_name,
+    get_or_create_category_id,
+    insert_memories,
 )
+from src.settings import settings
+
+
+def _embedding_to_array(embedding: Any) -> Optional[Embedding]:
+    # Lists and arrays of other dtypes are converted once, float32 arrays as is
+    if embedding is None:
+        return None
+    array = np.asarray(embedding, dtype=np.float32)
+    if array.ndim != 1:
+        raise ValueError("Text embedding must be one-dimensional.")
+    return array
+
+
+# Kept as a float32 array rather than validated float by float, and written out as
+# a list of floats in JSON
+_EmbeddingField = Annotated[
+    Embedding,
+    BeforeValidator(_embedding_to_array),
+    PlainSerializer(lambda embedding: embedding.tolist(), when_used="json"),
+]
 
 
 class SemanticMemory(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     id: Optional[uuid.UUID] = None
     text: str
-    text_embedding: Optional[list[float]] = None
+    text_embedding: Optional[_EmbeddingField] = None
     category: str
     user_id: uuid.UUID
     created_at: Optional[datetime] = None
+    # The hit's score, see SearchMemoryHit: a cosine distance (lower is better) for
+    # vector searches, a relevance (higher is better) for "decay" and hybrid ones
     score: Optional[float] = None
 
     def __str__(self) -> str:
@@ -38,7 +73,7 @@ class SemanticMemory(BaseModel):
         return cls(
             id=memory.id,
             text=memory.text,
-            text_embedding=memory.embedding,
+            text_embedding=_embedding_to_array(memory.embedding),
             category=memory.category.name,
             user_id=memory.user.id,
             created_at=memory.created_at,
@@ -49,13 +84,26 @@ class SemanticMemory(BaseModel):
         return cls(
             id=dbo.id,
             text=dbo.text,
-            text_embedding=dbo.embedding,
+            text_embedding=_embedding_to_array(dbo.embedding),
             category=dbo.category.name,
             user_id=dbo.user.id,
             score=score,
             created_at=dbo.created_at,
         )
 
+    @classmethod
+    def from_hit(cls, hit: SearchMemoryHit) -> "SemanticMemory":
+        # Hits come straight from typed columns, so validation is skipped
+        return cls.model_construct(
+            id=hit.id,
+            text=hit.text,
+            text_embedding=_embedding_to_array(hit.embedding),
+            category=hit.category,
+            user_id=hit.user_id,
+            score=hit.score,
+            created_at=hit.created_at,
+        )
+
     def _embed_text(self) -> None:
         if self.text_embedding is None:
             self.text_embedding = get_text_embedding([self.text])[0]
@@ -64,31 +112,72 @@ class SemanticMemory(BaseModel):
         self._embed_text()
         if self.text_embedding is None:
             raise ValueError("Text embedding must be provided.")
-        category = get_or_create_category_by_name(session, self.category)
+        if settings.dedup_similarity:
+            # May merge into an existing memory, whose row is returned instead
+            self.id = insert_memories(
+                session,
+                texts=[self.text],
+                embeddings=[self.text_embedding],
+                categories=[self.category],
+                user_ids=[self.user_id],
+                dedup_similarity=settings.dedup_similarity,
+                dedup_mode=settings.dedup_mode,
+            )[0]
+            stored = get_memory_from_uuid(session, self.id)
+            assert stored is not None
+            return stored
+        category_id = get_or_create_category_id(session, self.category)
         memory = create_memory(
             session,
             text=self.text,
             embedding=self.text_embedding,
             user_id=self.user_id,
-            category=category,
+            category_id=category_id,
         )
         return memory
 
+    @classmethod
+    def save_many(
+        cls, session: Session, memories: list["SemanticMemory"]
+    ) -> list[uuid.UUID]:
+        if not memories:
+            return []
+        to_embed = [m for m in memories if m.text_embedding is None]
+        if to_embed:
+            embeddings = get_text_embedding([m.text for m in to_embed])
+            for memory, embedding in zip(to_embed, embeddings):
+                memory.text_embedding = embedding
+
+        ids = insert_memories(
+            session,
+            texts=[m.text for m in memories],
+            embeddings=[m.text_embedding for m in memories],  # type: ignore
+            categories=[m.category for m in memories],
+            user_ids=[m.user_id for m in memories],
+            dedup_similarity=settings.dedup_similarity,
+            dedup_mode=settings.dedup_mode,
+        )
+        for memory, id in zip(memories, ids):
+            memory.id = id
+        return ids
+
     def delete(self, session: Session) -> None:
         if self.id is None:
             raise ValueError("Memory ID must be provided.")
-        memory = get_memory_from_uuid(session, self.id)
-        if memory is None:
+        if not delete_memory(session, self.id):
             raise ValueError(f"Memory with ID {self.id} not found.")
-        session.delete(memory)
-        session.commit()
 
 
 class MemorySearchResults(BaseModel):
     memories: list[SemanticMemory]
+    # The ranking the memories were searched with, whose order is kept as is.
+    # Without one the memories are sorted newest first.
+    ranking: Optional[str] = None
 
     @model_validator(mode="after")
     def memory_sort_by_created_date(self) -> "MemorySearchResults":
+        if self.ranking is not None:
+            return self
         dated_memories = [
             m for m in self.memories if isinstance(m.created_at, datetime)
         ]
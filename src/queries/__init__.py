@@ -1,22 +1,161 @@
+from src.queries.backends import (
+    MemoryStore,
+    NumpyMemoryStore,
+    PgVectorStore,
+    delete_memory,
+    insert_memories,
+    search_many_memory_hits,
+    search_memory_hits,
+)
+from src.queries.cache import LookupCache, lookup_cache
 from src.queries.category import (
+    category_exists,
     create_category,
+    delete_category,
     get_category_by_name,
+    get_category_id,
     get_or_create_category_by_name,
+    get_or_create_category_id,
+    get_or_create_category_ids,
+    merge_duplicate_categories,
+)
+from src.queries.index import (
+    create_text_search_index,
+    create_user_date_index,
+    create_vector_index,
+    drop_vector_index,
+    rebuild_vector_index,
+    set_vector_search_recall,
+    supports_iterative_scan,
 )
 from src.queries.memory import (
+    DEDUP_MODES,
+    SEARCH_RANKINGS,
+    SearchMemoryHit,
+    consolidate_memories,
+    create_memories,
     create_memory,
+    find_duplicate_memories,
     get_memory_from_uuid,
+    merge_duplicate_memories,
     search_memories_by_vector,
+    search_memories_hybrid,
+    search_memory_hits_by_vector,
+    search_memory_hits_by_vectors,
+)
+from src.queries.partition import (
+    MEMORY_TIME_PARTITIONS,
+    create_time_partitions,
+    is_memories_partitioned,
+    partition_memories,
+)
+from src.queries.planner import SearchPlan, plan_search
+from src.queries.reembed import (
+    ReembedCheckpoint,
+    check_embedding_model,
+    create_shadow_vector_index,
+    cutover_embeddings,
+    drop_previous_embeddings,
+    estimate_memory_count,
+    lock_memories_for_cutover,
+    prepare_reembedding,
+    record_embedding_model,
+    save_reembed_checkpoint,
+    set_embedding_model,
+    stream_pending_reembeddings,
+    validate_embedding_constraint,
+    write_shadow_embeddings,
+)
+from src.queries.retention import PurgeStats, delete_memories_batch, purge_batches
+from src.queries.transfer import (
+    ExportedMemory,
+    copy_memories_in,
+    copy_memories_out,
+    import_users,
+    stream_users,
+)
+from src.queries.user import (
+    create_user,
+    delete_user,
+    get_all_user_ids,
+    get_existing_user_ids,
+    get_user_by_name,
+    get_users_by_ids,
+    user_exists,
 )
-from src.queries.user import create_user, get_user_by_name
 
 __all__ = [
+    "DEDUP_MODES",
+    "SEARCH_RANKINGS",
+    "consolidate_memories",
+    "find_duplicate_memories",
+    "merge_duplicate_memories",
     "create_category",
     "create_memory",
+    "create_memories",
     "create_user",
+    "delete_user",
     "get_memory_from_uuid",
     "get_or_create_category_by_name",
+    "get_or_create_category_id",
+    "get_or_create_category_ids",
+    "category_exists",
+    "merge_duplicate_categories",
+    "delete_category",
     "search_memories_by_vector",
+    "search_memories_hybrid",
+    "search_memory_hits_by_vector",
+    "search_memory_hits_by_vectors",
+    "SearchMemoryHit",
     "get_category_by_name",
+    "get_category_id",
     "get_user_by_name",
+    "get_users_by_ids",
+    "get_all_user_ids",
+    "get_existing_user_ids",
+    "user_exists",
+    "LookupCache",
+    "lookup_cache",
+    "create_text_search_index",
+    "create_user_date_index",
+    "create_vector_index",
+    "drop_vector_index",
+    "rebuild_vector_index",
+    "set_vector_search_recall",
+    "supports_iterative_scan",
+    "SearchPlan",
+    "plan_search",
+    "MemoryStore",
+    "NumpyMemoryStore",
+    "PgVectorStore",
+    "delete_memory",
+    "insert_memories",
+    "search_memory_hits",
+    "search_many_memory_hits",
+    "MEMORY_TIME_PARTITIONS",
+    "create_time_partitions",
+    "is_memories_partitioned",
+    "partition_memories",
+    "PurgeStats",
+    "delete_memories_batch",
+    "purge_batches",
+    "ExportedMemory",
+    "copy_memories_in",
+    "copy_memories_out",
+    "import_users",
+    "stream_users",
+    "ReembedCheckpoint",
+    "create_shadow_vector_index",
+    "cutover_embeddings",
+    "check_embedding_model",
+    "record_embedding_model",
+    "set_embedding_model",
+    "drop_previous_embeddings",
+    "estimate_memory_count",
+    "lock_memories_for_cutover",
+    "prepare_reembedding",
+    "save_reembed_checkpoint",
+    "stream_pending_reembeddings",
+    "validate_embedding_constraint",
+    "write_shadow_embeddings",
 ]
@@ -0,0 +1,19 @@
+from src.queries.backends.base import MemoryStore
+from src.queries.backends.numpy_store import NumpyMemoryStore
+from src.queries.backends.pgvector import (
+    PgVectorStore,
+    delete_memory,
+    insert_memories,
+    search_many_memory_hits,
+    search_memory_hits,
+)
+
+__all__ = [
+    "MemoryStore",
+    "NumpyMemoryStore",
+    "PgVectorStore",
+    "delete_memory",
+    "insert_memories",
+    "search_many_memory_hits",
+    "search_memory_hits",
+]
@@ -0,0 +1,195 @@
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional, Sequence
+
+from src.embedding.types import EmbeddingLike, EmbeddingsLike
+from src.queries.memory import SearchMemoryHit
+from src.queries.retention import PurgeStats
+
+
+class MemoryStore(ABC):
+    """
+    Storage backend behind MemoryInterface.
+
+    A store persists users, categories and embedded memories, and answers filtered
+    top-k searches over them. Embedding happens before the store is called, so
+    stores only ever see vectors.
+    """
+
+    @abstractmethod
+    def search(
+        self,
+        query: str,
+        query_embedding: EmbeddingLike,
+        user_id: uuid.UUID,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        include_embeddings: bool = False,
+        recall: Optional[float] = None,
+        mode: str = "vector",
+        ranking: Optional[str] = None,
+        half_life_days: Optional[float] = None,
+    ) -> list[SearchMemoryHit]:
+        """
+        Search a user's memories, best first under the ranking.
+
+        Args:
+            query (str): The raw query text, used by lexical search modes.
+            query_embedding (EmbeddingLike): The embedding vector to search for.
+            user_id (uuid.UUID): The ID of the user associated with the memories.
+            category (Optional[str]): The category to filter memories by.
+            date_from (Optional[datetime]): The start date to filter memories by.
+            date_to (Optional[datetime]): The end date to filter memories by.
+            top_k (int): The number of top results to return.
+            threshold (float): The threshold for cosine distance.
+            include_embeddings (bool): Whether to return the stored embedding of each hit.
+            recall (Optional[float]): The recall-vs-latency knob for approximate indexes.
+            mode (str): The search mode, "vector" or, where supported, "hybrid".
+            ranking (Optional[str]): "similarity", "recency" or "decay", applied
+                before top_k is taken. Defaults to settings.search_ranking.
+            half_life_days (Optional[float]): The half-life of the "decay" ranking,
+                defaults to settings.search_half_life_days.
+
+        Returns:
+            list[SearchMemoryHit]: The matching memories. Their score is the cosine
+                distance, or a higher-is-better score for "decay" and hybrid search.
+        """
+
+    def search_many(
+        self,
+        queries: Sequence[str],
+        query_embeddings: EmbeddingsLike,
+        user_id: uuid.UUID,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        include_embeddings: bool = False,
+        recall: Optional[float] = None,
+        mode: str = "vector",
+        ranking: Optional[str] = None,
+        half_life_days: Optional[float] = None,
+    ) -> list[list[SearchMemoryHit]]:
+        """
+        Run one search per query, see search. Stores that can batch the searches
+        should override this, the default runs them one after the other.
+
+        Returns:
+            list[list[SearchMemoryHit]]: The matching memories of each query, in
+                input order.
+        """
+        return [
+            self.search(
+                query,
+                query_embedding,
+                user_id,
+                category,
+                date_from,
+                date_to,
+                top_k,
+                threshold,
+                include_embeddings,
+                recall,
+                mode,
+                ranking,
+                half_life_days,
+            )
+            for query, query_embedding in zip(queries, query_embeddings)
+        ]
+
+    @abstractmethod
+    def add_memories(
+        self,
+        texts: Sequence[str],
+        embeddings: EmbeddingsLike,
+        categories: Sequence[str],
+        user_ids: Sequence[uuid.UUID],
+        dedup_similarity: float = 0.0,
+        dedup_mode: str = "refresh",
+    ) -> list[uuid.UUID]:
+        """
+        Store embedded memories, creating any categories that don't exist yet.
+
+        With a dedup_similarity, a memory at least that cosine-similar to an earlier
+        memory of the batch, or to a stored memory of the same user and category, is
+        merged into it instead of being inserted.
+
+        Args:
+            texts (Sequence[str]): The text of each memory.
+            embeddings (EmbeddingsLike): The embedding of each memory.
+            categories (Sequence[str]): The category name of each memory.
+            user_ids (Sequence[uuid.UUID]): The ID of the user of each memory.
+            dedup_similarity (float): The similarity from which memories are merged,
+                0 inserts every memory.
+            dedup_mode (str): "refresh" keeps the text of the stored memory and
+                resets its created_at, "replace" also takes the new text and embedding.
+
+        Returns:
+            list[uuid.UUID]: The IDs of the new or merged memories, in input order.
+        """
+
+    @abstractmethod
+    def delete_memory(self, memory_id: uuid.UUID) -> bool:
+        """
+        Delete a memory.
+
+        Args:
+            memory_id (uuid.UUID): The ID of the memory.
+
+        Returns:
+            bool: Whether a memory was deleted.
+        """
+
+    @abstractmethod
+    def delete_memories(
+        self,
+        ids: Optional[Sequence[uuid.UUID]] = None,
+        user_id: Optional[uuid.UUID] = None,
+        category: Optional[str] = None,
+        older_than: Optional[datetime] = None,
+        batch_size: int = 1000,
+    ) -> PurgeStats:
+        """
+        Delete every memory matching all the given filters, at least one of which
+        must be provided.
+
+        Args:
+            ids (Optional[Sequence[uuid.UUID]]): Only delete memories with these IDs.
+            user_id (Optional[uuid.UUID]): Only delete memories of this user.
+            category (Optional[str]): Only delete memories of this category.
+            older_than (Optional[datetime]): Only delete memories created before this.
+            batch_size (int): The number of memories deleted per transaction, for
+                stores that have transactions.
+
+        Returns:
+            PurgeStats: The number of memories deleted and their size in bytes.
+        """
+
+    @abstractmethod
+    def create_user(self, name: str) -> uuid.UUID:
+        """
+        Create a user.
+
+        Args:
+            name (str): The unique name of the user.
+
+        Returns:
+            uuid.UUID: The ID of the new user.
+        """
+
+    @abstractmethod
+    def find_user(self, name: str) -> Optional[uuid.UUID]:
+        """
+        Find a user by name.
+
+        Args:
+            name (str): The name of the user.
+
+        Returns:
+            Optional[uuid.UUID]: The ID of the user, or None if there is no such user.
+        """
@@ -0,0 +1,483 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from src.embedding import get_duplicate_indexes
+from src.embedding.types import EmbeddingLike, EmbeddingsLike
+from src.queries.backends.base import MemoryStore
+from src.queries.memory import DEDUP_MODES, SearchMemoryHit, _resolve_ranking
+from src.queries.retention import PurgeStats
+from src.settings import settings
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Per-row sidecar columns stored next to the embedding matrix: (dtype, row shape)
+_SIDECAR: dict[str, tuple[Any, tuple[int, ...]]] = {
+    "ids": (np.uint8, (16,)),
+    "user_index": (np.int32, ()),
+    "category_index": (np.int32, ()),
+    "created_at": (np.int64, ()),
+    "deleted": (np.bool_, ()),
+    "norms": (np.float32, ()),
+}
+
+
+def _to_micros(value: datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+class NumpyMemoryStore(MemoryStore):
+    """
+    In-process store that answers searches with vectorized NumPy dot products.
+
+    Embeddings are kept L2-normalized in one contiguous float32 (or float16) matrix,
+    with their norms and the id/user/category/created_at sidecar in parallel arrays.
+    A search masks the rows of one user, scores them with a single matrix-vector
+    product and picks the top k with argpartition.
+
+    With a path, every array is a memory-mapped .npy file, texts go to an append-only
+    JSONL file and users and categories to meta.json, so the store survives restarts
+    and the OS page cache decides what stays in RAM. Without a path everything lives
+    in memory, which suits tests and CI. Searches are exact, so recall is ignored,
+    and only the "vector" mode is supported.
+
+    Deleted and replaced rows are tombstoned, and once they make up more than
+    compact_ratio of the rows the store is compacted so searches stop scanning them.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        dims: Optional[int] = None,
+        dtype: str = "float32",
+        initial_capacity: int = 1024,
+        compact_ratio: float = 0.5,
+    ) -> None:
+        if dtype not in ("float32", "float16"):
+            raise ValueError("dtype must be 'float32' or 'float16'.")
+        if not 0 < compact_ratio <= 1:
+            raise ValueError("compact_ratio must be in (0, 1].")
+        self.path = path
+        self.dims = dims if dims is not None else settings.embedding_model_dims
+        self.dtype = np.dtype(dtype)
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._count = 0
+        self._capacity = 0
+        self._arrays: dict[str, np.ndarray] = {}
+        self._texts: list[str] = []
+        self._users: dict[str, uuid.UUID] = {}
+        self._user_index: dict[uuid.UUID, int] = {}
+        self._categories: list[str] = []
+        self._category_index: dict[str, int] = {}
+        self._id_index: dict[uuid.UUID, int] = {}
+        if path is not None:
+            path.mkdir(parents=True, exist_ok=True)
+            if (path / "meta.json").exists():
+                self._load()
+                return
+        self._allocate(initial_capacity)
+        if path is not None:
+            (path / "texts.jsonl").touch()
+        self._save_meta()
+
+    def _columns(self) -> dict[str, tuple[Any, tuple[int, ...]]]:
+        return {"embeddings": (self.dtype, (self.dims,)), **_SIDECAR}
+
+    def _allocate(self, capacity: int, rows: Optional[np.ndarray] = None) -> None:
+        # Copies the first _count rows, or only the given rows when compacting
+        arrays = {}
+        for name, (dtype, shape) in self._columns().items():
+            if self.path is None:
+                array = np.zeros((capacity, *shape), dtype=dtype)
+            else:
+                tmp = self.path / f"{name}.npy.tmp"
+                array = np.lib.format.open_memmap(
+                    tmp, mode="w+", dtype=dtype, shape=(capacity, *shape)
+                )
+            if name in self._arrays:
+                if rows is None:
+                    array[: self._count] = self._arrays[name][: self._count]
+                else:
+                    array[: len(rows)] = self._arrays[name][rows]
+            if self.path is not None:
+                array.flush()  # type: ignore
+                os.replace(tmp, self.path / f"{name}.npy")
+            arrays[name] = array
+        self._arrays = arrays
+        self._capacity = capacity
+
+    def _load(self) -> None:
+        assert self.path is not None
+        meta = json.loads((self.path / "meta.json").read_text())
+        if meta["dims"] != self.dims or meta["dtype"] != self.dtype.name:
+            raise ValueError(
+                f"Store at {self.path} holds {meta['dtype']} vectors of {meta['dims']} dims."
+            )
+        self._count = meta["count"]
+        self._users = {name: uuid.UUID(id) for name, id in meta["users"].items()}
+        self._user_index = {id: i for i, id in enumerate(self._users.values())}
+        self._categories = meta["categories"]
+        self._category_index = {name: i for i, name in enumerate(self._categories)}
+        self._arrays = {
+            name: np.load(self.path / f"{name}.npy", mmap_mode="r+")
+            for name in self._columns()
+        }
+        self._capacity = len(self._arrays["embeddings"])
+        with open(self.path / "texts.jsonl", encoding="utf-8") as f:
+            lines = f.readlines()
+        if len(lines) > self._count:
+            # Texts appended by a write that never reached meta.json
+            lines = lines[: self._count]
+            (self.path / "texts.jsonl").write_text("".join(lines), encoding="utf-8")
+        self._texts = [json.loads(line) for line in lines]
+        ids, deleted = self._arrays["ids"], self._arrays["deleted"]
+        self._id_index = {
+            uuid.UUID(bytes=ids[i].tobytes()): i
+            for i in range(self._count)
+            if not deleted[i]
+        }
+
+    def _save_meta(self) -> None:
+        if self.path is None:
+            return
+        for array in self._arrays.values():
+            array.flush()  # type: ignore
+        meta = {
+            "count": self._count,
+            "dims": self.dims,
+            "dtype": self.dtype.name,
+            "users": {name: str(id) for name, id in self._users.items()},
+            "categories": self._categories,
+        }
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.path / "meta.json")
+
+    def _category(self, name: str) -> int:
+        index = self._category_index.get(name)
+        if index is None:
+            index = len(self._categories)
+            self._categories.append(name)
+            self._category_index[name] = index
+        return index
+
+    def search(
+        self,
+        query: str,
+        query_embedding: EmbeddingLike,
+        user_id: uuid.UUID,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        include_embeddings: bool = False,
+        recall: Optional[float] = None,
+        mode: str = "vector",
+        ranking: Optional[str] = None,
+        half_life_days: Optional[float] = None,
+    ) -> list[SearchMemoryHit]:
+        if mode != "vector":
+            raise ValueError(f"{type(self).__name__} only supports the 'vector' mode.")
+        ranking = _resolve_ranking(ranking)
+        with self._lock:
+            user_index = self._user_index.get(user_id)
+            if user_index is None:
+                return []
+            n = self._count
+            a = self._arrays
+            mask = (a["user_index"][:n] == user_index) & ~a["deleted"][:n]
+            if category:
+                category_index = self._category_index.get(category)
+                if category_index is None:
+                    return []
+                mask &= a["category_index"][:n] == category_index
+            if date_from:
+                mask &= a["created_at"][:n] >= _to_micros(date_from)
+            if date_to:
+                mask &= a["created_at"][:n] <= _to_micros(date_to)
+            rows = np.flatnonzero(mask)
+            if not rows.size:
+                return []
+
+            query_vector = np.array(query_embedding, dtype=np.float32)
+            query_vector /= np.linalg.norm(query_vector) or 1.0
+            distances = 1.0 - a["embeddings"][rows].astype(np.float32) @ query_vector
+            keep = distances < threshold
+            rows, scores = rows[keep], distances[keep]
+            # Ascending sort keys, mirroring the ORDER BY of the SQL rankings
+            if ranking == "recency":
+                keys = -a["created_at"][rows]
+            elif ranking == "decay":
+                age_days = (
+                    _to_micros(datetime.now()) - a["created_at"][rows]
+                ) / 86_400_000_000
+                half_life = half_life_days or settings.search_half_life_days
+                scores = (1.0 - scores) * 0.5 ** (age_days / half_life)
+                keys = -scores
+            else:
+                keys = scores
+            if rows.size > top_k:
+                top = np.argpartition(keys, top_k - 1)[:top_k]
+                rows, scores, keys = rows[top], scores[top], keys[top]
+            order = np.argsort(keys, kind="stable")
+            rows, scores = rows[order], scores[order]
+
+            users = list(self._users.values())
+            return [
+                SearchMemoryHit(
+                    id=uuid.UUID(bytes=a["ids"][row].tobytes()),
+                    text=self._texts[row],
+                    created_at=_EPOCH + int(a["created_at"][row]) * _MICROSECOND,
+                    category=self._categories[a["category_index"][row]],
+                    user_id=users[a["user_index"][row]],
+                    score=float(score),
+                    embedding=(
+                        a["embeddings"][row].astype(np.float32) * a["norms"][row]
+                        if include_embeddings
+                        else None
+                    ),
+                )
+                for row, score in zip(rows.tolist(), scores.tolist())
+            ]
+
+    def add_memories(
+        self,
+        texts: Sequence[str],
+        embeddings: EmbeddingsLike,
+        categories: Sequence[str],
+        user_ids: Sequence[uuid.UUID],
+        dedup_similarity: float = 0.0,
+        dedup_mode: str = "refresh",
+    ) -> list[uuid.UUID]:
+        if not len(texts) == len(embeddings) == len(categories) == len(user_ids):
+            raise ValueError(
+                "texts, embeddings, categories and user_ids must be the same length."
+            )
+        if not texts:
+            return []
+        if dedup_similarity and dedup_mode not in DEDUP_MODES:
+            raise ValueError(
+                f"Unknown dedup mode {dedup_mode!r}, expected one of {DEDUP_MODES}."
+            )
+        with self._lock:
+            missing_user_ids = set(user_ids) - self._user_index.keys()
+            if missing_user_ids:
+                raise ValueError(
+                    f"Users with IDs {sorted(map(str, missing_user_ids))} not found."
+                )
+            matrix = np.array(embeddings, dtype=np.float32)
+            if matrix.shape[1] != self.dims:
+                raise ValueError(f"Embeddings must have {self.dims} dimensions.")
+            norms = np.linalg.norm(matrix, axis=1)
+            matrix /= np.where(norms == 0, 1.0, norms)[:, None]
+            user_indexes = np.array([self._user_index[id] for id in user_ids])
+            category_indexes = np.array([self._category(c) for c in categories])
+            if not dedup_similarity:
+                ids = [uuid.uuid4() for _ in texts]
+                self._append(ids, texts, matrix, norms, user_indexes, category_indexes)
+                return ids
+
+            # Same plan as src.queries.backends.pgvector.insert_memories
+            first = get_duplicate_indexes(
+                embeddings, list(zip(user_ids, categories)), dedup_similarity
+            )
+            source = {i: i for i in first}
+            if dedup_mode == "replace":
+                for i, first_index in enumerate(first):
+                    source[first_index] = i
+            ids_by_index: dict[int, uuid.UUID] = {}
+            new: list[int] = []
+            # Stored row -> the batch index it is merged with, the last one winning
+            merged: dict[int, int] = {}
+            for i in sorted(source):
+                row = self._find_duplicate(
+                    matrix[i], user_indexes[i], category_indexes[i], dedup_similarity
+                )
+                if row is None:
+                    ids_by_index[i] = uuid.uuid4()
+                    new.append(i)
+                else:
+                    ids_by_index[i] = uuid.UUID(
+                        bytes=self._arrays["ids"][row].tobytes()
+                    )
+                    merged[row] = i
+            replaced = list(merged.values()) if dedup_mode == "replace" else []
+            if dedup_mode == "replace":
+                # The old rows are tombstoned and the new content appended under
+                # their IDs, as texts are append-only
+                self._arrays["deleted"][list(merged)] = True
+            else:
+                self._arrays["created_at"][list(merged)] = _to_micros(datetime.now())
+            rows = new + replaced
+            content = [source[i] for i in rows]
+            self._append(
+                [ids_by_index[i] for i in rows],
+                [texts[i] for i in content],
+                matrix[content],
+                norms[content],
+                user_indexes[content],
+                category_indexes[content],
+            )
+            if replaced and self._needs_compaction():
+                self.compact()
+            return [ids_by_index[first_index] for first_index in first]
+
+    def _find_duplicate(
+        self,
+        embedding: np.ndarray,
+        user_index: int,
+        category_index: int,
+        similarity: float,
+    ) -> Optional[int]:
+        n = self._count
+        a = self._arrays
+        rows = np.flatnonzero(
+            (a["user_index"][:n] == user_index)
+            & (a["category_index"][:n] == category_index)
+            & ~a["deleted"][:n]
+        )
+        if not rows.size:
+            return None
+        scores = a["embeddings"][rows].astype(np.float32) @ embedding
+        best = int(np.argmax(scores))
+        return int(rows[best]) if scores[best] >= similarity else None
+
+    def _append(
+        self,
+        ids: list[uuid.UUID],
+        texts: Sequence[str],
+        matrix: np.ndarray,
+        norms: np.ndarray,
+        user_indexes: np.ndarray,
+        category_indexes: np.ndarray,
+    ) -> None:
+        start, end = self._count, self._count + len(ids)
+        if end > self._capacity:
+            self._allocate(max(end, 2 * self._capacity))
+        a = self._arrays
+        a["embeddings"][start:end] = matrix
+        a["norms"][start:end] = norms
+        a["ids"][start:end] = np.frombuffer(
+            b"".join(id.bytes for id in ids), dtype=np.uint8
+        ).reshape(-1, 16)
+        a["user_index"][start:end] = user_indexes
+        a["category_index"][start:end] = category_indexes
+        a["created_at"][start:end] = _to_micros(datetime.now())
+        a["deleted"][start:end] = False
+
+        if self.path is not None:
+            with open(self.path / "texts.jsonl", "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(text) + "\n" for text in texts)
+        self._texts.extend(texts)
+        self._id_index.update({id: start + i for i, id in enumerate(ids)})
+        self._count = end
+        self._save_meta()
+
+    def compact(self) -> int:
+        """
+        Drop tombstoned rows, rewriting the arrays and texts without them.
+
+        The files are replaced one at a time, so a crash part way through can leave
+        a persisted store inconsistent.
+
+        Returns:
+            int: The number of rows removed.
+        """
+        with self._lock:
+            live = np.flatnonzero(~self._arrays["deleted"][: self._count])
+            removed = self._count - live.size
+            if not removed:
+                return 0
+            self._allocate(self._capacity, rows=live)
+            self._texts = [self._texts[row] for row in live.tolist()]
+            if self.path is not None:
+                tmp = self.path / "texts.jsonl.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.writelines(json.dumps(text) + "\n" for text in self._texts)
+                os.replace(tmp, self.path / "texts.jsonl")
+            self._count = live.size
+            ids = self._arrays["ids"]
+            self._id_index = {
+                uuid.UUID(bytes=ids[i].tobytes()): i for i in range(self._count)
+            }
+            self._save_meta()
+            return removed
+
+    def _save_or_compact(self) -> None:
+        if self._needs_compaction():
+            self.compact()
+        else:
+            self._save_meta()
+
+    def _needs_compaction(self) -> bool:
+        # Every live row is in _id_index, the rest are tombstones
+        return self._count - len(self._id_index) > self.compact_ratio * self._count
+
+    def delete_memory(self, memory_id: uuid.UUID) -> bool:
+        with self._lock:
+            row = self._id_index.pop(memory_id, None)
+            if row is None:
+                return False
+            self._arrays["deleted"][row] = True
+            self._save_or_compact()
+            return True
+
+    def delete_memories(
+        self,
+        ids: Optional[Sequence[uuid.UUID]] = None,
+        user_id: Optional[uuid.UUID] = None,
+        category: Optional[str] = None,
+        older_than: Optional[datetime] = None,
+        batch_size: int = 1000,
+    ) -> PurgeStats:
+        if ids is None and not (user_id or category or older_than):
+            raise ValueError(
+                "At least one of ids, user_id, category or older_than must be provided."
+            )
+        with self._lock:
+            n = self._count
+            a = self._arrays
+            mask = ~a["deleted"][:n]
+            if ids is not None:
+                rows = [self._id_index[id] for id in ids if id in self._id_index]
+                selected = np.zeros(n, dtype=bool)
+                selected[rows] = True
+                mask &= selected
+            if user_id:
+                mask &= a["user_index"][:n] == self._user_index.get(user_id, -1)
+            if category:
+                mask &= a["category_index"][:n] == self._category_index.get(
+                    category, -1
+                )
+            if older_than:
+                mask &= a["created_at"][:n] < _to_micros(older_than)
+            rows = np.flatnonzero(mask)
+            a["deleted"][rows] = True
+            for row in rows.tolist():
+                del self._id_index[uuid.UUID(bytes=a["ids"][row].tobytes())]
+            row_bytes = self.dims * self.dtype.itemsize
+            text_bytes = sum(len(self._texts[row].encode()) for row in rows.tolist())
+            self._save_or_compact()
+            return PurgeStats(len(rows), len(rows) * row_bytes + text_bytes)
+
+    def create_user(self, name: str) -> uuid.UUID:
+        with self._lock:
+            if name in self._users:
+                raise ValueError(f"User {name!r} already exists.")
+            user_id = uuid.uuid4()
+            self._users[name] = user_id
+            self._user_index[user_id] = len(self._user_index)
+            self._save_meta()
+            return user_id
+
+    def find_user(self, name: str) -> Optional[uuid.UUID]:
+        return self._users.get(name)
@@ -0,0 +1,369 @@
+import time
+import uuid
+from datetime import datetime
+from typing import Optional, Sequence
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from src.db import get_session
+from src.embedding import get_duplicate_indexes
+from src.embedding.types import EmbeddingLike, EmbeddingsLike
+from src.models import Memory
+from src.queries.backends.base import MemoryStore
+from src.queries.category import get_or_create_category_ids
+from src.queries.index import set_vector_search_recall
+from src.queries.memory import (
+    DEDUP_MODES,
+    SearchMemoryHit,
+    create_memories,
+    find_duplicate_memories,
+    merge_duplicate_memories,
+    search_memories_hybrid,
+    search_memory_hits_by_vector,
+    search_memory_hits_by_vectors,
+)
+from src.queries.reembed import check_embedding_model
+from src.queries.retention import PurgeStats, delete_memories_batch, purge_batches
+from src.queries.user import create_user, get_existing_user_ids, get_user_by_name
+from src.settings import settings
+
+
+def search_memory_hits(
+    session: Session,
+    query: str,
+    query_embedding: EmbeddingLike,
+    user_id: uuid.UUID,
+    category: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    top_k: int = 30,
+    threshold: float = 0.6,
+    include_embeddings: bool = False,
+    recall: Optional[float] = None,
+    mode: str = "vector",
+    ranking: Optional[str] = None,
+    half_life_days: Optional[float] = None,
+) -> list[SearchMemoryHit]:
+    """
+    Run a vector or hybrid search on the session, see MemoryStore.search.
+    """
+    check_embedding_model(session)
+    if recall is not None or settings.vector_index_quantization == "binary":
+        # hnsw.ef_search caps how many binary candidates the index returns
+        set_vector_search_recall(
+            session, recall or 0.0, top_k if mode == "vector" else 2 * top_k
+        )
+    if mode == "vector":
+        return search_memory_hits_by_vector(
+            session,
+            query_embedding,
+            user_id,
+            category,
+            date_from,
+            date_to,
+            top_k,
+            threshold,
+            include_embeddings,
+            ranking,
+            half_life_days,
+        )
+    elif mode == "hybrid":
+        return search_memories_hybrid(
+            session,
+            query,
+            query_embedding,
+            user_id,
+            category,
+            date_from,
+            date_to,
+            top_k,
+            threshold,
+            include_embeddings=include_embeddings,
+            ranking=ranking,
+            half_life_days=half_life_days,
+        )
+    else:
+        raise ValueError(
+            f"Unknown search mode {mode!r}, expected 'vector' or 'hybrid'."
+        )
+
+
+def search_many_memory_hits(
+    session: Session,
+    queries: Sequence[str],
+    query_embeddings: EmbeddingsLike,
+    user_id: uuid.UUID,
+    category: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    top_k: int = 30,
+    threshold: float = 0.6,
+    include_embeddings: bool = False,
+    recall: Optional[float] = None,
+    mode: str = "vector",
+    ranking: Optional[str] = None,
+    half_life_days: Optional[float] = None,
+) -> list[list[SearchMemoryHit]]:
+    """
+    Run one search per query on the session, see MemoryStore.search_many.
+
+    Vector searches are batched into a single LATERAL query. Hybrid searches run
+    one after the other on the same connection and transaction.
+    """
+    check_embedding_model(session)
+    if mode != "vector":
+        return [
+            search_memory_hits(
+                session,
+                query,
+                query_embedding,
+                user_id,
+                category,
+                date_from,
+                date_to,
+                top_k,
+                threshold,
+                include_embeddings,
+                recall,
+                mode,
+                ranking,
+                half_life_days,
+            )
+            for query, query_embedding in zip(queries, query_embeddings)
+        ]
+    if recall is not None or settings.vector_index_quantization == "binary":
+        set_vector_search_recall(session, recall or 0.0, top_k)
+    return search_memory_hits_by_vectors(
+        session,
+        query_embeddings,
+        user_id,
+        category,
+        date_from,
+        date_to,
+        top_k,
+        threshold,
+        include_embeddings,
+        ranking,
+        half_life_days,
+    )
+
+
+def insert_memories(
+    session: Session,
+    texts: Sequence[str],
+    embeddings: EmbeddingsLike,
+    categories: Sequence[str],
+    user_ids: Sequence[uuid.UUID],
+    dedup_similarity: float = 0.0,
+    dedup_mode: str = "refresh",
+) -> list[uuid.UUID]:
+    """
+    Check the users, upsert the categories and bulk insert the memories on the
+    session, see MemoryStore.add_memories.
+    """
+    check_embedding_model(session, for_write=True)
+    missing_user_ids = set(user_ids) - get_existing_user_ids(session, user_ids)
+    if missing_user_ids:
+        raise ValueError(
+            f"Users with IDs {sorted(map(str, missing_user_ids))} not found."
+        )
+    category_ids = get_or_create_category_ids(session, categories)
+    memory_category_ids = [category_ids[category] for category in categories]
+    if not dedup_similarity:
+        return create_memories(
+            session,
+            texts=texts,
+            embeddings=embeddings,
+            user_ids=user_ids,
+            category_ids=memory_category_ids,
+        )
+    if dedup_mode not in DEDUP_MODES:
+        raise ValueError(
+            f"Unknown dedup mode {dedup_mode!r}, expected one of {DEDUP_MODES}."
+        )
+
+    # Each memory is written as the first memory of the batch it duplicates, with
+    # the content of the last one under "replace"
+    first = get_duplicate_indexes(
+        embeddings, list(zip(user_ids, categories)), dedup_similarity
+    )
+    source = {i: i for i in first}
+    if dedup_mode == "replace":
+        for i, first_index in enumerate(first):
+            source[first_index] = i
+    kept = sorted(source)
+    duplicates = find_duplicate_memories(
+        session,
+        [embeddings[i] for i in kept],
+        [user_ids[i] for i in kept],
+        [memory_category_ids[i] for i in kept],
+        dedup_similarity,
+    )
+    merged = {id: source[i] for i, id in zip(kept, duplicates) if id is not None}
+    if dedup_mode == "replace":
+        merge_duplicate_memories(
+            session,
+            list(merged),
+            [texts[i] for i in merged.values()],
+            [embeddings[i] for i in merged.values()],
+        )
+    else:
+        merge_duplicate_memories(session, list(merged))
+    new = [source[i] for i, id in zip(kept, duplicates) if id is None]
+    new_ids = iter(
+        create_memories(
+            session,
+            texts=[texts[i] for i in new],
+            embeddings=[embeddings[i] for i in new],
+            user_ids=[user_ids[i] for i in new],
+            category_ids=[memory_category_ids[i] for i in new],
+        )
+    )
+    ids = {
+        i: id if id is not None else next(new_ids) for i, id in zip(kept, duplicates)
+    }
+    return [ids[first_index] for first_index in first]
+
+
+def delete_memory(session: Session, memory_id: uuid.UUID) -> bool:
+    """
+    Delete a memory with a single DELETE statement, see MemoryStore.delete_memory.
+    """
+    return bool(session.execute(delete(Memory).where(Memory.id == memory_id)).rowcount)
+
+
+class PgVectorStore(MemoryStore):
+    """
+    Store backed by PostgreSQL and pgvector.
+
+    Each call runs in its own transaction, or in the enclosing unit_of_work if any.
+    """
+
+    def search(
+        self,
+        query: str,
+        query_embedding: EmbeddingLike,
+        user_id: uuid.UUID,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        include_embeddings: bool = False,
+        recall: Optional[float] = None,
+        mode: str = "vector",
+        ranking: Optional[str] = None,
+        half_life_days: Optional[float] = None,
+    ) -> list[SearchMemoryHit]:
+        with get_session() as session:
+            return search_memory_hits(
+                session,
+                query,
+                query_embedding,
+                user_id,
+                category,
+                date_from,
+                date_to,
+                top_k,
+                threshold,
+                include_embeddings,
+                recall,
+                mode,
+                ranking,
+                half_life_days,
+            )
+
+    def search_many(
+        self,
+        queries: Sequence[str],
+        query_embeddings: EmbeddingsLike,
+        user_id: uuid.UUID,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        include_embeddings: bool = False,
+        recall: Optional[float] = None,
+        mode: str = "vector",
+        ranking: Optional[str] = None,
+        half_life_days: Optional[float] = None,
+    ) -> list[list[SearchMemoryHit]]:
+        with get_session() as session:
+            return search_many_memory_hits(
+                session,
+                queries,
+                query_embeddings,
+                user_id,
+                category,
+                date_from,
+                date_to,
+                top_k,
+                threshold,
+                include_embeddings,
+                recall,
+                mode,
+                ranking,
+                half_life_days,
+            )
+
+    def add_memories(
+        self,
+        texts: Sequence[str],
+        embeddings: EmbeddingsLike,
+        categories: Sequence[str],
+        user_ids: Sequence[uuid.UUID],
+        dedup_similarity: float = 0.0,
+        dedup_mode: str = "refresh",
+    ) -> list[uuid.UUID]:
+        with get_session() as session:
+            return insert_memories(
+                session,
+                texts,
+                embeddings,
+                categories,
+                user_ids,
+                dedup_similarity,
+                dedup_mode,
+            )
+
+    def delete_memory(self, memory_id: uuid.UUID) -> bool:
+        with get_session() as session:
+            return delete_memory(session, memory_id)
+
+    def delete_memories(
+        self,
+        ids: Optional[Sequence[uuid.UUID]] = None,
+        user_id: Optional[uuid.UUID] = None,
+        category: Optional[str] = None,
+        older_than: Optional[datetime] = None,
+        batch_size: int = 1000,
+    ) -> PurgeStats:
+        # Each batch commits on its own, with settings.purge_pause_ms in between to
+        # throttle WAL and leave room for autovacuum
+        memories = size = 0
+        batches = purge_batches(ids, batch_size)
+        try:
+            id_batch, pause = next(batches)
+            while True:
+                if pause and settings.purge_pause_ms:
+                    time.sleep(settings.purge_pause_ms / 1000)
+                with get_session() as session:
+                    stats = delete_memories_batch(
+                        session, id_batch, user_id, category, older_than, batch_size
+                    )
+                memories += stats.memories
+                size += stats.bytes
+                id_batch, pause = batches.send(stats.memories)
+        except StopIteration:
+            return PurgeStats(memories, size)
+
+    def create_user(self, name: str) -> uuid.UUID:
+        with get_session() as session:
+            return create_user(session, name).id
+
+    def find_user(self, name: str) -> Optional[uuid.UUID]:
+        with get_session() as session:
+            user = get_user_by_name(session, name)
+            return user.id if user else None
@@ -0,0 +1,111 @@
+import threading
+import time
+import uuid
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.settings import settings
+
+_PENDING_KEY = "lookup_cache_pending"
+
+
+class LookupCache:
+    """
+    Process-local cache of category name -> ID and of known category and user IDs.
+
+    Categories and users are small and rarely change, so caching them saves a
+    lookup round-trip per write. Entries learned inside a transaction are only
+    published once that transaction commits, so a rollback can never leave an ID
+    in the cache that doesn't exist in the database. Code that creates, deletes or
+    merges a category or user invalidates its keys in this process. Other
+    processes are not notified, so entries expire after ttl seconds and are then
+    looked up again.
+    """
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Each value holds the time the entry was published
+        self._category_ids: dict[str, tuple[uuid.UUID, float]] = {}
+        self._known_category_ids: dict[uuid.UUID, float] = {}
+        self._known_user_ids: dict[uuid.UUID, float] = {}
+
+    def _fresh(self, published_at: Optional[float]) -> bool:
+        return published_at is not None and (
+            self.ttl is None or time.monotonic() - published_at <= self.ttl
+        )
+
+    def get_category_id(self, name: str) -> Optional[uuid.UUID]:
+        entry = self._category_ids.get(name)
+        if entry is None or not self._fresh(entry[1]):
+            return None
+        return entry[0]
+
+    def has_category_id(self, category_id: uuid.UUID) -> bool:
+        return self._fresh(self._known_category_ids.get(category_id))
+
+    def has_user_id(self, user_id: uuid.UUID) -> bool:
+        return self._fresh(self._known_user_ids.get(user_id))
+
+    def add_category(self, session: Session, name: str, category_id: uuid.UUID) -> None:
+        pending = session.info.setdefault(_PENDING_KEY, ({}, set()))
+        pending[0][name] = category_id
+
+    def add_users(self, session: Session, user_ids: set[uuid.UUID]) -> None:
+        pending = session.info.setdefault(_PENDING_KEY, ({}, set()))
+        pending[1].update(user_ids)
+
+    def invalidate_category(self, session: Session, name: str) -> None:
+        """
+        Forget a category name and its ID, in this session and in the cache.
+        """
+        pending = session.info.get(_PENDING_KEY)
+        if pending is not None:
+            pending[0].pop(name, None)
+        with self._lock:
+            entry = self._category_ids.pop(name, None)
+            if entry is not None:
+                self._known_category_ids.pop(entry[0], None)
+
+    def invalidate_user(self, session: Session, user_id: uuid.UUID) -> None:
+        """
+        Forget a user ID, in this session and in the cache.
+        """
+        pending = session.info.get(_PENDING_KEY)
+        if pending is not None:
+            pending[1].discard(user_id)
+        with self._lock:
+            self._known_user_ids.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._category_ids.clear()
+            self._known_category_ids.clear()
+            self._known_user_ids.clear()
+
+    def _publish(
+        self, categories: dict[str, uuid.UUID], user_ids: set[uuid.UUID]
+    ) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for name, category_id in categories.items():
+                self._category_ids[name] = (category_id, now)
+                self._known_category_ids[category_id] = now
+            self._known_user_ids.update(dict.fromkeys(user_ids, now))
+
+
+lookup_cache = LookupCache(ttl=settings.lookup_cache_ttl or None)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending is not None:
+        lookup_cache._publish(*pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction: object) -> None:
+    session.info.pop(_PENDING_KEY, None)
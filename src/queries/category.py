@@ -1,14 +1,21 @@
-from typing import Optional
+import uuid
+from datetime import datetime
+from typing import Iterable, Optional
 
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
-from src.models import MemoryCategory
+from src.models import Memory, MemoryCategory
+from src.queries.cache import lookup_cache
 
 
 def create_category(session: Session, name: str) -> MemoryCategory:
     """
     Create a new category in the database.
 
+    The category is flushed but not committed, so it shares the caller's transaction.
+
     Args:
         session (Session): The SQLAlchemy session to use.
         name (str): The name of the category.
@@ -18,11 +25,37 @@ def create_category(session: Session, name: str) -> MemoryCategory:
     """
     category = MemoryCategory(name=name)
     session.add(category)
-    session.commit()
-    session.refresh(category)
+    session.flush()
+    # Drops any stale ID cached for the name before the new one is published
+    lookup_cache.invalidate_category(session, name)
+    lookup_cache.add_category(session, name, category.id)
     return category
 
 
+def delete_category(session: Session, name: str) -> bool:
+    """
+    Delete a category and every memory in it.
+
+    The category is dropped from this process's lookup cache. Nothing is committed.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        name (str): The name of the category.
+
+    Returns:
+        bool: Whether the category existed.
+    """
+    lookup_cache.invalidate_category(session, name)
+    category_id = session.execute(
+        select(MemoryCategory.id).where(MemoryCategory.name == name)
+    ).scalar_one_or_none()
+    if category_id is None:
+        return False
+    session.execute(delete(Memory).where(Memory.category_id == category_id))
+    session.execute(delete(MemoryCategory).where(MemoryCategory.id == category_id))
+    return True
+
+
 def get_category_by_name(session: Session, name: str) -> Optional[MemoryCategory]:
     """
     Get a category by its name.
@@ -39,6 +72,103 @@ def get_category_by_name(session: Session, name: str) -> Optional[MemoryCategory
     )
 
 
+def get_category_id(session: Session, name: str) -> Optional[uuid.UUID]:
+    """
+    Get the ID of a category by its name, consulting the lookup cache first.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        name (str): The name of the category.
+
+    Returns:
+        Optional[uuid.UUID]: The ID of the category, None if it doesn't exist.
+    """
+    category_id = lookup_cache.get_category_id(name)
+    if category_id is not None:
+        return category_id
+    category_id = session.execute(
+        select(MemoryCategory.id).where(MemoryCategory.name == name)
+    ).scalar_one_or_none()
+    if category_id is not None:
+        lookup_cache.add_category(session, name, category_id)
+    return category_id
+
+
+def get_or_create_category_ids(
+    session: Session, names: Iterable[str]
+) -> dict[str, uuid.UUID]:
+    """
+    Get or create several categories by name, returning their IDs.
+
+    Names already in the lookup cache cost no query. The rest are upserted with
+    INSERT ... ON CONFLICT DO NOTHING, so concurrent writers creating the same
+    category never produce duplicates, and any names that already existed are
+    then read back in a single SELECT. Nothing is committed.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        names (Iterable[str]): The names of the categories.
+
+    Returns:
+        dict[str, uuid.UUID]: The category IDs keyed by name.
+    """
+    category_ids: dict[str, uuid.UUID] = {}
+    missing: list[str] = []
+    # Sorted so concurrent batches take the unique index locks in the same order
+    for name in sorted(set(names)):
+        category_id = lookup_cache.get_category_id(name)
+        if category_id is None:
+            missing.append(name)
+        else:
+            category_ids[name] = category_id
+    if not missing:
+        return category_ids
+
+    now = datetime.now()
+    inserted = session.execute(
+        insert(MemoryCategory)
+        .values(
+            [
+                {"id": uuid.uuid4(), "name": name, "created_at": now, "updated_at": now}
+                for name in missing
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=[MemoryCategory.name])
+        .returning(MemoryCategory.name, MemoryCategory.id)
+    ).all()
+    found = {name: category_id for name, category_id in inserted}
+    existing = [name for name in missing if name not in found]
+    if existing:
+        found.update(
+            {
+                name: category_id
+                for name, category_id in session.execute(
+                    select(MemoryCategory.name, MemoryCategory.id).where(
+                        MemoryCategory.name.in_(existing)
+                    )
+                ).all()
+            }
+        )
+    for name, category_id in found.items():
+        lookup_cache.add_category(session, name, category_id)
+    category_ids.update(found)
+    return category_ids
+
+
+def get_or_create_category_id(session: Session, name: str) -> uuid.UUID:
+    """
+    Get or create a category by its name, returning its ID.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        name (str): The name of the category.
+
+    Returns:
+        uuid.UUID: The ID of the category with the specified name.
+    """
+    return get_or_create_category_ids(session, [name])[name]
+
+
 def get_or_create_category_by_name(session: Session, name: str) -> MemoryCategory:
     """
     Get or create a category by its name.
@@ -50,7 +180,80 @@ def get_or_create_category_by_name(session: Session, name: str) -> MemoryCategor
     Returns:
         MemoryCategory: The category with the specified name.
     """
-    category = get_category_by_name(session, name)
+    category = session.get(MemoryCategory, get_or_create_category_id(session, name))
     if category is None:
-        category = create_category(session, name)
+        raise ValueError(f"Category {name!r} not found.")
     return category
+
+
+def category_exists(session: Session, category_id: uuid.UUID) -> bool:
+    """
+    Check whether a category exists, consulting the lookup cache first.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        category_id (uuid.UUID): The ID of the category.
+
+    Returns:
+        bool: Whether the category exists.
+    """
+    if lookup_cache.has_category_id(category_id):
+        return True
+    name = session.execute(
+        select(MemoryCategory.name).where(MemoryCategory.id == category_id)
+    ).scalar_one_or_none()
+    if name is None:
+        return False
+    lookup_cache.add_category(session, name, category_id)
+    return True
+
+
+def merge_duplicate_categories(session: Session) -> int:
+    """
+    Merge categories that share a name and add the unique constraint on the name.
+
+    Databases created before the constraint existed may contain duplicates from
+    concurrent writers. Memories are re-pointed to the oldest category of each name
+    and the others deleted, after which the unique constraint can be added.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+
+    Returns:
+        int: The number of duplicate categories removed.
+    """
+    session.execute(
+        text(
+            "CREATE TEMPORARY TABLE category_merges ON COMMIT DROP AS "
+            "SELECT id AS duplicate_id, first_value(id) OVER "
+            "(PARTITION BY name ORDER BY created_at, id) AS keep_id "
+            "FROM memory_categories"
+        )
+    )
+    session.execute(
+        text(
+            "UPDATE memories SET category_id = m.keep_id FROM category_merges m "
+            "WHERE memories.category_id = m.duplicate_id AND m.duplicate_id <> m.keep_id"
+        )
+    )
+    merged_names = list(
+        session.execute(
+            text(
+                "DELETE FROM memory_categories USING category_merges m "
+                "WHERE memory_categories.id = m.duplicate_id "
+                "AND m.duplicate_id <> m.keep_id RETURNING memory_categories.name"
+            )
+        ).scalars()
+    )
+    session.execute(
+        text(
+            "DO $$ BEGIN "
+            "ALTER TABLE memory_categories "
+            "ADD CONSTRAINT memory_categories_name_key UNIQUE (name); "
+            "EXCEPTION WHEN duplicate_table OR duplicate_object THEN NULL; END $$"
+        )
+    )
+    # Only the merged names can have a deleted duplicate's ID cached
+    for name in set(merged_names):
+        lookup_cache.invalidate_category(session, name)
+    return len(merged_names)
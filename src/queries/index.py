@@ -0,0 +1,382 @@
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.settings import settings
+
+VECTOR_INDEX_NAME = "ix_memories_embedding"
+TEXT_SEARCH_INDEX_NAME = "ix_memories_text_search"
+USER_DATE_INDEX_NAME = "ix_memories_user_id_created_at"
+VECTOR_INDEX_METHODS = ("hnsw", "ivfflat")
+VECTOR_INDEX_QUANTIZATIONS = ("none", "binary")
+
+# pgvector rejects hnsw.ef_search values above this.
+_MAX_EF_SEARCH = 1000
+_MIN_EF_SEARCH = 40
+# Iterative index scans need pgvector 0.8, checked once per process
+_ITERATIVE_SCAN_VERSION = (0, 8)
+_iterative_scan_supported: Optional[bool] = None
+
+
+def _check_autocommit(session: Session) -> None:
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block, and the
+    # isolation level can't change once the session holds a connection
+    options = session.connection().get_execution_options()
+    if options.get("isolation_level") != "AUTOCOMMIT":
+        raise ValueError(
+            "Concurrent index changes need a session from "
+            'get_session({"isolation_level": "AUTOCOMMIT"}).'
+        )
+
+
+def _partition_tree(
+    session: Session, table: str = "memories"
+) -> list[tuple[str, Optional[str], bool]]:
+    # (relation, parent, is_leaf) of the table and its partitions, parents first.
+    # An unpartitioned table is a single leaf.
+    return [
+        (relation, parent, is_leaf)
+        for relation, parent, is_leaf in session.execute(
+            text(
+                "SELECT relid::text, parentrelid::text, isleaf "
+                "FROM pg_partition_tree(:table) ORDER BY level"
+            ),
+            {"table": table},
+        ).all()
+    ]
+
+
+def _partition_index_name(relation: str, name: str, table: str = "memories") -> str:
+    return name if relation == table else f"{relation}_{name}"
+
+
+def _create_vector_index_sql(
+    name: str,
+    method: str,
+    m: int,
+    ef_construction: int,
+    lists: int,
+    concurrently: bool,
+    column: str = "embedding",
+    dims: Optional[int] = None,
+    table: str = "memories",
+    only: bool = False,
+) -> str:
+    if method not in VECTOR_INDEX_METHODS:
+        raise ValueError(
+            f"Unknown vector index method {method!r}, expected one of {VECTOR_INDEX_METHODS}."
+        )
+    quantization = settings.vector_index_quantization
+    if quantization not in VECTOR_INDEX_QUANTIZATIONS:
+        raise ValueError(
+            f"Unknown vector index quantization {quantization!r}, expected one of "
+            f"{VECTOR_INDEX_QUANTIZATIONS}."
+        )
+    if quantization == "binary":
+        # Must match the expression searched on in src.queries.memory to be used
+        target = (
+            f"(binary_quantize({column})::bit({int(dims or settings.embedding_model_dims)})) "
+            "bit_hamming_ops"
+        )
+    else:
+        target = f"{column} {settings.embedding_storage}_cosine_ops"
+    if method == "hnsw":
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    else:
+        options = f"lists = {int(lists)}"
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+        f"ON {'ONLY ' if only else ''}{table} USING {method} ({target}) "
+        f"WITH ({options})"
+    )
+
+
+def _create_vector_index(
+    session: Session,
+    name: str,
+    method: str,
+    m: int,
+    ef_construction: int,
+    lists: int,
+    concurrently: bool,
+    column: str = "embedding",
+    dims: Optional[int] = None,
+    table: str = "memories",
+) -> None:
+    # Postgres can't build an index on a partitioned table concurrently, so each
+    # partition gets its own index, attached to an index on its parent that becomes
+    # valid once all of its partitions are attached.
+    for relation, parent, is_leaf in _partition_tree(session, table):
+        index = _partition_index_name(relation, name, table)
+        session.execute(
+            text(
+                _create_vector_index_sql(
+                    index,
+                    method,
+                    m,
+                    ef_construction,
+                    lists,
+                    concurrently and is_leaf,
+                    column,
+                    dims,
+                    table=relation,
+                    only=not is_leaf,
+                )
+            )
+        )
+        if parent is not None:
+            session.execute(
+                text(
+                    f"ALTER INDEX {_partition_index_name(parent, name, table)} "
+                    f"ATTACH PARTITION {index}"
+                )
+            )
+
+
+def _drop_leftover_vector_index(
+    session: Session, name: str, concurrently: bool, table: str = "memories"
+) -> None:
+    # A failed or cancelled concurrent build leaves an INVALID index behind, which
+    # CREATE INDEX IF NOT EXISTS would then keep instead of building. On a
+    # partitioned table it can also leave partition indexes that were never
+    # attached, so each one is dropped, after the parents that may own them.
+    for relation, _, is_leaf in _partition_tree(session, table):
+        index = _partition_index_name(relation, name, table)
+        session.execute(
+            text(
+                f"DROP INDEX {'CONCURRENTLY ' if concurrently and is_leaf else ''}"
+                f"IF EXISTS {index}"
+            )
+        )
+
+
+def _drop_vector_index(session: Session, name: str, concurrently: bool) -> None:
+    # Partitioned indexes can't be dropped concurrently, and take their
+    # per-partition indexes with them
+    if concurrently and len(_partition_tree(session)) > 1:
+        concurrently = False
+    session.execute(
+        text(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}")
+    )
+
+
+def _rename_vector_index(session: Session, name: str, new_name: str) -> None:
+    for relation, _, _ in _partition_tree(session):
+        session.execute(
+            text(
+                f"ALTER INDEX IF EXISTS {_partition_index_name(relation, name)} "
+                f"RENAME TO {_partition_index_name(relation, new_name)}"
+            )
+        )
+
+
+def create_vector_index(
+    session: Session,
+    method: Optional[str] = None,
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+    lists: Optional[int] = None,
+    concurrently: bool = False,
+) -> None:
+    """
+    Create an approximate-nearest-neighbour index on memories.embedding.
+
+    Unset parameters fall back to the vector_index_* values in settings, which also
+    choose between indexing the embeddings themselves or, with binary quantization,
+    a bit(dims) expression that is 32 times smaller than float32 vectors. IVFFlat
+    indexes should be created after the table has been populated, as the list
+    centroids are computed from the existing rows. On a partitioned table, each
+    partition gets its own index.
+
+    Args:
+        session (Session): The SQLAlchemy session to use. When concurrently is set,
+            it must be in autocommit mode, see get_session.
+        method (Optional[str]): The index method, either "hnsw" or "ivfflat".
+        m (Optional[int]): The max number of connections per HNSW layer.
+        ef_construction (Optional[int]): The HNSW candidate list size used at build time.
+        lists (Optional[int]): The number of IVFFlat inverted lists.
+        concurrently (bool): Build without locking out writes to the table.
+    """
+    if concurrently:
+        _check_autocommit(session)
+    _create_vector_index(
+        session,
+        VECTOR_INDEX_NAME,
+        method or settings.vector_index_method,
+        m or settings.vector_index_m,
+        ef_construction or settings.vector_index_ef_construction,
+        lists or settings.vector_index_lists,
+        concurrently,
+    )
+
+
+def drop_vector_index(session: Session, concurrently: bool = False) -> None:
+    """
+    Drop the approximate-nearest-neighbour index on memories.embedding, if it exists.
+
+    Args:
+        session (Session): The SQLAlchemy session to use. When concurrently is set,
+            it must be in autocommit mode, see get_session.
+        concurrently (bool): Drop without locking out reads and writes to the table.
+            Ignored on a partitioned table, which Postgres doesn't support.
+    """
+    if concurrently:
+        _check_autocommit(session)
+    _drop_vector_index(session, VECTOR_INDEX_NAME, concurrently)
+
+
+def rebuild_vector_index(
+    session: Session,
+    method: Optional[str] = None,
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+    lists: Optional[int] = None,
+    concurrently: bool = False,
+) -> None:
+    """
+    Rebuild the approximate-nearest-neighbour index, optionally with new parameters.
+
+    The replacement index is built under a temporary name and swapped in once it is
+    ready, so searches keep using the old index while the new one is built. What a
+    failed earlier rebuild left under that name is dropped first.
+
+    Args:
+        session (Session): The SQLAlchemy session to use. When concurrently is set,
+            it must be in autocommit mode, see get_session.
+        method (Optional[str]): The index method, either "hnsw" or "ivfflat".
+        m (Optional[int]): The max number of connections per HNSW layer.
+        ef_construction (Optional[int]): The HNSW candidate list size used at build time.
+        lists (Optional[int]): The number of IVFFlat inverted lists.
+        concurrently (bool): Build and drop without locking out writes to the table.
+    """
+    if concurrently:
+        _check_autocommit(session)
+    new_name = f"{VECTOR_INDEX_NAME}_rebuild"
+    _drop_leftover_vector_index(session, new_name, concurrently)
+    _create_vector_index(
+        session,
+        new_name,
+        method or settings.vector_index_method,
+        m or settings.vector_index_m,
+        ef_construction or settings.vector_index_ef_construction,
+        lists or settings.vector_index_lists,
+        concurrently,
+    )
+    _drop_vector_index(session, VECTOR_INDEX_NAME, concurrently)
+    _rename_vector_index(session, new_name, VECTOR_INDEX_NAME)
+
+
+def create_text_search_index(session: Session, concurrently: bool = False) -> None:
+    """
+    Add the generated text_search column and its GIN index to an existing memories table.
+
+    Tables created from the current models already have both, in which case this is a
+    no-op. Adding the column rewrites the table to compute the tsvector of every row.
+
+    Args:
+        session (Session): The SQLAlchemy session to use. When concurrently is set,
+            it must be in autocommit mode, see get_session.
+        concurrently (bool): Build the index without locking out writes to the table.
+    """
+    if concurrently:
+        _check_autocommit(session)
+    session.execute(
+        text(
+            "ALTER TABLE memories ADD COLUMN IF NOT EXISTS text_search tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{settings.text_search_config}', text)) STORED"
+        )
+    )
+    session.execute(
+        text(
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+            f"{TEXT_SEARCH_INDEX_NAME} ON memories USING gin (text_search)"
+        )
+    )
+
+
+def create_user_date_index(session: Session, concurrently: bool = False) -> None:
+    """
+    Add the (user_id, created_at) index that every search filters on to an existing
+    memories table.
+
+    Tables created from the current models already have it, in which case this is a
+    no-op.
+
+    Args:
+        session (Session): The SQLAlchemy session to use. When concurrently is set,
+            it must be in autocommit mode, see get_session.
+        concurrently (bool): Build without locking out writes to the table. Ignored
+            on a partitioned table, which Postgres doesn't support.
+    """
+    if concurrently and len(_partition_tree(session)) > 1:
+        concurrently = False
+    if concurrently:
+        _check_autocommit(session)
+    session.execute(
+        text(
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+            f"{USER_DATE_INDEX_NAME} ON memories (user_id, created_at)"
+        )
+    )
+
+
+def set_vector_search_recall(
+    session: Session, recall: float, top_k: int, lists: Optional[int] = None
+) -> None:
+    """
+    Trade search latency for recall for the rest of the current transaction.
+
+    A recall of 0 uses the pgvector defaults for the fastest search, and a recall of
+    1 searches as exhaustively as the index allows. Both hnsw.ef_search and
+    ivfflat.probes are set so the knob works whichever index method is in use.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        recall (float): The recall-vs-latency knob, between 0 and 1.
+        top_k (int): The number of results the search will return.
+        lists (Optional[int]): The number of IVFFlat lists in the index.
+    """
+    if not 0 <= recall <= 1:
+        raise ValueError("Recall must be between 0 and 1.")
+    if settings.vector_index_quantization == "binary":
+        # The index has to yield every candidate that gets rescored
+        top_k *= settings.binary_rescore_factor
+    ef_search = round(_MIN_EF_SEARCH + recall * (_MAX_EF_SEARCH - _MIN_EF_SEARCH))
+    ef_search = min(_MAX_EF_SEARCH, max(top_k, ef_search))
+    probes = max(1, round((lists or settings.vector_index_lists) * recall))
+    session.execute(
+        text(
+            "SELECT set_config('hnsw.ef_search', :ef_search, true), "
+            "set_config('ivfflat.probes', :probes, true)"
+        ),
+        {"ef_search": str(ef_search), "probes": str(probes)},
+    )
+
+
+def supports_iterative_scan(session: Session) -> bool:
+    """
+    Check whether the installed pgvector can scan HNSW and IVFFlat indexes
+    iteratively.
+
+    With iterative scans, a filtered search keeps walking the index until it has
+    top_k rows that pass the filters, instead of filtering the first ef_search
+    neighbours only. The extension version is read once per process.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+
+    Returns:
+        bool: Whether hnsw.iterative_scan and ivfflat.iterative_scan are available.
+    """
+    global _iterative_scan_supported
+    if _iterative_scan_supported is None:
+        version = session.execute(
+            text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        ).scalar()
+        _iterative_scan_supported = (
+            version is not None
+            and tuple(int(part) for part in version.split(".")[:2])
+            >= _ITERATIVE_SCAN_VERSION
+        )
+    return _iterative_scan_supported
@@ -1,18 +1,46 @@
 import uuid
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime
+from typing import Any, NamedTuple, Optional, Sequence, Union
 
+import numpy as np
+from pgvector.sqlalchemy import BIT
 from pydantic import BaseModel
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    ARRAY,
+    UUID,
+    ColumnElement,
+    Float,
+    Integer,
+    String,
+    cast,
+    column,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    text,
+    true,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.orm import Session, aliased
 
+from src.embedding.types import Embedding, EmbeddingLike, EmbeddingsLike
 from src.models import Memory, MemoryCategory, User
+from src.models.memory import vector_literal
+from src.queries.category import category_exists
+from src.queries.planner import SearchPlan, plan_search
+from src.queries.user import user_exists
+from src.settings import settings
 
 
 def create_memory(
     session: Session,
     text: str,
-    embedding: list[float],
+    embedding: EmbeddingLike,
     user_id: Optional[uuid.UUID] = None,
     user: Optional[User] = None,
     category_id: Optional[uuid.UUID] = None,
@@ -21,10 +49,12 @@ def create_memory(
     """
     Create a new memory in the database.
 
+    The memory is flushed but not committed, so it shares the caller's transaction.
+
     Args:
         session (Session): The SQLAlchemy session to use.
         text (str): The text of the memory.
-        embedding (list[float]): The embedding of the memory.
+        embedding (EmbeddingLike): The float32 embedding of the memory.
         user_id (Optional[uuid.UUID]): The ID of the user associated with the memory.
         user (Optional[User]): The user associated with the memory.
         category_id (Optional[uuid.UUID]): The ID of the category associated with the memory.
@@ -41,31 +71,226 @@ def create_memory(
         raise ValueError("Only one of user_id or user must be provided.")
     if all([category_id, category]):
         raise ValueError("Only one of category_id or category must be provided.")
-    if user_id:
-        user = session.query(User).filter(User.id == user_id).one_or_none()
-        if user is None:
-            raise ValueError(f"User with ID {user_id} not found.")
-    if category_id:
-        category = (
-            session.query(MemoryCategory)
-            .filter(MemoryCategory.id == category_id)
-            .one_or_none()
-        )
-        if category is None:
-            raise ValueError(f"Category with ID {category_id} not found.")
-
-    memory = Memory(
-        text=text,
-        embedding=embedding,
-        user=user,
-        category=category,
-    )
+    if user_id and not user_exists(session, user_id):
+        raise ValueError(f"User with ID {user_id} not found.")
+    if category_id and not category_exists(session, category_id):
+        raise ValueError(f"Category with ID {category_id} not found.")
+
+    memory = Memory(text=text, embedding=embedding)
+    if user is not None:
+        memory.user = user
+    else:
+        memory.user_id = user_id
+    if category is not None:
+        memory.category = category
+    else:
+        memory.category_id = category_id
     session.add(memory)
-    session.commit()
-    session.refresh(memory)
+    session.flush()
     return memory
 
 
+def create_memories(
+    session: Session,
+    texts: Sequence[str],
+    embeddings: EmbeddingsLike,
+    user_ids: Sequence[uuid.UUID],
+    category_ids: Sequence[uuid.UUID],
+) -> list[uuid.UUID]:
+    """
+    Create many memories with a single multi-row INSERT.
+
+    The rows are not committed, so the insert shares the caller's transaction.
+    Users and categories are expected to exist already.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        texts (Sequence[str]): The text of each memory.
+        embeddings (EmbeddingsLike): The embedding of each memory.
+        user_ids (Sequence[uuid.UUID]): The ID of the user associated with each memory.
+        category_ids (Sequence[uuid.UUID]): The ID of the category associated with each memory.
+
+    Returns:
+        list[uuid.UUID]: The IDs of the created memories, in input order.
+    """
+    if not len(texts) == len(embeddings) == len(user_ids) == len(category_ids):
+        raise ValueError(
+            "texts, embeddings, user_ids and category_ids must be the same length."
+        )
+    if not texts:
+        return []
+    now = datetime.now()
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "text": text,
+            "embedding": embedding,
+            "user_id": user_id,
+            "category_id": category_id,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for text, embedding, user_id, category_id in zip(
+            texts, embeddings, user_ids, category_ids
+        )
+    ]
+    session.execute(insert(Memory).values(rows))
+    return [row["id"] for row in rows]
+
+
+DEDUP_MODES = ("refresh", "replace")
+
+
+def find_duplicate_memories(
+    session: Session,
+    embeddings: EmbeddingsLike,
+    user_ids: Sequence[uuid.UUID],
+    category_ids: Sequence[uuid.UUID],
+    similarity: float,
+) -> list[Optional[uuid.UUID]]:
+    """
+    Find the closest existing memory of the same user and category for each embedding.
+
+    All lookups run in one round-trip, as a LATERAL join of an ORDER BY distance
+    LIMIT 1 per embedding.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        embeddings (EmbeddingsLike): The embeddings to look up.
+        user_ids (Sequence[uuid.UUID]): The ID of the user of each embedding.
+        category_ids (Sequence[uuid.UUID]): The ID of the category of each embedding.
+        similarity (float): The cosine similarity from which a memory is a duplicate.
+
+    Returns:
+        list[Optional[uuid.UUID]]: The ID of the duplicate of each embedding, or None,
+            in input order.
+    """
+    if len(embeddings) == 0:
+        return []
+    batch = values(
+        column("batch_index", Integer),
+        column("embedding", String),
+        column("user_id", UUID),
+        column("category_id", UUID),
+        name="batch",
+    ).data(
+        [
+            (i, vector_literal(embedding), user, category)
+            for i, (embedding, user, category) in enumerate(
+                zip(embeddings, user_ids, category_ids)
+            )
+        ]
+    )
+    distance = Memory.embedding.cosine_distance(
+        cast(batch.c.embedding, Memory.embedding.type)
+    )
+    nearest = (
+        select(Memory.id)
+        .filter(
+            Memory.user_id == batch.c.user_id,
+            Memory.category_id == batch.c.category_id,
+            distance < 1 - similarity,
+        )
+        .order_by(distance)
+        .limit(1)
+        .lateral("nearest")
+    )
+    duplicates: list[Optional[uuid.UUID]] = [None] * len(embeddings)
+    for batch_index, id in session.execute(
+        select(batch.c.batch_index, nearest.c.id).select_from(
+            batch.join(nearest, true())
+        )
+    ).all():
+        duplicates[batch_index] = id
+    return duplicates
+
+
+def merge_duplicate_memories(
+    session: Session,
+    ids: Sequence[uuid.UUID],
+    texts: Optional[Sequence[str]] = None,
+    embeddings: Optional[EmbeddingsLike] = None,
+) -> int:
+    """
+    Refresh memories that were written again, so they rank as new.
+
+    Without texts and embeddings, only created_at and updated_at are reset. With
+    them, the memories also take the text and embedding of the new write. When
+    memories are partitioned by time, the new created_at moves each refreshed
+    memory into the current period's partition, which Postgres does as a delete
+    and an insert.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        ids (Sequence[uuid.UUID]): The IDs of the memories.
+        texts (Optional[Sequence[str]]): The new text of each memory.
+        embeddings (Optional[EmbeddingsLike]): The new embedding of each memory.
+
+    Returns:
+        int: The number of memories updated.
+    """
+    if not ids:
+        return 0
+    now = datetime.now()
+    if texts is None or embeddings is None:
+        return session.execute(
+            update(Memory)
+            .where(Memory.id.in_(ids))
+            .values(created_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    return session.execute(
+        text(
+            "UPDATE memories SET text = batch.text, embedding = batch.embedding, "
+            "created_at = :now, updated_at = :now "
+            "FROM unnest(CAST(:ids AS uuid[]), CAST(:texts AS text[]), "
+            # Sent as text[], so asyncpg doesn't pick its binary vector codec
+            f"CAST(CAST(:embeddings AS text[]) AS {settings.embedding_storage}"
+            f"({settings.embedding_model_dims})[])) "
+            "AS batch(id, text, embedding) "
+            "WHERE memories.id = batch.id"
+        ),
+        {
+            "now": now,
+            "ids": [str(id) for id in ids],
+            "texts": list(texts),
+            "embeddings": [vector_literal(e) for e in embeddings],
+        },
+    ).rowcount
+
+
+def consolidate_memories(
+    session: Session, user_id: uuid.UUID, similarity: float
+) -> int:
+    """
+    Delete the memories of a user that a newer memory of the same category duplicates.
+
+    Meant for data written before dedup-on-write was enabled. Each memory is compared
+    with the other memories of its user and category, so the cost grows with the
+    square of the largest category of the user.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        user_id (uuid.UUID): The ID of the user.
+        similarity (float): The cosine similarity from which memories are duplicates.
+
+    Returns:
+        int: The number of memories deleted.
+    """
+    newer = aliased(Memory)
+    duplicated = exists().where(
+        newer.user_id == Memory.user_id,
+        newer.category_id == Memory.category_id,
+        tuple_(newer.created_at, newer.id) > tuple_(Memory.created_at, Memory.id),
+        newer.embedding.cosine_distance(Memory.embedding) < 1 - similarity,
+    )
+    return session.execute(
+        delete(Memory)
+        .where(Memory.user_id == user_id, duplicated)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
 def get_memory_from_uuid(session: Session, uuid: uuid.UUID) -> Optional[Memory]:
     """
     Get a memory from the database by its UUID.
@@ -86,6 +311,36 @@ def get_memory_from_uuid(session: Session, uuid: uuid.UUID) -> Optional[Memory]:
     )
 
 
+def _vector_candidate_filters(
+    query_embedding: Union[EmbeddingLike, ColumnElement[Any]],
+    plan: SearchPlan,
+    top_k: int,
+) -> list[ColumnElement[bool]]:
+    # With a binary-quantized index, the filtered memories are first ranked by the
+    # Hamming distance of their bits over that index, and only the best
+    # top_k * binary_rescore_factor are rescored by exact cosine distance. Exact
+    # plans rescore every filtered memory.
+    filters = plan.filters
+    if plan.exact or settings.vector_index_quantization != "binary":
+        return filters
+    bits = BIT(settings.embedding_model_dims)
+    if isinstance(query_embedding, ColumnElement):
+        query_bits = cast(func.binary_quantize(query_embedding), bits)
+    else:
+        positive = np.asarray(query_embedding, dtype=np.float32) > 0
+        query_bits = cast(literal("".join(np.where(positive, "1", "0")), String), bits)
+    hamming = cast(func.binary_quantize(Memory.embedding), bits).hamming_distance(
+        query_bits
+    )
+    candidates = (
+        select(Memory.id)
+        .filter(*filters)
+        .order_by(hamming)
+        .limit(top_k * settings.binary_rescore_factor)
+    )
+    return [Memory.id.in_(candidates)]
+
+
 class SearchMemoriesResult(BaseModel):
     memory: Memory
     score: float
@@ -95,58 +350,404 @@ class SearchMemoriesResult(BaseModel):
         arbitrary_types_allowed = True
 
 
+class SearchMemoryHit(NamedTuple):
+    """
+    One search result, read straight from the selected columns.
+
+    The direction of score depends on how the search ran. Vector searches under
+    the "similarity" and "recency" rankings return the cosine distance, where
+    lower is better. The "decay" ranking returns the decayed cosine similarity and
+    hybrid search the fused text and vector score, where higher is better. Hits
+    are always returned best first, so callers only need the direction to compare
+    scores across searches.
+    """
+
+    id: uuid.UUID
+    text: str
+    created_at: datetime
+    category: str
+    user_id: uuid.UUID
+    score: float
+    embedding: Optional[Embedding] = None
+
+
+SEARCH_RANKINGS = ("similarity", "recency", "decay")
+
+
+def _resolve_ranking(ranking: Optional[str]) -> str:
+    ranking = ranking or settings.search_ranking
+    if ranking not in SEARCH_RANKINGS:
+        raise ValueError(
+            f"Unknown ranking {ranking!r}, expected one of {SEARCH_RANKINGS}."
+        )
+    return ranking
+
+
+def _decay(half_life_days: Optional[float]) -> ColumnElement[Any]:
+    # created_at is stored as naive local time, so age it against localtimestamp
+    age_days = func.extract("epoch", func.localtimestamp() - Memory.created_at) / 86400
+    return func.power(
+        0.5, age_days / (half_life_days or settings.search_half_life_days)
+    )
+
+
+def _ranked(
+    distance: ColumnElement[Any],
+    ranking: Optional[str],
+    half_life_days: Optional[float],
+    exact: bool = False,
+) -> tuple[ColumnElement[Any], ColumnElement[Any]]:
+    # Returns the score to report and the ORDER BY that LIMIT top_k applies to
+    ranking = _resolve_ranking(ranking)
+    if ranking == "recency":
+        return distance, Memory.created_at.desc()
+    if ranking == "decay":
+        score = cast((1 - distance) * _decay(half_life_days), Float)
+        return score, score.desc()
+    return distance, _similarity_order(distance, exact)
+
+
+def _in_order(hits: list[Any], plan: SearchPlan, ranking: Optional[str]) -> list[Any]:
+    # IVFFlat's relaxed iterative scans can return neighbours slightly out of order
+    if plan.relaxed and _resolve_ranking(ranking) == "similarity":
+        hits.sort(key=lambda hit: hit.score)
+    return hits
+
+
+def _similarity_order(distance: ColumnElement[Any], exact: bool) -> ColumnElement[Any]:
+    # The vector index only serves ORDER BY on the bare distance operator, so
+    # adding 0 makes Postgres sort the filtered memories exactly
+    return distance + 0 if exact else distance
+
+
+def _hit_columns(
+    score: ColumnElement[Any], include_embeddings: bool
+) -> list[ColumnElement[Any]]:
+    columns: list[ColumnElement[Any]] = [
+        Memory.id,
+        Memory.text,
+        Memory.created_at,
+        MemoryCategory.name,
+        Memory.user_id,
+        score.label("score"),
+    ]
+    if include_embeddings:
+        columns.append(Memory.embedding)
+    return columns
+
+
 def search_memories_by_vector(
     session: Session,
-    query_embedding: list[float],
+    query_embedding: EmbeddingLike,
     user_id: uuid.UUID,
     category: Optional[str] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
     top_k: int = 30,
     threshold: float = 0.6,
+    ranking: Optional[str] = None,
+    half_life_days: Optional[float] = None,
 ) -> list[SearchMemoriesResult]:
     """
     Search for memories in the database using a vector query.
 
     Args:
         session (Session): The SQLAlchemy session to use.
-        query_embedding (list[float]): The embedding vector to search for.
+        query_embedding (EmbeddingLike): The embedding vector to search for.
         user_id (uuid.UUID): The ID of the user associated with the memories.
         category (Optional[str]): The category to filter memories by.
         date_from (Optional[datetime]): The start date to filter memories by.
         date_to (Optional[datetime]): The end date to filter memories by.
         top_k (int): The number of top results to return.
         threshold (float): The threshold for cosine distance.
+        ranking (Optional[str]): How the top_k are picked and ordered, see
+            search_memory_hits_by_vector.
+        half_life_days (Optional[float]): The half-life of the "decay" ranking.
 
     Returns:
         list[dict]: A list of dictionaries, where each dictionary contains the memory and its associated score.
     """
-    if not date_from:
-        date_from = datetime(1970, 1, 1)
-    if not date_to:
-        date_to = datetime.now() + timedelta(days=1)
-    query = select(
-        Memory, Memory.embedding.cosine_distance(query_embedding).label("score")
+    plan = plan_search(session, user_id, category, date_from, date_to)
+    if plan.empty:
+        return []
+    distance = Memory.embedding.cosine_distance(query_embedding)
+    score, order = _ranked(distance, ranking, half_life_days, plan.exact)
+    query = select(Memory, score.label("score"))
+    query = query.filter(
+        distance < threshold,
+        *_vector_candidate_filters(query_embedding, plan, top_k),
+    )
+
+    query = query.order_by(order).limit(top_k)
+    results = session.execute(query).all()
+
+    return _in_order(
+        [SearchMemoriesResult(memory=result[0], score=result[1]) for result in results],
+        plan,
+        ranking,
+    )
+
+
+def search_memories_hybrid(
+    session: Session,
+    query: str,
+    query_embedding: EmbeddingLike,
+    user_id: uuid.UUID,
+    category: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    top_k: int = 30,
+    threshold: float = 0.6,
+    fusion: str = "rrf",
+    vector_weight: float = 0.5,
+    candidates: Optional[int] = None,
+    rrf_k: int = 60,
+    include_embeddings: bool = False,
+    ranking: Optional[str] = None,
+    half_life_days: Optional[float] = None,
+) -> list[SearchMemoryHit]:
+    """
+    Search for memories by combining full-text and vector ranking in one query.
+
+    The vector and lexical candidate lists are built as CTEs, full outer joined and
+    fused, so the whole search is a single round-trip. Lexical matches don't need to
+    pass the cosine threshold, which lets exact-term hits such as names or IDs
+    through even when they are semantically distant.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        query (str): The raw query text, parsed with websearch_to_tsquery.
+        query_embedding (EmbeddingLike): The embedding vector to search for.
+        user_id (uuid.UUID): The ID of the user associated with the memories.
+        category (Optional[str]): The category to filter memories by.
+        date_from (Optional[datetime]): The start date to filter memories by.
+        date_to (Optional[datetime]): The end date to filter memories by.
+        top_k (int): The number of top results to return.
+        threshold (float): The threshold for cosine distance of vector candidates.
+        fusion (str): "rrf" for reciprocal rank fusion, or "weighted" to blend the
+            cosine similarity and the normalized ts_rank_cd score.
+        vector_weight (float): The weight of the vector score when fusion is "weighted".
+        candidates (Optional[int]): The candidates fetched per ranker, defaults to 2 * top_k.
+        rrf_k (int): The rank offset used by reciprocal rank fusion.
+        include_embeddings (bool): Whether to return the stored embedding of each hit.
+        ranking (Optional[str]): "similarity" ranks by fused score, "recency" picks
+            the newest candidates and "decay" multiplies the fused score by the
+            time decay.
+        half_life_days (Optional[float]): The half-life of the "decay" ranking.
+
+    Returns:
+        list[SearchMemoryHit]: The memories with their fused score, where higher is
+            better.
+    """
+    ranking = _resolve_ranking(ranking)
+    if fusion not in ("rrf", "weighted"):
+        raise ValueError(f"Unknown fusion {fusion!r}, expected 'rrf' or 'weighted'.")
+    candidates = candidates or 2 * top_k
+    plan = plan_search(session, user_id, category, date_from, date_to)
+    if plan.empty:
+        return []
+
+    distance = Memory.embedding.cosine_distance(query_embedding)
+    vector_order = _similarity_order(distance, plan.exact)
+    vector = (
+        select(
+            Memory.id,
+            (1 - distance).label("score"),
+            func.row_number().over(order_by=vector_order).label("rank"),
+        )
+        .filter(
+            distance < threshold,
+            *_vector_candidate_filters(query_embedding, plan, candidates),
+        )
+        .order_by(vector_order)
+        .limit(candidates)
+        .cte("vector_candidates")
+    )
+
+    tsquery = func.websearch_to_tsquery(settings.text_search_config, query)
+    # Normalization 32 maps the rank into [0, 1) so it can be blended with similarity
+    lexical_score = func.ts_rank_cd(Memory.text_search, tsquery, 32)
+    lexical = (
+        select(
+            Memory.id,
+            lexical_score.label("score"),
+            func.row_number().over(order_by=lexical_score.desc()).label("rank"),
+        )
+        .filter(Memory.text_search.op("@@")(tsquery), *plan.filters)
+        .order_by(lexical_score.desc())
+        .limit(candidates)
+        .cte("lexical_candidates")
     )
-    if category:
-        query = query.filter(
-            Memory.embedding.cosine_distance(query_embedding) < threshold,
-            Memory.user_id == user_id,
-            Memory.category.has(name=category),
-            Memory.created_at.between(date_from, date_to),
+
+    if fusion == "rrf":
+        score = func.coalesce(1.0 / (rrf_k + vector.c.rank), 0.0) + func.coalesce(
+            1.0 / (rrf_k + lexical.c.rank), 0.0
         )
     else:
-        query = query.filter(
-            Memory.embedding.cosine_distance(query_embedding) < threshold,
-            Memory.user_id == user_id,
-            Memory.created_at.between(date_from, date_to),
+        score = vector_weight * func.coalesce(vector.c.score, 0.0) + (
+            1 - vector_weight
+        ) * func.coalesce(lexical.c.score, 0.0)
+    fused = (
+        select(
+            func.coalesce(vector.c.id, lexical.c.id).label("id"),
+            cast(score, Float).label("score"),
         )
+        .select_from(vector.join(lexical, vector.c.id == lexical.c.id, full=True))
+        .cte("fused")
+    )
+
+    score = fused.c.score
+    if ranking == "decay":
+        score = cast(score * _decay(half_life_days), Float)
+    order = Memory.created_at.desc() if ranking == "recency" else score.desc()
+    results = session.execute(
+        select(*_hit_columns(score, include_embeddings))
+        .join(fused, Memory.id == fused.c.id)
+        .join(MemoryCategory, Memory.category_id == MemoryCategory.id)
+        .order_by(order)
+        .limit(top_k)
+    ).all()
+
+    return [SearchMemoryHit(*result) for result in results]
+
+
+def search_memory_hits_by_vector(
+    session: Session,
+    query_embedding: EmbeddingLike,
+    user_id: uuid.UUID,
+    category: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    top_k: int = 30,
+    threshold: float = 0.6,
+    include_embeddings: bool = False,
+    ranking: Optional[str] = None,
+    half_life_days: Optional[float] = None,
+) -> list[SearchMemoryHit]:
+    """
+    Search for memories using a vector query, selecting only the columns callers use.
 
-    query = query.order_by(Memory.embedding.cosine_distance(query_embedding)).limit(
-        top_k
+    Unlike search_memories_by_vector, no ORM objects are loaded: the category name is
+    joined in and the user ID read from the foreign key, so there are no follow-up
+    relationship loads, and the embedding is only transferred when requested.
+
+    The ranking is applied in SQL, so LIMIT top_k keeps the best memories under it:
+    "similarity" orders by cosine distance and is the one the vector index serves,
+    "recency" returns the newest memories within the threshold, and "decay"
+    weights the similarity by 0.5 ** (age / half-life).
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        query_embedding (EmbeddingLike): The embedding vector to search for.
+        user_id (uuid.UUID): The ID of the user associated with the memories.
+        category (Optional[str]): The category to filter memories by.
+        date_from (Optional[datetime]): The start date to filter memories by.
+        date_to (Optional[datetime]): The end date to filter memories by.
+        top_k (int): The number of top results to return.
+        threshold (float): The threshold for cosine distance.
+        include_embeddings (bool): Whether to return the stored embedding of each hit.
+        ranking (Optional[str]): "similarity", "recency" or "decay", defaults to
+            settings.search_ranking.
+        half_life_days (Optional[float]): The half-life of the "decay" ranking.
+
+    Returns:
+        list[SearchMemoryHit]: The matching memories, best first, with their cosine
+            distance as score, or their decayed similarity for "decay".
+    """
+    plan = plan_search(session, user_id, category, date_from, date_to)
+    if plan.empty:
+        return []
+    distance = Memory.embedding.cosine_distance(query_embedding)
+    score, order = _ranked(distance, ranking, half_life_days, plan.exact)
+    results = session.execute(
+        select(*_hit_columns(score, include_embeddings))
+        .join(MemoryCategory, Memory.category_id == MemoryCategory.id)
+        .filter(
+            distance < threshold,
+            *_vector_candidate_filters(query_embedding, plan, top_k),
+        )
+        .order_by(order)
+        .limit(top_k)
+    ).all()
+
+    return _in_order([SearchMemoryHit(*result) for result in results], plan, ranking)
+
+
+def search_memory_hits_by_vectors(
+    session: Session,
+    query_embeddings: EmbeddingsLike,
+    user_id: uuid.UUID,
+    category: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    top_k: int = 30,
+    threshold: float = 0.6,
+    include_embeddings: bool = False,
+    ranking: Optional[str] = None,
+    half_life_days: Optional[float] = None,
+) -> list[list[SearchMemoryHit]]:
+    """
+    Run one vector search per query embedding, all in a single statement.
+
+    The query vectors are bound as a single vector array, unnested, and each one
+    is searched with a LATERAL subquery, so N searches cost one round-trip and
+    each can still use the vector index.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        query_embeddings (EmbeddingsLike): The embedding vectors to search for.
+        user_id (uuid.UUID): The ID of the user associated with the memories.
+        category (Optional[str]): The category to filter memories by.
+        date_from (Optional[datetime]): The start date to filter memories by.
+        date_to (Optional[datetime]): The end date to filter memories by.
+        top_k (int): The number of top results to return per query.
+        threshold (float): The threshold for cosine distance.
+        include_embeddings (bool): Whether to return the stored embedding of each hit.
+        ranking (Optional[str]): See search_memory_hits_by_vector.
+        half_life_days (Optional[float]): The half-life of the "decay" ranking.
+
+    Returns:
+        list[list[SearchMemoryHit]]: The matching memories of each query, in input
+            order, best first.
+    """
+    if len(query_embeddings) == 0:
+        return []
+    plan = plan_search(session, user_id, category, date_from, date_to)
+    if plan.empty:
+        return [[] for _ in query_embeddings]
+    # A single vector[] parameter, in pgvector's binary format on asyncpg and as
+    # text on psycopg2, unnested along with each vector's 1-based position
+    queries = (
+        func.unnest(literal(list(query_embeddings), ARRAY(Memory.embedding.type)))
+        .table_valued(
+            column("embedding", Memory.embedding.type), with_ordinality="query_index"
+        )
+        .render_derived(name="queries")
     )
-    results = session.execute(query).all()
+    query_embedding = queries.c.embedding
+    distance = Memory.embedding.cosine_distance(query_embedding)
+    score, order = _ranked(distance, ranking, half_life_days, plan.exact)
+    hits = (
+        select(
+            *_hit_columns(score, include_embeddings),
+            func.row_number().over(order_by=order).label("rank"),
+        )
+        .join(MemoryCategory, Memory.category_id == MemoryCategory.id)
+        .filter(
+            distance < threshold,
+            *_vector_candidate_filters(query_embedding, plan, top_k),
+        )
+        .order_by(order)
+        .limit(top_k)
+        .lateral("hits")
+    )
+    results = session.execute(
+        select(queries.c.query_index, *list(hits.c)[:-1])
+        .select_from(queries.join(hits, true()))
+        .order_by(queries.c.query_index, hits.c.rank)
+    ).all()
 
-    return [
-        SearchMemoriesResult(memory=result[0], score=result[1]) for result in results
-    ]
+    grouped: list[list[SearchMemoryHit]] = [[] for _ in query_embeddings]
+    for result in results:
+        grouped[result[0] - 1].append(SearchMemoryHit(*result[1:]))
+    return [_in_order(hits, plan, ranking) for hits in grouped]
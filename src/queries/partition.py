@@ -0,0 +1,303 @@
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.queries.index import (
+    TEXT_SEARCH_INDEX_NAME,
+    USER_DATE_INDEX_NAME,
+    VECTOR_INDEX_NAME,
+    _create_vector_index,
+    _partition_index_name,
+)
+from src.queries.reembed import SHADOW_VECTOR_INDEX_NAME, lock_memories_for_cutover
+from src.settings import settings
+
+MEMORY_TIME_PARTITIONS = ("none", "month", "year")
+UNPARTITIONED_MEMORIES_TABLE = "memories_unpartitioned"
+
+_PARTITIONED_MEMORIES_TABLE = "memories_partitioned"
+
+
+def _check_time_partition(time_partition: str) -> None:
+    if time_partition not in MEMORY_TIME_PARTITIONS:
+        raise ValueError(
+            f"Unknown time partition {time_partition!r}, expected one of "
+            f"{MEMORY_TIME_PARTITIONS}."
+        )
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _time_partition_bounds(
+    time_partition: str, start: date, end: date
+) -> list[tuple[str, date, date]]:
+    # (suffix, from, to) of each period from the one containing start to the one
+    # containing end
+    step = 12 if time_partition == "year" else 1
+    lower = date(start.year, 1 if step == 12 else start.month, 1)
+    bounds = []
+    while lower <= end:
+        upper = _add_months(lower, step)
+        suffix = f"y{lower.year}" if step == 12 else f"y{lower.year}m{lower.month:02}"
+        bounds.append((suffix, lower, upper))
+        lower = upper
+    return bounds
+
+
+def _create_time_partitions(
+    session: Session, table: str, time_partition: str, start: date, end: date
+) -> list[tuple[str, str]]:
+    # Returns the (partition, parent) created
+    hash_partitions = session.execute(
+        text("SELECT relid::text FROM pg_partition_tree(:table) WHERE level = 1"),
+        {"table": table},
+    ).scalars()
+    created = []
+    for hash_partition in hash_partitions:
+        for suffix, lower, upper in _time_partition_bounds(time_partition, start, end):
+            name = f"{hash_partition}_{suffix}"
+            exists = session.execute(
+                text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+            ).scalar_one()
+            if exists:
+                continue
+            session.execute(
+                text(
+                    f"CREATE TABLE {name} PARTITION OF {hash_partition} "
+                    f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+                )
+            )
+            created.append((name, hash_partition))
+    return created
+
+
+def _rename_attached_vector_indexes(
+    session: Session, partition: str, parent: str
+) -> None:
+    # Postgres names the indexes it creates on new partitions itself, rename them
+    # to the names the vector index helpers expect
+    for name in (VECTOR_INDEX_NAME, SHADOW_VECTOR_INDEX_NAME):
+        index = session.execute(
+            text(
+                "SELECT child.oid::regclass::text FROM pg_inherits "
+                "JOIN pg_index ON pg_index.indexrelid = pg_inherits.inhrelid "
+                "JOIN pg_class child ON child.oid = pg_index.indexrelid "
+                "WHERE pg_inherits.inhparent = to_regclass(:parent) "
+                "AND pg_index.indrelid = to_regclass(:partition)"
+            ),
+            {
+                "parent": _partition_index_name(parent, name),
+                "partition": partition,
+            },
+        ).scalar()
+        expected = _partition_index_name(partition, name)
+        if index is not None and index != expected:
+            session.execute(text(f"ALTER INDEX {index} RENAME TO {expected}"))
+
+
+def is_memories_partitioned(session: Session) -> bool:
+    """
+    Check whether memories is a partitioned table.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+
+    Returns:
+        bool: Whether memories is partitioned.
+    """
+    return session.execute(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass('memories'))"
+        )
+    ).scalar_one()
+
+
+def create_time_partitions(
+    session: Session, until: Optional[date] = None, start: Optional[date] = None
+) -> list[str]:
+    """
+    Create the time sub-partitions of each user partition up to a date.
+
+    Rows outside the existing time partitions land in each user partition's default
+    partition, and a time partition can't be created once its default partition
+    holds rows in its range, so run this ahead of time, e.g. daily from a scheduler.
+    The new partitions get their own vector indexes automatically.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        until (Optional[date]): The last date to cover, defaults to
+            settings.memory_time_partitions_ahead periods from today.
+        start (Optional[date]): The first date to cover, defaults to today.
+
+    Returns:
+        list[str]: The names of the partitions created.
+    """
+    time_partition = settings.memory_time_partition
+    _check_time_partition(time_partition)
+    if time_partition == "none":
+        raise ValueError("MEMORY_TIME_PARTITION is not set.")
+    start = start or date.today()
+    if until is None:
+        step = 12 if time_partition == "year" else 1
+        until = _add_months(start, step * settings.memory_time_partitions_ahead)
+    created = _create_time_partitions(session, "memories", time_partition, start, until)
+    for partition, parent in created:
+        _rename_attached_vector_indexes(session, partition, parent)
+    return [partition for partition, _ in created]
+
+
+def partition_memories(
+    session: Session,
+    partitions: Optional[int] = None,
+    time_partition: Optional[str] = None,
+    drop_unpartitioned: bool = False,
+    lock_timeout_ms: int = 5000,
+) -> int:
+    """
+    Migrate memories to a table hash-partitioned by user_id.
+
+    Postgres only scans the partition a user hashes to, and each partition has its
+    own vector, (user_id, created_at) and text search indexes, so searches cost in
+    proportion to that partition rather than to every tenant's memories. With a
+    time partition, each user partition is sub-partitioned by created_at, and date
+    filters skip the periods out of range.
+
+    The rows are copied into the new table, which is indexed and then swapped in
+    under the memories name, all in the current transaction. Reads carry on
+    against the old table until the swap, but writes to memories are blocked from
+    the start of the copy until the commit, which includes building every index and
+    can take hours on a large table. Run it in a maintenance window; setup.py only
+    runs it on an empty table. The old table is kept as memories_unpartitioned,
+    with its indexes renamed, unless drop_unpartitioned is set. The primary key of
+    the new table includes the partition keys, as Postgres requires.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        partitions (Optional[int]): The number of hash partitions, defaults to
+            settings.memory_partitions.
+        time_partition (Optional[str]): "none", "month" or "year", defaults to
+            settings.memory_time_partition.
+        drop_unpartitioned (bool): Drop the old table once the new one is in place.
+        lock_timeout_ms (int): Give up rather than queue behind long-running queries.
+
+    Returns:
+        int: The number of memories copied.
+    """
+    partitions = partitions or settings.memory_partitions
+    time_partition = time_partition or settings.memory_time_partition
+    if partitions < 1:
+        raise ValueError("Memories need at least one partition.")
+    _check_time_partition(time_partition)
+    if is_memories_partitioned(session):
+        raise ValueError("Memories are already partitioned.")
+
+    lock_memories_for_cutover(session, lock_timeout_ms)
+    new = _PARTITIONED_MEMORIES_TABLE
+    session.execute(
+        text(
+            f"CREATE TABLE {new} (LIKE memories INCLUDING DEFAULTS INCLUDING GENERATED "
+            "INCLUDING CONSTRAINTS INCLUDING STORAGE) PARTITION BY HASH (user_id)"
+        )
+    )
+    primary_key = (
+        "id, user_id" if time_partition == "none" else "id, user_id, created_at"
+    )
+    session.execute(
+        text(
+            f"ALTER TABLE {new} ADD PRIMARY KEY ({primary_key}), "
+            "ADD CONSTRAINT memories_category_id_fkey FOREIGN KEY (category_id) "
+            "REFERENCES memory_categories (id), "
+            "ADD CONSTRAINT memories_user_id_fkey FOREIGN KEY (user_id) "
+            "REFERENCES users (id)"
+        )
+    )
+    for remainder in range(partitions):
+        partition = f"memories_p{remainder}"
+        session.execute(
+            text(
+                f"CREATE TABLE {partition} PARTITION OF {new} "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+                + (
+                    " PARTITION BY RANGE (created_at)"
+                    if time_partition != "none"
+                    else ""
+                )
+            )
+        )
+        if time_partition != "none":
+            session.execute(
+                text(
+                    f"CREATE TABLE {partition}_default PARTITION OF {partition} DEFAULT"
+                )
+            )
+    if time_partition != "none":
+        oldest: Optional[datetime] = session.execute(
+            text("SELECT min(created_at) FROM memories")
+        ).scalar_one()
+        today = date.today()
+        step = 12 if time_partition == "year" else 1
+        _create_time_partitions(
+            session,
+            new,
+            time_partition,
+            oldest.date() if oldest else today,
+            _add_months(today, step * settings.memory_time_partitions_ahead),
+        )
+
+    # Generated columns such as text_search are recomputed by the new table
+    columns = ", ".join(
+        session.execute(
+            text(
+                "SELECT quote_ident(column_name) FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = 'memories' "
+                "AND is_generated = 'NEVER' ORDER BY ordinal_position"
+            )
+        ).scalars()
+    )
+    copied = session.execute(
+        text(f"INSERT INTO {new} ({columns}) SELECT {columns} FROM memories")
+    ).rowcount
+
+    # Index names are unique per schema, so the old ones make way for the new ones
+    indexes = session.execute(
+        text(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = 'memories'"
+        )
+    ).scalars()
+    for index in list(indexes):
+        session.execute(text(f"ALTER INDEX {index} RENAME TO {index}_unpartitioned"))
+    # Indexes on a partitioned table cascade to its partitions. They are built
+    # before the swap so reads keep using the old table in the meantime.
+    session.execute(
+        text(f"CREATE INDEX {USER_DATE_INDEX_NAME} ON {new} (user_id, created_at)")
+    )
+    session.execute(
+        text(f"CREATE INDEX {TEXT_SEARCH_INDEX_NAME} ON {new} USING gin (text_search)")
+    )
+    _create_vector_index(
+        session,
+        VECTOR_INDEX_NAME,
+        settings.vector_index_method,
+        settings.vector_index_m,
+        settings.vector_index_ef_construction,
+        settings.vector_index_lists,
+        concurrently=False,
+        table=new,
+    )
+    session.execute(text(f"ANALYZE {new}"))
+
+    session.execute(
+        text(f"ALTER TABLE memories RENAME TO {UNPARTITIONED_MEMORIES_TABLE}")
+    )
+    session.execute(text(f"ALTER TABLE {new} RENAME TO memories"))
+    session.execute(text(f"ALTER INDEX {new}_pkey RENAME TO memories_pkey"))
+    if drop_unpartitioned:
+        session.execute(text(f"DROP TABLE {UNPARTITIONED_MEMORIES_TABLE}"))
+    return copied
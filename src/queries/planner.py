@@ -0,0 +1,142 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import ColumnElement, func, select
+from sqlalchemy.orm import Session
+
+from src.models import Memory
+from src.queries.category import get_category_id
+from src.queries.index import supports_iterative_scan
+from src.settings import settings
+
+# Memory counts by (user_id, category_id), capped at search_exact_max_rows + 1,
+# with when they were taken. The least recently used are dropped past the size.
+_ROW_COUNTS_SIZE = 10000
+_row_counts: OrderedDict[tuple[uuid.UUID, Optional[uuid.UUID]], tuple[int, float]] = (
+    OrderedDict()
+)
+_row_counts_lock = threading.Lock()
+
+
+class SearchPlan(NamedTuple):
+    filters: list[ColumnElement[bool]]
+    # Scan the filtered memories and sort them exactly rather than walk the index
+    exact: bool
+    # The filters can't match anything, e.g. an unknown category
+    empty: bool = False
+    # The index may return neighbours slightly out of order, so hits are re-sorted
+    relaxed: bool = False
+
+
+def _cached_row_count(key: tuple[uuid.UUID, Optional[uuid.UUID]]) -> Optional[int]:
+    with _row_counts_lock:
+        entry = _row_counts.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > settings.search_plan_cache_seconds:
+            del _row_counts[key]
+            return None
+        _row_counts.move_to_end(key)
+        return entry[0]
+
+
+def _cache_row_count(key: tuple[uuid.UUID, Optional[uuid.UUID]], count: int) -> None:
+    with _row_counts_lock:
+        _row_counts[key] = (count, time.monotonic())
+        _row_counts.move_to_end(key)
+        while len(_row_counts) > _ROW_COUNTS_SIZE:
+            _row_counts.popitem(last=False)
+
+
+def _count(filters: list[ColumnElement[bool]], max_rows: int) -> ColumnElement[Any]:
+    matching = select(Memory.id).filter(*filters).limit(max_rows + 1).subquery()
+    return select(func.count()).select_from(matching).scalar_subquery()
+
+
+def plan_search(
+    session: Session,
+    user_id: uuid.UUID,
+    category: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> SearchPlan:
+    """
+    Plan how a vector search applies its filters.
+
+    The category name is resolved to its ID once, through the lookup cache, so
+    memories are filtered on category_id instead of a per-row subquery, and unset
+    dates add no predicate. When no more than settings.search_exact_max_rows
+    memories pass the filters, the search sorts them exactly, which is fast at that
+    size and always finds the full top_k.
+
+    The memories of the user and category are counted up to that limit, which the
+    (user_id, created_at) index makes cheap, and the count is reused for
+    settings.search_plan_cache_seconds. Searches within that limit then need no
+    extra round-trip, and a count that went stale only makes the search a little
+    slower. Date filters are counted on each search, and only when the cached count
+    is over the limit.
+
+    Otherwise the vector index drives the search, with iterative scans switched on
+    for the transaction if pgvector supports them, so selective filters still fill
+    top_k. HNSW scans in strict order. IVFFlat scans in relaxed order, so the plan
+    tells the search to re-sort its hits. These settings go in the counting
+    round-trip.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        user_id (uuid.UUID): The ID of the user associated with the memories.
+        category (Optional[str]): The category to filter memories by.
+        date_from (Optional[datetime]): The start date to filter memories by.
+        date_to (Optional[datetime]): The end date to filter memories by.
+
+    Returns:
+        SearchPlan: The filters and how to search with them.
+    """
+    filters: list[ColumnElement[bool]] = [Memory.user_id == user_id]
+    category_id = None
+    if category:
+        category_id = get_category_id(session, category)
+        if category_id is None:
+            return SearchPlan(filters, exact=True, empty=True)
+        filters.append(Memory.category_id == category_id)
+    base_filters = list(filters)
+    if date_from:
+        filters.append(Memory.created_at >= date_from)
+    if date_to:
+        filters.append(Memory.created_at <= date_to)
+
+    max_rows = settings.search_exact_max_rows
+    key = (user_id, category_id)
+    row_count = None
+    if max_rows and settings.search_plan_cache_seconds:
+        row_count = _cached_row_count(key)
+        if row_count is not None and row_count <= max_rows:
+            return SearchPlan(filters, exact=True)
+    columns: list[ColumnElement[Any]] = []
+    count_base = bool(max_rows) and row_count is None
+    count_dated = bool(max_rows) and len(filters) > len(base_filters)
+    if count_base:
+        columns.append(_count(base_filters, max_rows))
+    if count_dated:
+        columns.append(_count(filters, max_rows))
+    relaxed = False
+    if supports_iterative_scan(session):
+        if settings.vector_index_method == "hnsw":
+            columns.append(func.set_config("hnsw.iterative_scan", "strict_order", True))
+        elif settings.vector_index_method == "ivfflat":
+            columns.append(
+                func.set_config("ivfflat.iterative_scan", "relaxed_order", True)
+            )
+            relaxed = True
+    if not columns:
+        return SearchPlan(filters, exact=False, relaxed=relaxed)
+    row = session.execute(select(*columns)).one()
+    counts = list(row[: int(count_base) + int(count_dated)])
+    if count_base and settings.search_plan_cache_seconds:
+        _cache_row_count(key, counts[0])
+    exact = bool(counts) and min(counts) <= max_rows
+    return SearchPlan(filters, exact=exact, relaxed=relaxed and not exact)
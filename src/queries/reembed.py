@@ -0,0 +1,460 @@
+import time
+import uuid
+from typing import Iterator, NamedTuple, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.embedding.types import EmbeddingsLike
+from src.models.memory import vector_literal
+from src.queries.index import (
+    VECTOR_INDEX_NAME,
+    _check_autocommit,
+    _create_vector_index,
+    _drop_vector_index,
+    _rename_vector_index,
+)
+from src.settings import settings
+
+SHADOW_EMBEDDING_COLUMN = "embedding_next"
+PREVIOUS_EMBEDDING_COLUMN = "embedding_previous"
+SHADOW_VECTOR_INDEX_NAME = f"{VECTOR_INDEX_NAME}_next"
+EMBEDDING_NOT_NULL_CONSTRAINT = "memories_embedding_not_null"
+
+# When this process last found the active model to match its settings
+_model_checked_at: Optional[float] = None
+
+
+def record_embedding_model(session: Session) -> tuple[str, int]:
+    """
+    Create the active model marker, naming the model in settings if it is new.
+
+    The marker is the single row of embedding_model. It names the model the stored
+    embeddings come from, and only a cutover changes it.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+
+    Returns:
+        tuple[str, int]: The name and dimension of the active model.
+    """
+    session.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS embedding_model ("
+            "singleton boolean PRIMARY KEY DEFAULT true CHECK (singleton), "
+            "model_name text NOT NULL, dims integer NOT NULL, "
+            "updated_at timestamp NOT NULL DEFAULT now())"
+        )
+    )
+    session.execute(
+        text(
+            "INSERT INTO embedding_model (model_name, dims) "
+            "VALUES (:model_name, :dims) ON CONFLICT DO NOTHING"
+        ),
+        {
+            "model_name": settings.embedding_model_name,
+            "dims": settings.embedding_model_dims,
+        },
+    )
+    model_name, dims = session.execute(
+        text("SELECT model_name, dims FROM embedding_model")
+    ).one()
+    return model_name, dims
+
+
+def check_embedding_model(session: Session, for_write: bool = False) -> None:
+    """
+    Fail clearly once memories have been cut over to a model other than settings'.
+
+    Writes pass for_write, which reads the marker FOR SHARE every time: a cutover
+    updates it before locking memories, so it waits for those writes, and writes
+    queued behind it see the new model instead of storing old-model embeddings.
+    Searches re-read it at most every settings.embedding_model_check_seconds, so
+    until then a search on a server still running the old model can fail with a
+    dimension mismatch instead.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        for_write (bool): Read the marker now and hold it until the transaction ends.
+    """
+    global _model_checked_at
+    now = time.monotonic()
+    if (
+        not for_write
+        and _model_checked_at is not None
+        and now - _model_checked_at < settings.embedding_model_check_seconds
+    ):
+        return
+    active = session.execute(
+        text(
+            "SELECT model_name, dims FROM embedding_model"
+            + (" FOR SHARE" if for_write else "")
+        )
+    ).one_or_none()
+    expected = (settings.embedding_model_name, settings.embedding_model_dims)
+    if active is not None and tuple(active) != expected:
+        _model_checked_at = None
+        raise ValueError(
+            f"Memories were cut over to {active[0]} at {active[1]} dims, restart with "
+            "EMBEDDING_MODEL_NAME and EMBEDDING_MODEL_DIMS set to match."
+        )
+    _model_checked_at = now
+
+
+def set_embedding_model(
+    session: Session, model_name: str, dims: int, lock_timeout_ms: int = 5000
+) -> None:
+    """
+    Point the active model marker at the model being cut over to.
+
+    Call it in the cutover transaction before lock_memories_for_cutover, so writes
+    checked against the marker are paused from here until the commit.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        model_name (str): The model the shadow embeddings come from.
+        dims (int): The dimension of the shadow embeddings.
+        lock_timeout_ms (int): Give up rather than queue behind long-running writes.
+    """
+    session.execute(
+        text("SELECT set_config('lock_timeout', :timeout, true)"),
+        {"timeout": f"{int(lock_timeout_ms)}ms"},
+    )
+    if not session.execute(
+        text(
+            "UPDATE embedding_model SET model_name = :model_name, dims = :dims, "
+            "updated_at = now()"
+        ),
+        {"model_name": model_name, "dims": dims},
+    ).rowcount:
+        raise ValueError("The active model marker is missing, run setup.py first.")
+
+
+def _check_no_previous_embeddings(session: Session) -> None:
+    exists = session.execute(
+        text(
+            "SELECT EXISTS (SELECT FROM pg_attribute WHERE attrelid = 'memories'::regclass "
+            "AND attname = :column AND NOT attisdropped)"
+        ),
+        {"column": PREVIOUS_EMBEDDING_COLUMN},
+    ).scalar_one()
+    if exists:
+        raise ValueError(
+            f"{PREVIOUS_EMBEDDING_COLUMN} from an earlier cutover still exists, "
+            "drop it with drop_previous_embeddings before cutting over again."
+        )
+
+
+class ReembedCheckpoint(NamedTuple):
+    job: str
+    model_name: str
+    dims: int
+    last_id: Optional[uuid.UUID]
+    processed: int
+
+
+def prepare_reembedding(
+    session: Session, job: str, model_name: str, dims: int
+) -> ReembedCheckpoint:
+    """
+    Add the shadow embedding column and get or start the checkpoint of a job.
+
+    Adding a nullable column without a default only touches the catalog, so this is
+    instant even on large tables and doesn't block searches.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        job (str): The name of the re-embedding job.
+        model_name (str): The model the job embeds with.
+        dims (int): The dimension of the new embeddings.
+
+    Returns:
+        ReembedCheckpoint: The checkpoint to resume the job from.
+    """
+    session.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS reembed_checkpoints ("
+            "job text PRIMARY KEY, model_name text NOT NULL, dims integer NOT NULL, "
+            "last_id uuid, processed bigint NOT NULL DEFAULT 0, "
+            "updated_at timestamp NOT NULL DEFAULT now())"
+        )
+    )
+    session.execute(
+        text(
+            f"ALTER TABLE memories ADD COLUMN IF NOT EXISTS "
+            f"{SHADOW_EMBEDDING_COLUMN} {settings.embedding_storage}({int(dims)})"
+        )
+    )
+    session.execute(
+        text(
+            "INSERT INTO reembed_checkpoints (job, model_name, dims) "
+            "VALUES (:job, :model_name, :dims) ON CONFLICT (job) DO NOTHING"
+        ),
+        {"job": job, "model_name": model_name, "dims": dims},
+    )
+    job_, model_name_, dims_, last_id, processed = session.execute(
+        text(
+            "SELECT job, model_name, dims, last_id, processed "
+            "FROM reembed_checkpoints WHERE job = :job"
+        ),
+        {"job": job},
+    ).one()
+    checkpoint = ReembedCheckpoint(
+        job_,
+        model_name_,
+        dims_,
+        uuid.UUID(str(last_id)) if last_id else None,
+        processed,
+    )
+    if (checkpoint.model_name, checkpoint.dims) != (model_name, dims):
+        raise ValueError(
+            f"Job {job!r} was started with {checkpoint.model_name} at "
+            f"{checkpoint.dims} dims."
+        )
+    return checkpoint
+
+
+def save_reembed_checkpoint(
+    session: Session, job: str, last_id: Optional[uuid.UUID], processed: int
+) -> None:
+    """
+    Record how far a re-embedding job got, in the caller's transaction.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        job (str): The name of the re-embedding job.
+        last_id (Optional[uuid.UUID]): The last memory ID written by the job.
+        processed (int): The number of memories re-embedded so far.
+    """
+    session.execute(
+        text(
+            "UPDATE reembed_checkpoints SET last_id = :last_id, "
+            "processed = :processed, updated_at = now() WHERE job = :job"
+        ),
+        {
+            "job": job,
+            "last_id": str(last_id) if last_id else None,
+            "processed": processed,
+        },
+    )
+
+
+def estimate_memory_count(session: Session) -> int:
+    """
+    Estimate the number of memories from the planner statistics, without a scan.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+
+    Returns:
+        int: The estimated row count, 0 if the table has never been analyzed.
+    """
+    count = session.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'memories'")
+    ).scalar()
+    return max(0, count or 0)
+
+
+def stream_pending_reembeddings(
+    session: Session,
+    after_id: Optional[uuid.UUID],
+    limit: Optional[int],
+    batch_size: int,
+) -> Iterator[list[tuple[uuid.UUID, str]]]:
+    """
+    Stream the next page of memories without a shadow embedding, in ID order.
+
+    The page is read with keyset pagination, so every page costs the same however
+    far into the table it is, and through a server-side cursor, so only batch_size
+    rows are held in memory at a time.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        after_id (Optional[uuid.UUID]): Only return memories with a greater ID.
+        limit (Optional[int]): The maximum number of memories in the page, None for all.
+        batch_size (int): The number of memories per yielded batch.
+
+    Returns:
+        Iterator[list[tuple[uuid.UUID, str]]]: Batches of (id, text) pairs.
+    """
+    result = session.execute(
+        text(
+            f"SELECT id, text FROM memories WHERE {SHADOW_EMBEDDING_COLUMN} IS NULL "
+            "AND (CAST(:after_id AS uuid) IS NULL OR id > CAST(:after_id AS uuid)) "
+            "ORDER BY id LIMIT :limit"
+        ),
+        {"after_id": str(after_id) if after_id else None, "limit": limit},
+        execution_options={"yield_per": batch_size},
+    )
+    for partition in result.partitions():
+        yield [(uuid.UUID(str(id)), text_) for id, text_ in partition]
+
+
+def write_shadow_embeddings(
+    session: Session,
+    ids: Sequence[uuid.UUID],
+    embeddings: EmbeddingsLike,
+    dims: int,
+) -> int:
+    """
+    Write a batch of new embeddings to the shadow column in a single UPDATE.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        ids (Sequence[uuid.UUID]): The IDs of the memories.
+        embeddings (EmbeddingsLike): The new embeddings, in the same order.
+        dims (int): The dimension of the new embeddings.
+
+    Returns:
+        int: The number of memories updated.
+    """
+    if not ids:
+        return 0
+    return session.execute(
+        text(
+            f"UPDATE memories SET {SHADOW_EMBEDDING_COLUMN} = batch.embedding "
+            "FROM unnest(CAST(:ids AS uuid[]), "
+            # Sent as text[], so asyncpg doesn't pick its binary vector codec
+            f"CAST(CAST(:embeddings AS text[]) AS {settings.embedding_storage}"
+            f"({int(dims)})[])) "
+            "AS batch(id, embedding) "
+            "WHERE memories.id = batch.id"
+        ),
+        {
+            "ids": [str(id) for id in ids],
+            "embeddings": [vector_literal(e) for e in embeddings],
+        },
+    ).rowcount
+
+
+def create_shadow_vector_index(
+    session: Session,
+    method: Optional[str] = None,
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+    lists: Optional[int] = None,
+    concurrently: bool = True,
+    dims: Optional[int] = None,
+) -> None:
+    """
+    Build the approximate-nearest-neighbour index on the shadow column.
+
+    Built after the backfill so the bulk writes don't maintain it row by row, and
+    before the cutover so searches are never without an index.
+
+    Args:
+        session (Session): The SQLAlchemy session to use. When concurrently is set,
+            it must be in autocommit mode, see get_session.
+        method (Optional[str]): The index method, either "hnsw" or "ivfflat".
+        m (Optional[int]): The max number of connections per HNSW layer.
+        ef_construction (Optional[int]): The HNSW candidate list size used at build time.
+        lists (Optional[int]): The number of IVFFlat inverted lists.
+        concurrently (bool): Build without locking out writes to the table.
+        dims (Optional[int]): The dimension of the shadow embeddings, defaults to settings.
+    """
+    if concurrently:
+        _check_autocommit(session)
+    _create_vector_index(
+        session,
+        SHADOW_VECTOR_INDEX_NAME,
+        method or settings.vector_index_method,
+        m or settings.vector_index_m,
+        ef_construction or settings.vector_index_ef_construction,
+        lists or settings.vector_index_lists,
+        concurrently,
+        column=SHADOW_EMBEDDING_COLUMN,
+        dims=dims,
+    )
+
+
+def lock_memories_for_cutover(session: Session, lock_timeout_ms: int = 5000) -> None:
+    """
+    Block writes to memories until the end of the transaction, reads carry on.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        lock_timeout_ms (int): Give up rather than queue behind long-running queries.
+    """
+    session.execute(
+        text("SELECT set_config('lock_timeout', :timeout, true)"),
+        {"timeout": f"{int(lock_timeout_ms)}ms"},
+    )
+    session.execute(text("LOCK TABLE memories IN SHARE ROW EXCLUSIVE MODE"))
+
+
+def cutover_embeddings(session: Session) -> None:
+    """
+    Swap the shadow column and its index in as memories.embedding.
+
+    Must run in the transaction that called set_embedding_model and then
+    lock_memories_for_cutover, once every memory has a shadow embedding. Only
+    catalog changes are made, so the exclusive lock is held for milliseconds. The
+    old embeddings are kept in embedding_previous until drop_previous_embeddings,
+    which allows a rollback, so a second cutover is refused while that column
+    exists. NOT NULL is enforced with a NOT VALID check constraint, which applies
+    to new rows immediately; validate_embedding_constraint checks existing rows
+    afterwards without blocking reads or writes.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+    """
+    _check_no_previous_embeddings(session)
+    pending = session.execute(
+        text(f"SELECT count(*) FROM memories WHERE {SHADOW_EMBEDDING_COLUMN} IS NULL")
+    ).scalar_one()
+    if pending:
+        raise ValueError(f"{pending} memories have not been re-embedded yet.")
+    session.execute(
+        text(
+            f"ALTER TABLE memories RENAME COLUMN embedding TO {PREVIOUS_EMBEDDING_COLUMN}"
+        )
+    )
+    session.execute(
+        text(
+            f"ALTER TABLE memories ALTER COLUMN {PREVIOUS_EMBEDDING_COLUMN} DROP NOT NULL"
+        )
+    )
+    session.execute(
+        text(
+            f"ALTER TABLE memories RENAME COLUMN {SHADOW_EMBEDDING_COLUMN} TO embedding"
+        )
+    )
+    session.execute(
+        text(
+            f"ALTER TABLE memories DROP CONSTRAINT IF EXISTS {EMBEDDING_NOT_NULL_CONSTRAINT}"
+        )
+    )
+    session.execute(
+        text(
+            f"ALTER TABLE memories ADD CONSTRAINT {EMBEDDING_NOT_NULL_CONSTRAINT} "
+            "CHECK (embedding IS NOT NULL) NOT VALID"
+        )
+    )
+    _drop_vector_index(session, VECTOR_INDEX_NAME, concurrently=False)
+    _rename_vector_index(session, SHADOW_VECTOR_INDEX_NAME, VECTOR_INDEX_NAME)
+
+
+def validate_embedding_constraint(session: Session) -> None:
+    """
+    Check existing rows against the NOT NULL constraint added by the cutover.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+    """
+    session.execute(
+        text(
+            f"ALTER TABLE memories VALIDATE CONSTRAINT {EMBEDDING_NOT_NULL_CONSTRAINT}"
+        )
+    )
+
+
+def drop_previous_embeddings(session: Session) -> None:
+    """
+    Drop the embeddings kept from before the last cutover, freeing their storage.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+    """
+    session.execute(
+        text(f"ALTER TABLE memories DROP COLUMN IF EXISTS {PREVIOUS_EMBEDDING_COLUMN}")
+    )
@@ -0,0 +1,108 @@
+import uuid
+from datetime import datetime
+from typing import Any, Generator, NamedTuple, Optional, Sequence
+
+from sqlalchemy import delete, func, literal_column, select
+from sqlalchemy.orm import Session
+
+from src.models import Memory, MemoryCategory
+
+
+class PurgeStats(NamedTuple):
+    memories: int
+    bytes: int
+
+
+def _purge_filters(
+    ids: Optional[Sequence[uuid.UUID]],
+    user_id: Optional[uuid.UUID],
+    category: Optional[str],
+    older_than: Optional[datetime],
+) -> list[Any]:
+    filters: list[Any] = []
+    if ids is not None:
+        filters.append(Memory.id.in_(ids))
+    if user_id:
+        filters.append(Memory.user_id == user_id)
+    if category:
+        filters.append(
+            Memory.category_id.in_(
+                select(MemoryCategory.id).where(MemoryCategory.name == category)
+            )
+        )
+    if older_than:
+        filters.append(Memory.created_at < older_than)
+    if not filters:
+        raise ValueError(
+            "At least one of ids, user_id, category or older_than must be provided."
+        )
+    return filters
+
+
+def delete_memories_batch(
+    session: Session,
+    ids: Optional[Sequence[uuid.UUID]] = None,
+    user_id: Optional[uuid.UUID] = None,
+    category: Optional[str] = None,
+    older_than: Optional[datetime] = None,
+    batch_size: int = 1000,
+) -> PurgeStats:
+    """
+    Delete up to batch_size memories matching every given filter in one statement.
+
+    Callers delete large sets by committing one batch at a time until a batch comes
+    back short, which keeps row locks, transaction size and WAL bursts bounded and
+    lets autovacuum reclaim the dead rows in between. Only the count and the total
+    size of the deleted rows are sent back.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        ids (Optional[Sequence[uuid.UUID]]): Only delete memories with these IDs.
+        user_id (Optional[uuid.UUID]): Only delete memories of this user.
+        category (Optional[str]): Only delete memories of this category.
+        older_than (Optional[datetime]): Only delete memories created before this.
+        batch_size (int): The maximum number of memories to delete.
+
+    Returns:
+        PurgeStats: The number of memories deleted and their size in bytes.
+    """
+    batch = (
+        select(Memory.id)
+        .where(*_purge_filters(ids, user_id, category, older_than))
+        .limit(batch_size)
+    )
+    deleted = (
+        delete(Memory)
+        .where(Memory.id.in_(batch.scalar_subquery()))
+        .returning(func.pg_column_size(literal_column("memories.*")).label("bytes"))
+        .cte("deleted")
+    )
+    memories, size = session.execute(
+        select(func.count(), func.coalesce(func.sum(deleted.c.bytes), 0))
+    ).one()
+    return PurgeStats(memories, int(size))
+
+
+def purge_batches(
+    ids: Optional[Sequence[uuid.UUID]], batch_size: int
+) -> Generator[tuple[Optional[Sequence[uuid.UUID]], bool], int, None]:
+    """
+    Plan the batches of a purge for the sync and async callers of
+    delete_memories_batch.
+
+    Yields the IDs of each batch to delete, None meaning up to batch_size of every
+    matching memory, and whether to pause for settings.purge_pause_ms before it.
+    Each batch is sent back the number of memories it deleted, and unfiltered
+    batches repeat until one comes back short.
+
+    Args:
+        ids (Optional[Sequence[uuid.UUID]]): The IDs to delete, if any.
+        batch_size (int): The maximum number of memories per batch.
+    """
+    if ids is not None:
+        for i in range(0, len(ids), batch_size):
+            yield ids[i : i + batch_size], False
+        return
+    deleted = yield None, False
+    while deleted >= batch_size:
+        deleted = yield None, True
@@ -0,0 +1,368 @@
+import struct
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from src.models import User
+from src.settings import settings
+
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_COPY_HEADER = _COPY_SIGNATURE + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+# Postgres timestamps are microseconds since 2000-01-01
+_PG_EPOCH = datetime(2000, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# The big-endian element type of vector_send/halfvec_send, after (dims, unused) int16s
+_EMBEDDING_WIRE_TYPES = {"vector": ">f4", "halfvec": ">f2"}
+
+_IMPORT_COLUMNS = "id, user_id, category_id, created_at, updated_at, text, embedding"
+# id, user_id, category_id, created_at, updated_at: (field count, then length and
+# value of each)
+_IMPORT_ROW_PREFIX = struct.Struct(">hi16si16si16siqiq")
+_IMPORT_ROW_PREFIX_NO_CATEGORY = struct.Struct(">hi16si16siiqiq")
+
+
+class ExportedMemory(NamedTuple):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    category: Optional[str]
+    created_at: datetime
+    text: str
+
+
+def _wire_type(storage: str) -> np.dtype:
+    if storage not in _EMBEDDING_WIRE_TYPES:
+        raise ValueError(
+            f"Unknown embedding storage {storage!r}, expected one of "
+            f"{tuple(_EMBEDDING_WIRE_TYPES)}."
+        )
+    return np.dtype(_EMBEDDING_WIRE_TYPES[storage])
+
+
+def _dbapi_cursor(session: Session) -> Any:
+    return session.connection().connection.cursor()
+
+
+class _CopyOutParser:
+    """
+    File-like sink for COPY ... TO STDOUT WITH (FORMAT binary) that decodes the rows
+    as the driver writes them and hands them on in batches.
+    """
+
+    def __init__(
+        self,
+        on_batch: Callable[[list[ExportedMemory], np.ndarray], None],
+        dims: int,
+        wire_type: np.dtype,
+        batch_size: int,
+    ) -> None:
+        self.on_batch = on_batch
+        self.dims = dims
+        self.wire_type = wire_type
+        self.batch_size = batch_size
+        self.count = 0
+        self._buffer = bytearray()
+        self._header_read = False
+        self._done = False
+        self._rows: list[ExportedMemory] = []
+        self._embeddings: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        position = self._parse()
+        del self._buffer[:position]
+        return len(data)
+
+    def _parse(self) -> int:
+        buffer = self._buffer
+        position = 0
+        if not self._header_read:
+            if len(buffer) < len(_COPY_SIGNATURE) + 8:
+                return 0
+            if bytes(buffer[: len(_COPY_SIGNATURE)]) != _COPY_SIGNATURE:
+                raise ValueError("Not a binary COPY stream.")
+            (extension,) = struct.unpack_from(">i", buffer, len(_COPY_SIGNATURE) + 4)
+            position = len(_COPY_SIGNATURE) + 8 + extension
+            if len(buffer) < position:
+                return 0
+            self._header_read = True
+        while not self._done and len(buffer) - position >= 2:
+            start = position
+            (fields,) = struct.unpack_from(">h", buffer, position)
+            position += 2
+            if fields == -1:
+                self._done = True
+                break
+            values: list[Optional[bytes]] = []
+            for _ in range(fields):
+                if len(buffer) - position < 4:
+                    return start
+                (length,) = struct.unpack_from(">i", buffer, position)
+                position += 4
+                if length == -1:
+                    values.append(None)
+                    continue
+                if len(buffer) - position < length:
+                    return start
+                values.append(bytes(buffer[position : position + length]))
+                position += length
+            self._add_row(values)
+        return position
+
+    def _add_row(self, values: list[Optional[bytes]]) -> None:
+        id, user_id, category, created_at, text_, embedding = values
+        assert id and user_id and created_at and text_ is not None and embedding
+        (dims,) = struct.unpack_from(">h", embedding)
+        if dims != self.dims:
+            raise ValueError(f"Memory {uuid.UUID(bytes=id)} has {dims} dims.")
+        self._rows.append(
+            ExportedMemory(
+                uuid.UUID(bytes=id),
+                uuid.UUID(bytes=user_id),
+                category.decode() if category is not None else None,
+                _PG_EPOCH + struct.unpack(">q", created_at)[0] * _MICROSECOND,
+                text_.decode(),
+            )
+        )
+        self._embeddings.append(embedding[4:])
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        embeddings = (
+            np.frombuffer(b"".join(self._embeddings), dtype=self.wire_type)
+            .reshape(len(self._rows), self.dims)
+            .astype(np.float32)
+        )
+        self.on_batch(self._rows, embeddings)
+        self.count += len(self._rows)
+        self._rows = []
+        self._embeddings = []
+
+
+class _CopyInReader:
+    """
+    File-like source for COPY ... FROM STDIN WITH (FORMAT binary) that encodes the
+    batches lazily, as the driver reads from it.
+    """
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._chunk = memoryview(b"")
+        self._offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        # Returning less than size is fine, the driver reads until it gets nothing
+        while self._offset >= len(self._chunk):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._chunk = memoryview(chunk)
+            self._offset = 0
+        end = len(self._chunk) if size < 0 else self._offset + size
+        data = self._chunk[self._offset : end].tobytes()
+        self._offset += len(data)
+        return data
+
+
+def _encode_batch(
+    rows: list[tuple[uuid.UUID, uuid.UUID, Optional[uuid.UUID], datetime, str]],
+    embeddings: np.ndarray,
+    wire_type: np.dtype,
+    updated_at: datetime,
+) -> bytes:
+    dims = embeddings.shape[1]
+    embedding_prefix = struct.pack(">ihh", 4 + dims * wire_type.itemsize, dims, 0)
+    vectors = np.ascontiguousarray(embeddings, dtype=wire_type)
+    updated = (updated_at - _PG_EPOCH) // _MICROSECOND
+    parts = []
+    for (id, user_id, category_id, created_at, text_), vector in zip(rows, vectors):
+        created = (created_at - _PG_EPOCH) // _MICROSECOND
+        if category_id is None:
+            prefix = _IMPORT_ROW_PREFIX_NO_CATEGORY.pack(
+                7, 16, id.bytes, 16, user_id.bytes, -1, 8, created, 8, updated
+            )
+        else:
+            prefix = _IMPORT_ROW_PREFIX.pack(
+                7,
+                16,
+                id.bytes,
+                16,
+                user_id.bytes,
+                16,
+                category_id.bytes,
+                8,
+                created,
+                8,
+                updated,
+            )
+        encoded = text_.encode()
+        parts.append(prefix)
+        parts.append(struct.pack(">i", len(encoded)))
+        parts.append(encoded)
+        parts.append(embedding_prefix)
+        parts.append(vector.tobytes())
+    return b"".join(parts)
+
+
+def copy_memories_out(
+    session: Session,
+    on_batch: Callable[[list[ExportedMemory], np.ndarray], None],
+    user_id: Optional[uuid.UUID] = None,
+    batch_size: int = 10000,
+) -> int:
+    """
+    Stream every memory out of the database with a single binary COPY.
+
+    The rows are decoded straight from the wire format as they arrive, embeddings
+    included, so nothing is parsed from text and only one batch is held in memory
+    at a time.
+
+    Args:
+        session (Session): The SQLAlchemy session to use, on the psycopg2 driver.
+        on_batch (Callable[[list[ExportedMemory], np.ndarray], None]): Called with
+            each batch of memories and their float32 embeddings, in the same order.
+        user_id (Optional[uuid.UUID]): Only export the memories of this user.
+        batch_size (int): The number of memories per batch.
+
+    Returns:
+        int: The number of memories exported.
+    """
+    dims = settings.embedding_model_dims
+    where = f" WHERE m.user_id = '{uuid.UUID(str(user_id))}'" if user_id else ""
+    parser = _CopyOutParser(
+        on_batch, dims, _wire_type(settings.embedding_storage), batch_size
+    )
+    _dbapi_cursor(session).copy_expert(
+        "COPY (SELECT m.id, m.user_id, c.name, m.created_at, m.text, m.embedding "
+        "FROM memories m LEFT JOIN memory_categories c ON c.id = m.category_id"
+        f"{where}) TO STDOUT WITH (FORMAT binary)",
+        parser,
+    )
+    parser.flush()
+    return parser.count
+
+
+def copy_memories_in(
+    session: Session,
+    batches: Iterable[
+        tuple[
+            list[tuple[uuid.UUID, uuid.UUID, Optional[uuid.UUID], datetime, str]],
+            np.ndarray,
+        ]
+    ],
+) -> int:
+    """
+    Load memories with their stored embeddings through a single binary COPY.
+
+    Each batch is encoded only when the driver asks for more data, so the import
+    runs in bounded memory however large the source is, and no embedding is
+    computed. The text search column is generated by Postgres as the rows land.
+    Nothing is committed.
+
+    Args:
+        session (Session): The SQLAlchemy session to use, on the psycopg2 driver.
+        batches (Iterable[tuple[list[tuple], np.ndarray]]): Batches of
+            (id, user_id, category_id, created_at, text) rows and their embeddings,
+            in the same order.
+
+    Returns:
+        int: The number of memories loaded.
+    """
+    wire_type = _wire_type(settings.embedding_storage)
+    updated_at = datetime.now()
+    count = 0
+
+    def chunks() -> Iterator[bytes]:
+        nonlocal count
+        yield _COPY_HEADER
+        for rows, embeddings in batches:
+            if embeddings.shape != (len(rows), settings.embedding_model_dims):
+                raise ValueError(
+                    f"Expected {len(rows)} embeddings of "
+                    f"{settings.embedding_model_dims} dims, got {embeddings.shape}."
+                )
+            yield _encode_batch(rows, embeddings, wire_type, updated_at)
+            count += len(rows)
+        yield _COPY_TRAILER
+
+    _dbapi_cursor(session).copy_expert(
+        f"COPY memories ({_IMPORT_COLUMNS}) FROM STDIN WITH (FORMAT binary)",
+        _CopyInReader(chunks()),
+    )
+    return count
+
+
+def stream_users(
+    session: Session, user_id: Optional[uuid.UUID] = None, batch_size: int = 10000
+) -> Iterator[list[tuple[uuid.UUID, str]]]:
+    """
+    Stream every user, or a single one, through a server-side cursor.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        user_id (Optional[uuid.UUID]): Only return this user.
+        batch_size (int): The number of users per yielded batch.
+
+    Returns:
+        Iterator[list[tuple[uuid.UUID, str]]]: Batches of (id, name) pairs.
+    """
+    query = select(User.id, User.name)
+    if user_id:
+        query = query.where(User.id == user_id)
+    result = session.execute(query, execution_options={"yield_per": batch_size})
+    for partition in result.partitions():
+        yield [(id, name) for id, name in partition]
+
+
+def import_users(
+    session: Session, users: list[tuple[uuid.UUID, str]]
+) -> dict[uuid.UUID, uuid.UUID]:
+    """
+    Create the users that don't exist yet, keeping their IDs.
+
+    Users are matched by name, so a user that already exists under another ID,
+    e.g. in another environment, keeps it and their memories are mapped onto it.
+    Nothing is committed.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        users (list[tuple[uuid.UUID, str]]): The (id, name) pairs to import.
+
+    Returns:
+        dict[uuid.UUID, uuid.UUID]: The ID each imported user ID maps to.
+    """
+    if not users:
+        return {}
+    now = datetime.now()
+    session.execute(
+        insert(User)
+        .values(
+            [
+                {"id": id, "name": name, "created_at": now, "updated_at": now}
+                for id, name in users
+            ]
+        )
+        .on_conflict_do_nothing()
+    )
+    ids = dict(
+        session.execute(
+            text(
+                "SELECT users.name, users.id FROM users "
+                "JOIN unnest(CAST(:names AS text[])) AS batch(name) "
+                "ON users.name = batch.name"
+            ),
+            {"names": [name for _, name in users]},
+        ).all()
+    )
+    missing = [name for _, name in users if name not in ids]
+    if missing:
+        raise ValueError(f"User IDs already taken by other users: {missing}.")
+    return {id: uuid.UUID(str(ids[name])) for id, name in users}
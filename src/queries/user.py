@@ -1,12 +1,19 @@
+import uuid
+from typing import Iterable
+
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 
-from src.models import User
+from src.models import Memory, User
+from src.queries.cache import lookup_cache
 
 
 def create_user(session: Session, name: str) -> User:
     """
     Create a new user in the database.
 
+    The user is flushed but not committed, so it shares the caller's transaction.
+
     Args:
         session (Session): The SQLAlchemy session to use.
         name (str): The name of the user.
@@ -16,11 +23,29 @@ def create_user(session: Session, name: str) -> User:
     """
     user = User(name=name)
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    session.flush()
+    lookup_cache.add_users(session, {user.id})
     return user
 
 
+def delete_user(session: Session, user_id: uuid.UUID) -> bool:
+    """
+    Delete a user and every memory they own.
+
+    The user is dropped from this process's lookup cache. Nothing is committed.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        user_id (uuid.UUID): The ID of the user.
+
+    Returns:
+        bool: Whether the user existed.
+    """
+    lookup_cache.invalidate_user(session, user_id)
+    session.execute(delete(Memory).where(Memory.user_id == user_id))
+    return session.execute(delete(User).where(User.id == user_id)).rowcount > 0
+
+
 def get_user_by_name(session: Session, name: str) -> User | None:
     """
     Get a user by name from the database.
@@ -34,3 +59,73 @@ def get_user_by_name(session: Session, name: str) -> User | None:
     """
     user = session.query(User).filter(User.name == name).one_or_none()
     return user
+
+
+def get_users_by_ids(session: Session, ids: Iterable[uuid.UUID]) -> list[User]:
+    """
+    Get all users matching a collection of IDs in a single query.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        ids (Iterable[uuid.UUID]): The IDs of the users to retrieve.
+
+    Returns:
+        list[User]: The users that were found. IDs with no matching user are omitted.
+    """
+    ids = list(set(ids))
+    if not ids:
+        return []
+    return session.query(User).filter(User.id.in_(ids)).all()
+
+
+def get_existing_user_ids(session: Session, ids: Iterable[uuid.UUID]) -> set[uuid.UUID]:
+    """
+    Get the subset of IDs that belong to existing users.
+
+    IDs already in the lookup cache cost no query, and the rest are checked with a
+    single SELECT.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        ids (Iterable[uuid.UUID]): The user IDs to check.
+
+    Returns:
+        set[uuid.UUID]: The IDs that belong to existing users.
+    """
+    ids = set(ids)
+    existing = {id for id in ids if lookup_cache.has_user_id(id)}
+    unknown = ids - existing
+    if unknown:
+        found = set(
+            session.execute(select(User.id).where(User.id.in_(unknown))).scalars()
+        )
+        lookup_cache.add_users(session, found)
+        existing |= found
+    return existing
+
+
+def user_exists(session: Session, user_id: uuid.UUID) -> bool:
+    """
+    Check whether a user exists, consulting the lookup cache first.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+        user_id (uuid.UUID): The ID of the user.
+
+    Returns:
+        bool: Whether the user exists.
+    """
+    return user_id in get_existing_user_ids(session, [user_id])
+
+
+def get_all_user_ids(session: Session) -> list[uuid.UUID]:
+    """
+    Get the IDs of every user.
+
+    Args:
+        session (Session): The SQLAlchemy session to use.
+
+    Returns:
+        list[uuid.UUID]: The IDs of all users.
+    """
+    return list(session.execute(select(User.id)).scalars())
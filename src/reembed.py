@@ -0,0 +1,217 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.db import get_session
+from src.embedding.types import EmbeddingsLike
+from src.queries import (
+    create_shadow_vector_index,
+    cutover_embeddings,
+    estimate_memory_count,
+    lock_memories_for_cutover,
+    prepare_reembedding,
+    save_reembed_checkpoint,
+    set_embedding_model,
+    stream_pending_reembeddings,
+    validate_embedding_constraint,
+    write_shadow_embeddings,
+)
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+Encoder = Callable[[list[str]], EmbeddingsLike]
+
+
+@dataclass
+class ReembedProgress:
+    processed: int
+    total: int
+    elapsed: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        if not self.rows_per_second or self.processed >= self.total:
+            return None
+        return (self.total - self.processed) / self.rows_per_second
+
+
+class ReembedJob:
+    """
+    Resumable job that re-embeds every memory with a new model or dimension.
+
+    New embeddings are written to a shadow column while searches keep using the
+    current one. The job streams memories in keyset-paginated pages through a
+    server-side cursor, encodes them in large batches and writes each batch with a
+    single UPDATE, committing it together with the checkpoint. A restarted job
+    resumes after the last committed batch.
+
+    Typical use, with the application still serving the old model:
+
+        job = ReembedJob("mixedbread-ai/mxbai-embed-large-v1", dims=256)
+        job.run()
+
+    run() backfills, builds the ANN index on the shadow column and then cuts over:
+    writes are paused for the few memories added since the backfill, and the shadow
+    column is swapped in with catalog-only renames. Restart the application with
+    EMBEDDING_MODEL_NAME and EMBEDDING_MODEL_DIMS set to the new model right after,
+    as query embeddings must come from the same model as the stored ones. Until
+    then, the active model marker set by the cutover makes the old servers' writes
+    and searches fail with a ValueError saying so.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        dims: Optional[int] = None,
+        job: Optional[str] = None,
+        page_size: int = 10000,
+        batch_size: int = 256,
+        encode: Optional[Encoder] = None,
+        on_progress: Optional[Callable[[ReembedProgress], None]] = None,
+    ) -> None:
+        """
+        Args:
+            model_name (Optional[str]): The model to re-embed with, defaults to settings.
+            dims (Optional[int]): The dimension to truncate embeddings to, defaults to settings.
+            job (Optional[str]): The checkpoint name, defaults to "<model_name>@<dims>".
+            page_size (int): The number of memories read per keyset page.
+            batch_size (int): The number of memories encoded and written at a time.
+            encode (Optional[Encoder]): Encodes a batch of texts, defaults to loading
+                model_name with sentence-transformers.
+            on_progress (Optional[Callable[[ReembedProgress], None]]): Called after
+                every batch.
+        """
+        self.model_name = model_name or settings.embedding_model_name
+        self.dims = dims or settings.embedding_model_dims
+        self.job = job or f"{self.model_name}@{self.dims}"
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self._encode = encode
+
+    def encode(self, texts: list[str]) -> EmbeddingsLike:
+        if self._encode is None:
+            from src.embedding import load_embedding_model
+
+            model = load_embedding_model(self.model_name, self.dims)
+            self._encode = lambda texts: model.encode(
+                texts, batch_size=self.batch_size
+            )  # type: ignore
+        return self._encode(texts)
+
+    def backfill(self) -> ReembedProgress:
+        """
+        Re-embed every memory that has no shadow embedding yet.
+
+        A first pass resumes from the checkpoint, a second pass picks up memories
+        inserted behind the cursor while the first one ran.
+
+        Returns:
+            ReembedProgress: The final progress of the job.
+        """
+        with get_session() as session:
+            checkpoint = prepare_reembedding(
+                session, self.job, self.model_name, self.dims
+            )
+            total = estimate_memory_count(session)
+        start = time.perf_counter()
+        processed = checkpoint.processed
+        progress = ReembedProgress(processed, max(total, processed), 0.0)
+        for after_id in (checkpoint.last_id, None):
+            while True:
+                written = 0
+                with get_session() as reader:
+                    pages = stream_pending_reembeddings(
+                        reader, after_id, self.page_size, self.batch_size
+                    )
+                    for batch in pages:
+                        ids = [id for id, _ in batch]
+                        embeddings = self.encode([text for _, text in batch])
+                        with get_session() as writer:
+                            write_shadow_embeddings(writer, ids, embeddings, self.dims)
+                            save_reembed_checkpoint(
+                                writer, self.job, ids[-1], processed + len(ids)
+                            )
+                        processed += len(ids)
+                        written += len(ids)
+                        after_id = ids[-1]
+                        progress = ReembedProgress(
+                            processed,
+                            max(total, processed),
+                            time.perf_counter() - start,
+                        )
+                        if self.on_progress is not None:
+                            self.on_progress(progress)
+                if written:
+                    logger.info(
+                        "Re-embedded %d/%d memories at %.0f rows/s",
+                        progress.processed,
+                        progress.total,
+                        progress.rows_per_second,
+                    )
+                if written < self.page_size:
+                    break
+        return progress
+
+    def build_index(self, **kwargs) -> None:
+        """
+        Build the ANN index on the shadow column, see create_shadow_vector_index.
+        """
+        # Built concurrently by default, which can't run inside a transaction block
+        options = (
+            {"isolation_level": "AUTOCOMMIT"}
+            if kwargs.get("concurrently", True)
+            else None
+        )
+        with get_session(options) as session:
+            create_shadow_vector_index(session, dims=self.dims, **kwargs)
+
+    def cutover(self, lock_timeout_ms: int = 5000) -> None:
+        """
+        Re-embed memories written since the backfill and swap the shadow column in.
+
+        Writes are blocked from the lock to the commit, searches only for the
+        renames at the end.
+
+        Args:
+            lock_timeout_ms (int): Give up rather than wait longer for the table lock.
+        """
+        with get_session() as session:
+            # Writes checked against the marker wait from here, then fail on old servers
+            set_embedding_model(session, self.model_name, self.dims, lock_timeout_ms)
+            lock_memories_for_cutover(session, lock_timeout_ms)
+            # Writes are blocked, so the memories added since the backfill are final
+            pending = stream_pending_reembeddings(session, None, None, self.batch_size)
+            for batch in pending:
+                write_shadow_embeddings(
+                    session,
+                    [id for id, _ in batch],
+                    self.encode([text for _, text in batch]),
+                    self.dims,
+                )
+            cutover_embeddings(session)
+        with get_session() as session:
+            validate_embedding_constraint(session)
+        logger.info("Cut over to %s at %d dims", self.model_name, self.dims)
+
+    def run(self, cutover: bool = True) -> ReembedProgress:
+        """
+        Backfill, build the index and, unless cutover is False, cut over.
+
+        Args:
+            cutover (bool): Swap the new embeddings in once they are ready.
+
+        Returns:
+            ReembedProgress: The final progress of the backfill.
+        """
+        progress = self.backfill()
+        self.build_index()
+        if cutover:
+            self.cutover()
+        return progress
@@ -0,0 +1,102 @@
+import logging
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from src.memory import MemoryInterface
+from src.queries import PurgeStats
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Memories older than max_age_days are deleted, optionally only those of one
+    category or one user.
+    """
+
+    max_age_days: float
+    category: Optional[str] = None
+    user_id: Optional[uuid.UUID] = None
+
+
+class RetentionJob:
+    """
+    Scheduled job that deletes memories past their retention policies.
+
+    Each run deletes the expired memories of every policy through
+    MemoryInterface.remove_memories, so purges commit in bounded batches and report
+    what they freed to the metrics sinks. Run it from a scheduler with run(), or
+    in a background thread:
+
+        job = RetentionJob([RetentionPolicy(30, category="chit-chat")])
+        threading.Thread(target=job.run_forever, daemon=True).start()
+        ...
+        job.stop()
+    """
+
+    def __init__(
+        self,
+        policies: Optional[list[RetentionPolicy]] = None,
+        memory: Optional[MemoryInterface] = None,
+        interval_seconds: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            policies (Optional[list[RetentionPolicy]]): The policies to enforce,
+                defaults to one for all memories from settings.retention_days.
+            memory (Optional[MemoryInterface]): The interface to delete through.
+            interval_seconds (Optional[float]): The time between runs of
+                run_forever, defaults to settings.retention_interval_seconds.
+        """
+        if policies is None:
+            policies = (
+                [RetentionPolicy(settings.retention_days)]
+                if settings.retention_days
+                else []
+            )
+        self.policies = policies
+        self.memory = memory or MemoryInterface()
+        self.interval_seconds = interval_seconds or settings.retention_interval_seconds
+        self._stopped = threading.Event()
+
+    def run(self) -> list[PurgeStats]:
+        """
+        Delete the memories past each policy once.
+
+        Returns:
+            list[PurgeStats]: What each policy deleted, in order.
+        """
+        now = datetime.now()
+        results = []
+        for policy in self.policies:
+            stats = self.memory.remove_memories(
+                user_id=policy.user_id,
+                category=policy.category,
+                older_than=now - timedelta(days=policy.max_age_days),
+            )
+            logger.info(
+                f"Retention policy {policy} deleted {stats.memories} memories "
+                f"({stats.bytes} bytes)."
+            )
+            results.append(stats)
+        return results
+
+    def run_forever(self) -> None:
+        """
+        Run every interval_seconds until stop is called. A failed run is logged and
+        retried at the next interval.
+        """
+        while not self._stopped.is_set():
+            try:
+                self.run()
+            except Exception:
+                logger.exception("Retention run failed.")
+            self._stopped.wait(self.interval_seconds)
+
+    def stop(self) -> None:
+        self._stopped.set()
@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
 
@@ -28,9 +29,124 @@ class Settings:
             self.pg_port,
             self.pg_db,
         )
-        self.embedding_model_name: str = "mixedbread-ai/mxbai-embed-large-v1"
+        self.pg_pool_size: int = int(os.getenv("POSTGRES_POOL_SIZE", "5"))
+        self.pg_max_overflow: int = int(os.getenv("POSTGRES_MAX_OVERFLOW", "10"))
+        self.pg_pool_timeout: float = float(os.getenv("POSTGRES_POOL_TIMEOUT", "30"))
+        self.pg_pool_recycle: int = int(os.getenv("POSTGRES_POOL_RECYCLE", "1800"))
+        self.pg_pool_pre_ping: bool = (
+            os.getenv("POSTGRES_POOL_PRE_PING", "true").lower() == "true"
+        )
+        # A POSTGRES_STATEMENT_TIMEOUT_MS of 0 leaves the server default in place
+        self.pg_statement_timeout_ms: int = int(
+            os.getenv("POSTGRES_STATEMENT_TIMEOUT_MS", "0")
+        )
+
+        self.embedding_model_name: str = os.getenv(
+            "EMBEDDING_MODEL_NAME", "mixedbread-ai/mxbai-embed-large-v1"
+        )
         self.embedding_model_dir: Path = Path("./model_cache/")
-        self.embedding_model_dims: int = 512
+        self.embedding_model_dims: int = int(os.getenv("EMBEDDING_MODEL_DIMS", "512"))
+        # "vector" stores float32 embeddings, "halfvec" float16 at half the size
+        self.embedding_storage: str = os.getenv("EMBEDDING_STORAGE", "vector")
+        # "torch", "onnx" or "onnx-int8" (dynamically quantized for the
+        # EMBEDDING_QUANTIZATION instruction set: "avx512_vnni", "avx512", "avx2" or
+        # "arm64"). The ONNX models are exported once into embedding_model_dir.
+        self.embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "torch")
+        self.embedding_quantization: str = os.getenv(
+            "EMBEDDING_QUANTIZATION", "avx512_vnni"
+        )
+        # How often searches re-read the active model marker that a re-embedding
+        # cutover updates, writes read it every time
+        self.embedding_model_check_seconds: float = float(
+            os.getenv("EMBEDDING_MODEL_CHECK_SECONDS", "5")
+        )
+        self.embedding_max_workers: int = int(os.getenv("EMBEDDING_MAX_WORKERS", "2"))
+        # EMBEDDING_PROCESSES above 0 encodes on that many worker processes, each
+        # sent up to EMBEDDING_PROCESS_BATCH_SIZE texts at a time
+        self.embedding_processes: int = int(os.getenv("EMBEDDING_PROCESSES", "0"))
+        self.embedding_process_batch_size: int = int(
+            os.getenv("EMBEDDING_PROCESS_BATCH_SIZE", "64")
+        )
+        # Seconds warmup waits for every worker to load its model before failing
+        self.embedding_process_start_timeout: float = float(
+            os.getenv("EMBEDDING_PROCESS_START_TIMEOUT", "600")
+        )
+        self.embedding_batching: bool = (
+            os.getenv("EMBEDDING_BATCHING", "false").lower() == "true"
+        )
+        self.embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+        self.embedding_batch_wait_ms: float = float(
+            os.getenv("EMBEDDING_BATCH_WAIT_MS", "5")
+        )
+
+        # Seconds before a cached category or user lookup is checked against the
+        # database again, which bounds how long other processes miss a change. A
+        # LOOKUP_CACHE_TTL of 0 keeps entries until this process invalidates them.
+        self.lookup_cache_ttl: float = float(os.getenv("LOOKUP_CACHE_TTL", "300"))
+
+        # A QUERY_CACHE_SIZE of 0 disables the cache, a QUERY_CACHE_TTL of 0 disables expiry
+        self.query_cache_size: int = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+        self.query_cache_ttl: float = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+        self.query_cache_path: Optional[Path] = (
+            Path(os.environ["QUERY_CACHE_PATH"])
+            if os.getenv("QUERY_CACHE_PATH")
+            else None
+        )
+
+        # A DEDUP_SIMILARITY above 0 merges writes into a memory of the same user and
+        # category at least that cosine-similar. DEDUP_MODE "refresh" keeps the stored
+        # text and resets created_at, "replace" also takes the new text and embedding.
+        self.dedup_similarity: float = float(os.getenv("DEDUP_SIMILARITY", "0"))
+        self.dedup_mode: str = os.getenv("DEDUP_MODE", "refresh")
+
+        # Bulk deletes commit PURGE_BATCH_SIZE memories at a time, pausing PURGE_PAUSE_MS
+        # between batches. A RETENTION_DAYS of 0 keeps memories forever.
+        self.purge_batch_size: int = int(os.getenv("PURGE_BATCH_SIZE", "1000"))
+        self.purge_pause_ms: float = float(os.getenv("PURGE_PAUSE_MS", "0"))
+        self.retention_days: float = float(os.getenv("RETENTION_DAYS", "0"))
+        self.retention_interval_seconds: float = float(
+            os.getenv("RETENTION_INTERVAL_SECONDS", "3600")
+        )
+
+        # Filtered searches matching at most SEARCH_EXACT_MAX_ROWS memories are sorted
+        # exactly instead of through the vector index, 0 always uses the index
+        self.search_exact_max_rows: int = int(
+            os.getenv("SEARCH_EXACT_MAX_ROWS", "10000")
+        )
+        # Each user and category's count is reused by the searches of the next
+        # SEARCH_PLAN_CACHE_SECONDS in this process, 0 counts on every search
+        self.search_plan_cache_seconds: float = float(
+            os.getenv("SEARCH_PLAN_CACHE_SECONDS", "60")
+        )
+        # "similarity", "recency" or "decay" (similarity halved every half-life)
+        self.search_ranking: str = os.getenv("SEARCH_RANKING", "similarity")
+        self.search_half_life_days: float = float(
+            os.getenv("SEARCH_HALF_LIFE_DAYS", "30")
+        )
+
+        # MEMORY_PARTITIONS hash partitions memories by user_id, 0 leaves it a single
+        # table. MEMORY_TIME_PARTITION "month" or "year" sub-partitions each of them
+        # by created_at, with MEMORY_TIME_PARTITIONS_AHEAD created in advance.
+        self.memory_partitions: int = int(os.getenv("MEMORY_PARTITIONS", "0"))
+        self.memory_time_partition: str = os.getenv("MEMORY_TIME_PARTITION", "none")
+        self.memory_time_partitions_ahead: int = int(
+            os.getenv("MEMORY_TIME_PARTITIONS_AHEAD", "3")
+        )
+
+        self.text_search_config: str = os.getenv("TEXT_SEARCH_CONFIG", "english")
+
+        self.vector_index_method: str = os.getenv("VECTOR_INDEX_METHOD", "hnsw")
+        self.vector_index_m: int = int(os.getenv("VECTOR_INDEX_M", "16"))
+        self.vector_index_ef_construction: int = int(
+            os.getenv("VECTOR_INDEX_EF_CONSTRUCTION", "64")
+        )
+        self.vector_index_lists: int = int(os.getenv("VECTOR_INDEX_LISTS", "100"))
+        # "binary" indexes binary_quantize(embedding) and rescores the Hamming
+        # candidates by exact cosine distance, "none" indexes the embeddings as is
+        self.vector_index_quantization: str = os.getenv(
+            "VECTOR_INDEX_QUANTIZATION", "none"
+        )
+        self.binary_rescore_factor: int = int(os.getenv("BINARY_RESCORE_FACTOR", "8"))
 
     def embedding_model_exists(self) -> bool:
         """
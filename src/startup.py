@@ -0,0 +1,41 @@
+import time
+
+startup_timings: dict[str, float] = {}
+
+
+def warmup(embedding: bool = True, database: bool = True) -> dict[str, float]:
+    """
+    Preload the lazily created resources so the first request doesn't pay for them.
+
+    Args:
+        embedding (bool): Load the embedding model and run one encode.
+        database (bool): Create the engine and open a pooled connection.
+
+    Returns:
+        dict[str, float]: Import and cold-start timings in seconds, keyed by stage.
+    """
+    # Imported here so that importing this module never loads torch or the engine
+    from sqlalchemy import text
+
+    from src.db import get_engine
+    from src.embedding.model import get_embedding_model
+    from src.embedding.pool import get_embedding_pool
+
+    if embedding:
+        pool = get_embedding_pool()
+        if pool is not None:
+            start = time.perf_counter()
+            pool.start()
+            startup_timings["embedding_pool_start"] = time.perf_counter() - start
+        else:
+            model = get_embedding_model()
+            start = time.perf_counter()
+            model.encode(["warmup"])
+            startup_timings["embedding_first_encode"] = time.perf_counter() - start
+    if database:
+        engine = get_engine()
+        start = time.perf_counter()
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        startup_timings["database_first_connect"] = time.perf_counter() - start
+    return dict(startup_timings)
@@ -0,0 +1,207 @@
+import io
+import itertools
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+from src.db import get_session
+from src.queries import (
+    ExportedMemory,
+    check_embedding_model,
+    copy_memories_in,
+    copy_memories_out,
+    get_or_create_category_ids,
+    import_users,
+    stream_users,
+)
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT_VERSION = 1
+
+# Every .npy header written by NumPy is padded to this size for 2D float32 arrays of
+# fewer than 10^18 rows, so it can be reserved up front and filled in at the end
+_NPY_HEADER_SIZE = 128
+
+
+def _npy_header(rows: int, dims: int) -> bytes:
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header, {"descr": "<f4", "fortran_order": False, "shape": (rows, dims)}
+    )
+    if len(header.getvalue()) != _NPY_HEADER_SIZE:
+        raise ValueError(f"Can't write a .npy header for {rows} x {dims}.")
+    return header.getvalue()
+
+
+def export_memories(
+    path: Path, user_id: Optional[uuid.UUID] = None, batch_size: int = 10000
+) -> int:
+    """
+    Export memories with their embeddings to a directory, streaming them.
+
+    The directory holds the float32 embeddings as a single embeddings.npy matrix,
+    the id, user, category, created_at and text of each memory as one line of
+    memories.jsonl in the same order, the users in users.jsonl and meta.json,
+    written last. Everything is read through one binary COPY on a repeatable read
+    snapshot, so the export is consistent and holds one batch in memory at a time.
+    It needs its own transaction for that, so it can't run inside a unit of work.
+
+    Args:
+        path (Path): The directory to export to, created if missing.
+        user_id (Optional[uuid.UUID]): Only export this user and their memories.
+        batch_size (int): The number of memories written at a time.
+
+    Returns:
+        int: The number of memories exported.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    dims = settings.embedding_model_dims
+    categories: set[str] = set()
+    start = time.perf_counter()
+    with get_session(
+        {"isolation_level": "REPEATABLE READ", "postgresql_readonly": True}
+    ) as session:
+        with open(path / "users.jsonl", "w", encoding="utf-8") as users:
+            for batch in stream_users(session, user_id, batch_size):
+                users.writelines(
+                    json.dumps({"id": str(id), "name": name}) + "\n"
+                    for id, name in batch
+                )
+
+        with open(path / "memories.jsonl", "w", encoding="utf-8") as memories, open(
+            path / "embeddings.npy", "wb"
+        ) as embeddings_file:
+            embeddings_file.write(_npy_header(0, dims))
+
+            def write_batch(rows: list[ExportedMemory], embeddings: np.ndarray) -> None:
+                memories.writelines(
+                    json.dumps(
+                        {
+                            "id": str(row.id),
+                            "user_id": str(row.user_id),
+                            "category": row.category,
+                            "created_at": row.created_at.isoformat(),
+                            "text": row.text,
+                        }
+                    )
+                    + "\n"
+                    for row in rows
+                )
+                embeddings_file.write(embeddings.astype("<f4").tobytes())
+                categories.update(row.category for row in rows if row.category)
+
+            count = copy_memories_out(session, write_batch, user_id, batch_size)
+            embeddings_file.seek(0)
+            embeddings_file.write(_npy_header(count, dims))
+
+    meta = {
+        "version": EXPORT_FORMAT_VERSION,
+        "count": count,
+        "dims": dims,
+        "model_name": settings.embedding_model_name,
+        "categories": sorted(categories),
+    }
+    (path / "meta.json").write_text(json.dumps(meta))
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Exported %d memories to %s at %.0f rows/s",
+        count,
+        path,
+        count / elapsed if elapsed else 0.0,
+    )
+    return count
+
+
+def _read_jsonl(path: Path, batch_size: int) -> Iterator[list[dict]]:
+    with open(path, encoding="utf-8") as f:
+        lines = (json.loads(line) for line in f)
+        while batch := list(itertools.islice(lines, batch_size)):
+            yield batch
+
+
+def import_memories(path: Path, batch_size: int = 10000, new_ids: bool = False) -> int:
+    """
+    Import memories exported by export_memories, reusing their embeddings.
+
+    The memories are loaded through one binary COPY fed from the memory-mapped
+    embeddings and the JSONL sidecar a batch at a time, so the model is never run
+    and memory use stays bounded. Users are matched by name and categories created
+    as needed. The import is a single transaction. Indexes are maintained as rows
+    land, so for very large imports into an empty table it is faster to drop the
+    vector index first and rebuild it after.
+
+    Args:
+        path (Path): The directory to import from.
+        batch_size (int): The number of memories encoded at a time.
+        new_ids (bool): Give the memories new IDs, e.g. to copy them next to the
+            originals, rather than keeping theirs.
+
+    Returns:
+        int: The number of memories imported.
+    """
+    meta = json.loads((path / "meta.json").read_text())
+    if meta["version"] != EXPORT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported export version {meta['version']}.")
+    if (meta["model_name"], meta["dims"]) != (
+        settings.embedding_model_name,
+        settings.embedding_model_dims,
+    ):
+        raise ValueError(
+            f"Export was embedded with {meta['model_name']} at {meta['dims']} dims."
+        )
+    embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+    if embeddings.shape != (meta["count"], meta["dims"]):
+        raise ValueError(f"Expected {meta['count']} embeddings, got {len(embeddings)}.")
+
+    start = time.perf_counter()
+    with get_session() as session:
+        check_embedding_model(session, for_write=True)
+        user_ids: dict[uuid.UUID, uuid.UUID] = {}
+        for users in _read_jsonl(path / "users.jsonl", batch_size):
+            user_ids.update(
+                import_users(
+                    session, [(uuid.UUID(user["id"]), user["name"]) for user in users]
+                )
+            )
+        # Resolved up front, the connection is busy with the COPY afterwards
+        category_ids = get_or_create_category_ids(session, meta["categories"])
+
+        def batches() -> Iterator[tuple[list, np.ndarray]]:
+            offset = 0
+            for memories in _read_jsonl(path / "memories.jsonl", batch_size):
+                rows = [
+                    (
+                        uuid.uuid4() if new_ids else uuid.UUID(memory["id"]),
+                        user_ids[uuid.UUID(memory["user_id"])],
+                        (
+                            category_ids[memory["category"]]
+                            if memory["category"]
+                            else None
+                        ),
+                        datetime.fromisoformat(memory["created_at"]),
+                        memory["text"],
+                    )
+                    for memory in memories
+                ]
+                yield rows, embeddings[offset : offset + len(rows)]
+                offset += len(rows)
+
+        count = copy_memories_in(session, batches())
+        if count != meta["count"]:
+            raise ValueError(f"Expected {meta['count']} memories, read {count}.")
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Imported %d memories from %s at %.0f rows/s",
+        count,
+        path,
+        count / elapsed if elapsed else 0.0,
+    )
+    return count
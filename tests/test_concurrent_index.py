@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import create_engine, event
+
+from src import db
+from src.memory import MemoryInterface
+from src.metrics import MetricEvent, metrics
+from src.queries import create_vector_index
+from src.reembed import ReembedJob
+
+
+@pytest.fixture
+def executed(monkeypatch):
+    """
+    Binds the sessions to SQLite, recording each statement with whether it ran in
+    autocommit mode, and enables metrics so every session checks out its connection
+    up front. The Postgres statements themselves are replaced with no-ops.
+    """
+    engine = create_engine("sqlite://")
+    statements: list[tuple[str, bool]] = []
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        autocommit = conn.connection.dbapi_connection.isolation_level is None
+        statements.append((statement, autocommit))
+        if "pg_partition_tree" in statement:
+            return "SELECT 'memories', NULL, 1", ()
+        return "SELECT 1", ()
+
+    events: list[MetricEvent] = []
+    monkeypatch.setattr(db, "_engine", engine)
+    db.SyncSessionLocal.configure(bind=engine)
+    metrics.add_sink(events.append)
+    yield statements
+    metrics.remove_sink(events.append)
+    db.SyncSessionLocal.configure(bind=None)
+    assert any(event.stage == "pool_wait" for event in events)
+
+
+def _concurrent(statements: list[tuple[str, bool]]) -> list[bool]:
+    return [
+        autocommit
+        for statement, autocommit in statements
+        if "CONCURRENTLY" in statement
+    ]
+
+
+@pytest.mark.parametrize(
+    "call",
+    [
+        lambda memory: memory.create_vector_index(concurrently=True),
+        lambda memory: memory.rebuild_vector_index(concurrently=True),
+        lambda memory: memory.drop_vector_index(concurrently=True),
+    ],
+)
+def test_concurrent_index_changes_run_in_autocommit(executed, call):
+    call(MemoryInterface())
+    assert _concurrent(executed) and all(_concurrent(executed))
+
+
+def test_shadow_index_builds_in_autocommit(executed):
+    ReembedJob(dims=8).build_index()
+    assert _concurrent(executed) and all(_concurrent(executed))
+
+
+def test_concurrent_build_in_a_transaction_is_refused(executed):
+    with pytest.raises(ValueError, match="AUTOCOMMIT"):
+        with db.get_session() as session:
+            create_vector_index(session, concurrently=True)
+    assert _concurrent(executed) == []
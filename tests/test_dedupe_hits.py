@@ -0,0 +1,41 @@
+import uuid
+from datetime import datetime
+
+from src.memory import _dedupe_hits
+from src.queries import SearchMemoryHit
+
+IDS = [uuid.uuid4() for _ in range(3)]
+
+
+def _hit(index: int, score: float) -> SearchMemoryHit:
+    return SearchMemoryHit(
+        IDS[index], f"memory {index}", datetime(2026, 1, 1), "c", IDS[0], score
+    )
+
+
+def _ids(hits: list[list[SearchMemoryHit]]) -> list[list[uuid.UUID]]:
+    return [[hit.id for hit in query_hits] for query_hits in hits]
+
+
+def test_vector_keeps_smallest_distance():
+    hits = [[_hit(0, 0.3), _hit(1, 0.2)], [_hit(0, 0.1), _hit(2, 0.4)]]
+    assert _ids(_dedupe_hits(hits, "vector", "similarity")) == [
+        [IDS[1]],
+        [IDS[0], IDS[2]],
+    ]
+
+
+def test_hybrid_and_decay_keep_highest_relevance():
+    hits = [[_hit(0, 0.3)], [_hit(0, 0.1)]]
+    assert _ids(_dedupe_hits(hits, "hybrid", "similarity")) == [[IDS[0]], []]
+    assert _ids(_dedupe_hits(hits, "vector", "decay")) == [[IDS[0]], []]
+
+
+def test_ties_go_to_the_first_query():
+    hits = [[_hit(0, 0.2)], [_hit(0, 0.2)], [_hit(1, 0.5)]]
+    assert _ids(_dedupe_hits(hits, "vector", "similarity")) == [[IDS[0]], [], [IDS[1]]]
+
+
+def test_order_within_a_query_is_kept():
+    hits = [[_hit(2, 0.1), _hit(1, 0.2), _hit(0, 0.3)]]
+    assert _dedupe_hits(hits, "vector", "recency") == hits
@@ -0,0 +1,12 @@
+import pytest
+
+from src.embedding.pool import EmbeddingPool
+
+
+def test_start_fails_when_a_worker_cannot_load_its_model():
+    pool = EmbeddingPool(2, backend="unknown")
+    try:
+        with pytest.raises(RuntimeError, match="failed to load its model"):
+            pool.start(timeout=60)
+    finally:
+        pool.close()
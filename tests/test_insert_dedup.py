@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from src.embedding import get_duplicate_indexes
+from src.queries import NumpyMemoryStore
+
+
+def _vector(seed: int, noise: float = 0.0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vector = rng.standard_normal(8).astype(np.float32)
+    if noise:
+        vector += noise * np.random.default_rng(seed + 100).standard_normal(8)
+    return vector
+
+
+@pytest.fixture
+def store():
+    store = NumpyMemoryStore(dims=8)
+    store.user_id = store.create_user("alice")
+    return store
+
+
+def _insert(store, texts, embeddings, categories, mode):
+    return store.add_memories(
+        texts,
+        np.stack(embeddings),
+        categories,
+        [store.user_id] * len(texts),
+        dedup_similarity=0.95,
+        dedup_mode=mode,
+    )
+
+
+def _stored(store) -> dict:
+    """
+    Returns the text of every live memory of the store's user by ID.
+    """
+    hits = store.search("q", _vector(1), store.user_id, top_k=100, threshold=2.0)
+    return {hit.id: hit.text for hit in hits}
+
+
+def test_get_duplicate_indexes_points_to_first_of_group():
+    embeddings = np.stack([_vector(1), _vector(1, 0.01), _vector(2), _vector(1)])
+    groups = ["a", "a", "a", "b"]
+    assert get_duplicate_indexes(embeddings, groups, 0.95) == [0, 0, 2, 3]
+    assert get_duplicate_indexes(embeddings.tolist(), groups, 0.95) == [0, 0, 2, 3]
+
+
+def test_get_duplicate_indexes_without_duplicates():
+    embeddings = np.stack([_vector(1), _vector(2), _vector(3)])
+    assert get_duplicate_indexes(embeddings, ["a", "a", "b"], 0.95) == [0, 1, 2]
+
+
+@pytest.mark.parametrize("mode", ["refresh", "replace"])
+def test_batch_duplicates_share_one_new_row(store, mode):
+    ids = _insert(
+        store,
+        ["a1", "a2", "b"],
+        [_vector(1), _vector(1, 0.01), _vector(2)],
+        ["work", "work", "work"],
+        mode,
+    )
+    assert ids[0] == ids[1] != ids[2]
+    expected = "a2" if mode == "replace" else "a1"
+    assert _stored(store) == {ids[0]: expected, ids[2]: "b"}
+
+
+def test_same_embedding_in_other_category_is_not_a_duplicate(store):
+    ids = _insert(
+        store,
+        ["a", "a again"],
+        [_vector(1), _vector(1)],
+        ["work", "travel"],
+        "refresh",
+    )
+    assert ids[0] != ids[1]
+    assert _stored(store) == {ids[0]: "a", ids[1]: "a again"}
+
+
+def test_refresh_merges_into_existing_row(store):
+    [existing] = _insert(store, ["a"], [_vector(1)], ["work"], "refresh")
+    ids = _insert(
+        store,
+        ["a1", "a2", "b"],
+        [_vector(1, 0.01), _vector(1), _vector(2)],
+        ["work", "work", "work"],
+        "refresh",
+    )
+    assert ids[:2] == [existing, existing]
+    assert _stored(store) == {existing: "a", ids[2]: "b"}
+
+
+def test_replace_takes_last_row_of_the_cluster(store):
+    [existing] = _insert(store, ["a"], [_vector(1)], ["work"], "replace")
+    ids = _insert(
+        store,
+        ["a1", "b", "a2"],
+        [_vector(1), _vector(2), _vector(1, 0.01)],
+        ["work", "work", "work"],
+        "replace",
+    )
+    assert ids[0] == ids[2] == existing
+    assert _stored(store) == {existing: "a2", ids[1]: "b"}
+
+
+def test_two_clusters_hitting_one_existing_row_merge_once(store):
+    # Neither batch cluster duplicates the other, but the existing row lies
+    # between them and is close enough to both
+    first, second = _vector(1), _vector(1, 0.3)
+    [existing] = _insert(store, ["old"], [(first + second) / 2], ["work"], "replace")
+    assert get_duplicate_indexes(np.stack([first, second]), [0, 0], 0.95) == [0, 1]
+    ids = _insert(store, ["x", "y"], [first, second], ["work", "work"], "replace")
+    assert ids == [existing, existing]
+    # One row per existing memory, with the content of the last write
+    assert _stored(store) == {existing: "y"}
+
+
+def test_unknown_dedup_mode(store):
+    with pytest.raises(ValueError):
+        _insert(store, ["a"], [_vector(1)], ["work"], "merge")
@@ -0,0 +1,65 @@
+import time
+import uuid
+
+from sqlalchemy.orm import Session
+
+from src.queries import LookupCache, lookup_cache
+
+
+def test_entries_publish_on_commit_only():
+    cache = LookupCache()
+    category_id, user_id = uuid.uuid4(), uuid.uuid4()
+    session = Session()
+    cache.add_category(session, "work", category_id)
+    cache.add_users(session, {user_id})
+    assert cache.get_category_id("work") is None
+    cache._publish(*session.info.pop("lookup_cache_pending"))
+    assert cache.get_category_id("work") == category_id
+    assert cache.has_category_id(category_id)
+    assert cache.has_user_id(user_id)
+
+
+def test_invalidate_drops_published_and_pending_keys():
+    cache = LookupCache()
+    category_id, user_id = uuid.uuid4(), uuid.uuid4()
+    cache._publish({"work": category_id}, {user_id})
+    session = Session()
+    cache.add_category(session, "work", category_id)
+    cache.add_users(session, {user_id})
+    cache.invalidate_category(session, "work")
+    cache.invalidate_user(session, user_id)
+    assert cache.get_category_id("work") is None
+    assert not cache.has_category_id(category_id)
+    assert not cache.has_user_id(user_id)
+    assert session.info["lookup_cache_pending"] == ({}, set())
+
+
+def test_invalidate_keeps_other_keys():
+    cache = LookupCache()
+    work, home, user_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    cache._publish({"work": work, "home": home}, {user_id})
+    cache.invalidate_category(Session(), "work")
+    assert cache.get_category_id("home") == home
+    assert cache.has_user_id(user_id)
+
+
+def test_entries_expire_after_ttl():
+    cache = LookupCache(ttl=0.05)
+    category_id, user_id = uuid.uuid4(), uuid.uuid4()
+    cache._publish({"work": category_id}, {user_id})
+    assert cache.get_category_id("work") == category_id
+    time.sleep(0.1)
+    assert cache.get_category_id("work") is None
+    assert not cache.has_category_id(category_id)
+    assert not cache.has_user_id(user_id)
+
+
+def test_session_commit_publishes_and_rollback_discards():
+    committed, rolled_back = uuid.uuid4(), uuid.uuid4()
+    session = Session()
+    lookup_cache.add_users(session, {committed})
+    session.commit()
+    lookup_cache.add_users(session, {rolled_back})
+    session.rollback()
+    assert lookup_cache.has_user_id(committed)
+    assert not lookup_cache.has_user_id(rolled_back)
@@ -0,0 +1,189 @@
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from src.queries import NumpyMemoryStore
+
+WORK = np.array([1.0, 0.0, 0.0, 0.0], dtype=np.float32)
+TRAVEL = np.array([0.0, 1.0, 0.0, 0.0], dtype=np.float32)
+FOOD = np.array([0.0, 0.0, 1.0, 0.0], dtype=np.float32)
+
+
+def _near(vector: np.ndarray, noise: float = 0.05) -> np.ndarray:
+    return vector + np.array([0.0, 0.0, 0.0, noise], dtype=np.float32)
+
+
+@pytest.fixture
+def store():
+    return NumpyMemoryStore(dims=4, initial_capacity=2)
+
+
+def _texts(hits):
+    return [hit.text for hit in hits]
+
+
+def test_dims_default_is_read_at_construction(monkeypatch):
+    from src.settings import settings
+
+    monkeypatch.setattr(settings, "embedding_model_dims", 6)
+    assert NumpyMemoryStore().dims == 6
+
+
+def test_insert_and_search_closest_first(store):
+    user_id = store.create_user("alice")
+    store.add_memories(
+        ["meeting", "flight", "lunch"],
+        [WORK, TRAVEL, _near(WORK, 0.5)],
+        ["work", "travel", "work"],
+        [user_id] * 3,
+    )
+    hits = store.search("q", WORK, user_id, threshold=0.5)
+    assert _texts(hits) == ["meeting", "lunch"]
+    assert hits[0].score == pytest.approx(0.0, abs=1e-6)
+    assert hits[0].category == "work" and hits[0].user_id == user_id
+
+
+def test_search_filters_by_user_category_and_date(store):
+    alice, bob = store.create_user("alice"), store.create_user("bob")
+    store.add_memories(
+        ["a-work", "a-travel", "b-work"],
+        [WORK, _near(WORK), WORK],
+        ["work", "travel", "work"],
+        [alice, alice, bob],
+    )
+    assert _texts(store.search("q", WORK, alice, category="work")) == ["a-work"]
+    assert store.search("q", WORK, alice, category="unknown") == []
+    now = datetime.now()
+    assert store.search("q", WORK, alice, date_from=now + timedelta(days=1)) == []
+    assert store.search("q", WORK, alice, date_to=now - timedelta(days=1)) == []
+    assert len(store.search("q", WORK, alice, date_from=now - timedelta(days=1))) == 2
+
+
+def test_search_respects_top_k_and_embeddings(store):
+    user_id = store.create_user("alice")
+    store.add_memories(
+        ["one", "two", "three"],
+        [2 * WORK, _near(WORK, 0.1), _near(WORK, 0.2)],
+        ["work"] * 3,
+        [user_id] * 3,
+    )
+    hits = store.search("q", WORK, user_id, top_k=2, include_embeddings=True)
+    assert _texts(hits) == ["one", "two"]
+    np.testing.assert_allclose(hits[0].embedding, 2 * WORK, rtol=1e-6)
+
+
+def test_add_rejects_unknown_users_and_wrong_dims(store):
+    user_id = store.create_user("alice")
+    with pytest.raises(ValueError):
+        store.add_memories(["x"], [WORK], ["work"], [uuid.uuid4()])
+    with pytest.raises(ValueError):
+        store.add_memories(["x"], [np.ones(3, np.float32)], ["work"], [user_id])
+
+
+def test_delete_memory_and_delete_memories(store):
+    user_id = store.create_user("alice")
+    ids = store.add_memories(
+        ["meeting", "flight", "lunch"],
+        [WORK, TRAVEL, FOOD],
+        ["work", "travel", "food"],
+        [user_id] * 3,
+    )
+    assert store.delete_memory(ids[0])
+    assert not store.delete_memory(ids[0])
+    assert store.search("q", WORK, user_id) == []
+    stats = store.delete_memories(user_id=user_id, category="travel")
+    assert stats.memories == 1
+    assert _texts(store.search("q", FOOD, user_id)) == ["lunch"]
+    with pytest.raises(ValueError):
+        store.delete_memories()
+
+
+def test_dedup_refresh_keeps_the_stored_memory(store):
+    user_id = store.create_user("alice")
+    [original] = store.add_memories(["meeting"], [WORK], ["work"], [user_id])
+    ids = store.add_memories(
+        ["meeting again", "flight"],
+        [_near(WORK), TRAVEL],
+        ["work", "work"],
+        [user_id] * 2,
+        dedup_similarity=0.95,
+    )
+    assert ids[0] == original
+    assert _texts(store.search("q", WORK, user_id, threshold=0.1)) == ["meeting"]
+
+
+def test_dedup_replace_takes_the_newer_text_under_the_same_id(store):
+    user_id = store.create_user("alice")
+    [original] = store.add_memories(["meeting"], [WORK], ["work"], [user_id])
+    ids = store.add_memories(
+        ["meeting moved"],
+        [_near(WORK)],
+        ["work"],
+        [user_id],
+        dedup_similarity=0.95,
+        dedup_mode="replace",
+    )
+    assert ids == [original]
+    hits = store.search("q", WORK, user_id)
+    assert [(hit.id, hit.text) for hit in hits] == [(original, "meeting moved")]
+
+
+def test_dedup_does_not_cross_categories(store):
+    user_id = store.create_user("alice")
+    [work_id] = store.add_memories(["meeting"], [WORK], ["work"], [user_id])
+    [other_id] = store.add_memories(
+        ["meeting"], [WORK], ["travel"], [user_id], dedup_similarity=0.95
+    )
+    assert other_id != work_id
+
+
+def test_tombstones_are_compacted_past_the_ratio(store):
+    user_id = store.create_user("alice")
+    ids = store.add_memories(
+        ["a", "b", "c", "d"],
+        [WORK, TRAVEL, FOOD, _near(FOOD, 1.0)],
+        ["work"] * 4,
+        [user_id] * 4,
+    )
+    store.delete_memory(ids[0])
+    store.delete_memory(ids[1])
+    assert store._count == 4
+    store.delete_memory(ids[2])
+    assert store._count == 1
+    assert [hit.id for hit in store.search("q", FOOD, user_id, threshold=1.0)] == [
+        ids[3]
+    ]
+    assert store.delete_memory(ids[3])
+
+
+def test_compacted_store_reloads_from_disk(tmp_path):
+    store = NumpyMemoryStore(tmp_path, dims=4, initial_capacity=2)
+    user_id = store.create_user("alice")
+    ids = store.add_memories(
+        ["a", "b", "c"], [WORK, TRAVEL, FOOD], ["work"] * 3, [user_id] * 3
+    )
+    store.delete_memories(ids=ids[:2])
+    assert store._count == 1
+
+    reloaded = NumpyMemoryStore(tmp_path, dims=4)
+    assert reloaded.find_user("alice") == user_id
+    hits = reloaded.search("q", FOOD, user_id)
+    assert [(hit.id, hit.text) for hit in hits] == [(ids[2], "c")]
+
+
+def test_dedup_replace_merges_two_clusters_into_one_row(store):
+    user_id = store.create_user("alice")
+    [original] = store.add_memories(["meeting"], [WORK], ["work"], [user_id])
+    ids = store.add_memories(
+        ["meeting moved", "meeting cancelled"],
+        [_near(WORK, 0.2), _near(WORK, -0.2)],
+        ["work"] * 2,
+        [user_id] * 2,
+        dedup_similarity=0.97,
+        dedup_mode="replace",
+    )
+    assert ids == [original, original]
+    hits = store.search("q", WORK, user_id)
+    assert [(hit.id, hit.text) for hit in hits] == [(original, "meeting cancelled")]
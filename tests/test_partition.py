@@ -0,0 +1,35 @@
+from datetime import date
+
+from src.queries.partition import _time_partition_bounds
+
+
+def test_month_bounds_cross_year():
+    assert _time_partition_bounds("month", date(2025, 11, 20), date(2026, 1, 1)) == [
+        ("y2025m11", date(2025, 11, 1), date(2025, 12, 1)),
+        ("y2025m12", date(2025, 12, 1), date(2026, 1, 1)),
+        ("y2026m01", date(2026, 1, 1), date(2026, 2, 1)),
+    ]
+
+
+def test_month_bounds_single_period():
+    assert _time_partition_bounds("month", date(2026, 2, 1), date(2026, 2, 28)) == [
+        ("y2026m02", date(2026, 2, 1), date(2026, 3, 1)),
+    ]
+
+
+def test_year_bounds():
+    assert _time_partition_bounds("year", date(2025, 6, 15), date(2026, 3, 1)) == [
+        ("y2025", date(2025, 1, 1), date(2026, 1, 1)),
+        ("y2026", date(2026, 1, 1), date(2027, 1, 1)),
+    ]
+
+
+def test_bounds_are_contiguous():
+    bounds = _time_partition_bounds("month", date(2024, 1, 31), date(2026, 12, 31))
+    assert len(bounds) == 36
+    for (_, _, upper), (_, lower, _) in zip(bounds, bounds[1:]):
+        assert upper == lower
+
+
+def test_empty_when_end_is_before_start():
+    assert _time_partition_bounds("month", date(2026, 3, 1), date(2026, 1, 1)) == []
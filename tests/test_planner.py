@@ -0,0 +1,80 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.queries import planner
+from src.settings import settings
+
+
+class _Session:
+    """
+    Answers every statement with the given row, recording the compiled SQL.
+    """
+
+    def __init__(self, row: tuple) -> None:
+        self.row = row
+        self.statements: list[str] = []
+
+    def execute(self, statement):
+        compiled = statement.compile(dialect=postgresql.dialect())
+        self.statements.append(f"{compiled} {list(compiled.params.values())}")
+        row = self.row
+        return type("Result", (), {"one": lambda self: row})()
+
+
+@pytest.fixture(autouse=True)
+def planner_settings(monkeypatch):
+    monkeypatch.setattr(planner, "_row_counts", planner.OrderedDict())
+    monkeypatch.setattr(planner, "supports_iterative_scan", lambda session: True)
+    monkeypatch.setattr(settings, "search_exact_max_rows", 100)
+    monkeypatch.setattr(settings, "search_plan_cache_seconds", 60)
+    monkeypatch.setattr(settings, "vector_index_method", "hnsw")
+
+
+def test_small_users_are_counted_once():
+    user_id = uuid.uuid4()
+    session = _Session((5, ""))
+    assert planner.plan_search(session, user_id).exact
+    assert planner.plan_search(session, user_id).exact
+    assert len(session.statements) == 1
+
+
+def test_large_users_skip_the_count_but_keep_iterative_scans():
+    user_id = uuid.uuid4()
+    session = _Session((101, ""))
+    assert not planner.plan_search(session, user_id).exact
+    session.row = ("",)
+    assert not planner.plan_search(session, user_id).exact
+    assert "count(*)" not in session.statements[1]
+    assert "hnsw.iterative_scan" in session.statements[1]
+
+
+def test_dates_are_counted_when_the_user_is_large():
+    user_id = uuid.uuid4()
+    session = _Session((101, 7, ""))
+    plan = planner.plan_search(session, user_id, date_from=datetime(2024, 1, 1))
+    assert plan.exact
+    session.row = (7, "")
+    assert planner.plan_search(session, user_id, date_from=datetime(2024, 1, 1)).exact
+    assert session.statements[1].count("count(*)") == 1
+
+
+def test_no_cache_counts_every_search(monkeypatch):
+    monkeypatch.setattr(settings, "search_plan_cache_seconds", 0)
+    user_id = uuid.uuid4()
+    session = _Session((5, ""))
+    planner.plan_search(session, user_id)
+    planner.plan_search(session, user_id)
+    assert len(session.statements) == 2
+
+
+def test_ivfflat_scans_iteratively_in_relaxed_order(monkeypatch):
+    monkeypatch.setattr(settings, "vector_index_method", "ivfflat")
+    plan = planner.plan_search(_Session((101, "")), uuid.uuid4())
+    assert not plan.exact and plan.relaxed
+    session = _Session((5, ""))
+    plan = planner.plan_search(session, uuid.uuid4())
+    assert plan.exact and not plan.relaxed
+    assert "ivfflat.iterative_scan" in session.statements[0]
@@ -0,0 +1,34 @@
+import uuid
+
+from src.queries import purge_batches
+
+
+def _run(ids, batch_size, deleted):
+    """
+    Drives purge_batches, answering each batch with the next count in deleted.
+    """
+    batches = purge_batches(ids, batch_size)
+    planned = [next(batches)]
+    try:
+        for count in deleted:
+            planned.append(batches.send(count))
+    except StopIteration:
+        pass
+    return planned
+
+
+def test_ids_are_split_without_pauses():
+    ids = [uuid.uuid4() for _ in range(5)]
+    assert _run(ids, 2, [2, 2, 1]) == [
+        (ids[:2], False),
+        (ids[2:4], False),
+        (ids[4:], False),
+    ]
+
+
+def test_unfiltered_batches_repeat_until_short():
+    assert _run(None, 10, [10, 10, 3]) == [(None, False), (None, True), (None, True)]
+
+
+def test_no_ids_plans_nothing():
+    assert list(purge_batches([], 10)) == []
@@ -0,0 +1,68 @@
+import uuid
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import asyncpg, psycopg2
+
+from src.models import Memory
+from src.queries import SearchPlan
+from src.queries import memory as memory_queries
+from src.settings import settings
+
+
+class _Session:
+    def __init__(self, rows: list[tuple]) -> None:
+        self.rows = rows
+        self.statements: list = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        rows = self.rows
+        return type("Result", (), {"all": lambda self: rows})()
+
+
+def _search(monkeypatch, rows: list[tuple], count: int = 2, relaxed: bool = False):
+    monkeypatch.setattr(
+        memory_queries,
+        "plan_search",
+        lambda *args: SearchPlan(
+            [Memory.user_id == uuid.uuid4()], False, relaxed=relaxed
+        ),
+    )
+    session = _Session(rows)
+    embeddings = np.ones((count, settings.embedding_model_dims), dtype=np.float32)
+    hits = memory_queries.search_memory_hits_by_vectors(
+        session, embeddings, uuid.uuid4()
+    )
+    return hits, session.statements[-1]
+
+
+def test_query_vectors_are_bound_as_one_vector_array(monkeypatch):
+    _, statement = _search(monkeypatch, [])
+    for dialect, expected in (
+        (asyncpg.dialect(), np.ndarray),
+        (psycopg2.dialect(), str),
+    ):
+        compiled = statement.compile(dialect=dialect)
+        assert "unnest(" in str(compiled) and "VALUES" not in str(compiled)
+        [(name, value)] = [
+            (name, value)
+            for name, value in compiled.construct_params().items()
+            if isinstance(value, list)
+        ]
+        bound = compiled._bind_processors[name](value)
+        assert len(bound) == 2 and isinstance(bound[0], expected)
+
+
+def test_hits_are_grouped_by_one_based_query_index(monkeypatch):
+    hit = (uuid.uuid4(), "text", None, "work", uuid.uuid4(), 0.1)
+    hits, _ = _search(monkeypatch, [(1, *hit), (2, *hit), (2, *hit)], count=3)
+    assert [len(query_hits) for query_hits in hits] == [1, 2, 0]
+
+
+def test_relaxed_index_scans_are_resorted(monkeypatch):
+    rows = [
+        (1, uuid.uuid4(), text, None, "work", uuid.uuid4(), score)
+        for text, score in (("b", 0.2), ("a", 0.1), ("c", 0.3))
+    ]
+    hits, _ = _search(monkeypatch, rows, count=1, relaxed=True)
+    assert [hit.text for hit in hits[0]] == ["a", "b", "c"]
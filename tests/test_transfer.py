@@ -0,0 +1,188 @@
+import struct
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from src.queries.transfer import (
+    _COPY_HEADER,
+    _COPY_TRAILER,
+    _CopyInReader,
+    _CopyOutParser,
+    _encode_batch,
+    _wire_type,
+)
+
+DIMS = 4
+EPOCH = datetime(2000, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _fields(row: tuple) -> bytes:
+    # One binary COPY row, None fields as NULL
+    parts = [struct.pack(">h", len(row))]
+    for value in row:
+        if value is None:
+            parts.append(struct.pack(">i", -1))
+        else:
+            parts.append(struct.pack(">i", len(value)) + value)
+    return b"".join(parts)
+
+
+def _parse_rows(stream: bytes) -> list[list]:
+    # A minimal reader of the binary COPY format
+    assert stream.startswith(_COPY_HEADER)
+    position = len(_COPY_HEADER)
+    rows = []
+    while True:
+        (fields,) = struct.unpack_from(">h", stream, position)
+        position += 2
+        if fields == -1:
+            assert position == len(stream)
+            return rows
+        row = []
+        for _ in range(fields):
+            (length,) = struct.unpack_from(">i", stream, position)
+            position += 4
+            if length == -1:
+                row.append(None)
+                continue
+            row.append(stream[position : position + length])
+            position += length
+        rows.append(row)
+
+
+def _timestamp(value: bytes) -> int:
+    return struct.unpack(">q", value)[0]
+
+
+def _vector(value: bytes, wire_type: np.dtype) -> np.ndarray:
+    dims, unused = struct.unpack_from(">hh", value)
+    assert unused == 0
+    return np.frombuffer(value, dtype=wire_type, offset=4, count=dims)
+
+
+def _rows(count: int) -> list:
+    return [
+        (
+            uuid.uuid4(),
+            uuid.uuid4(),
+            None if i % 3 == 0 else uuid.uuid4(),
+            datetime(2024, 1, 2, 3, 4, 5, i),
+            f"memory {i} é",
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("storage", ["vector", "halfvec"])
+def test_encode_batch_round_trip(storage):
+    wire_type = _wire_type(storage)
+    rows = _rows(5)
+    embeddings = np.random.default_rng(0).standard_normal((5, DIMS), np.float32)
+    updated_at = datetime(2024, 6, 1)
+    stream = (
+        _COPY_HEADER
+        + _encode_batch(rows[:2], embeddings[:2], wire_type, updated_at)
+        + _encode_batch(rows[2:], embeddings[2:], wire_type, updated_at)
+        + _COPY_TRAILER
+    )
+    parsed = _parse_rows(stream)
+    assert len(parsed) == 5
+    for row, embedding, fields in zip(rows, embeddings, parsed):
+        id, user_id, category_id, created_at, text = row
+        assert uuid.UUID(bytes=fields[0]) == id
+        assert uuid.UUID(bytes=fields[1]) == user_id
+        if category_id is None:
+            assert fields[2] is None
+        else:
+            assert uuid.UUID(bytes=fields[2]) == category_id
+        assert EPOCH + _timestamp(fields[3]) * MICROSECOND == created_at
+        assert EPOCH + _timestamp(fields[4]) * MICROSECOND == updated_at
+        assert fields[5].decode() == text
+        np.testing.assert_array_equal(
+            _vector(fields[6], wire_type), embedding.astype(wire_type)
+        )
+
+
+def _export_stream(rows: list, embeddings: np.ndarray, wire_type: np.dtype) -> bytes:
+    # What COPY (SELECT id, user_id, name, created_at, text, embedding) sends
+    parts = [_COPY_HEADER]
+    for (id, user_id, category, created_at, text), embedding in zip(rows, embeddings):
+        micros = (created_at - EPOCH) // MICROSECOND
+        vector = (
+            struct.pack(">hh", len(embedding), 0)
+            + embedding.astype(wire_type).tobytes()
+        )
+        parts.append(
+            _fields(
+                (
+                    id.bytes,
+                    user_id.bytes,
+                    None if category is None else category.encode(),
+                    struct.pack(">q", micros),
+                    text.encode(),
+                    vector,
+                )
+            )
+        )
+    parts.append(_COPY_TRAILER)
+    return b"".join(parts)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_copy_out_parser_batches_across_chunks(chunk_size):
+    wire_type = _wire_type("vector")
+    rows = [
+        (uuid.uuid4(), uuid.uuid4(), None if i == 1 else f"cat {i}", created, text)
+        for i, (_, _, _, created, text) in enumerate(_rows(5))
+    ]
+    embeddings = np.random.default_rng(1).standard_normal((5, DIMS), np.float32)
+    stream = _export_stream(rows, embeddings, wire_type)
+
+    batches = []
+    parser = _CopyOutParser(
+        lambda batch, vectors: batches.append((batch, vectors)), DIMS, wire_type, 2
+    )
+    for start in range(0, len(stream), chunk_size):
+        parser.write(stream[start : start + chunk_size])
+    parser.flush()
+
+    assert parser.count == 5
+    assert [len(batch) for batch, _ in batches] == [2, 2, 1]
+    exported = [memory for batch, _ in batches for memory in batch]
+    assert [tuple(memory) for memory in exported] == rows
+    vectors = np.concatenate([vectors for _, vectors in batches])
+    assert vectors.dtype == np.float32
+    np.testing.assert_array_equal(vectors, embeddings)
+
+
+def test_copy_out_parser_rejects_other_dims():
+    wire_type = _wire_type("vector")
+    stream = _export_stream(_rows(1), np.ones((1, DIMS + 1), np.float32), wire_type)
+    parser = _CopyOutParser(lambda batch, vectors: None, DIMS, wire_type, 10)
+    with pytest.raises(ValueError):
+        parser.write(stream)
+
+
+def test_copy_out_parser_rejects_other_formats():
+    parser = _CopyOutParser(lambda batch, vectors: None, DIMS, _wire_type("vector"), 1)
+    with pytest.raises(ValueError):
+        parser.write(b"id,text\n" + b"\x00" * 16)
+
+
+def test_copy_in_reader_serves_chunks_in_any_size():
+    chunks = [b"abc", b"", b"defgh", b"i"]
+    reader = _CopyInReader(iter(chunks))
+    read = []
+    while data := reader.read(2):
+        read.append(data)
+    assert b"".join(read) == b"abcdefghi"
+    assert all(len(data) <= 2 for data in read)
+    assert _CopyInReader(iter(chunks)).read() == b"abc"
+
+
+def test_unknown_storage():
+    with pytest.raises(ValueError):
+        _wire_type("sparsevec")